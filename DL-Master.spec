@@ -3,7 +3,7 @@
 
 a = Analysis(
     ['gui.py'],
-    pathex=[],
+    pathex=['web_gui'],
     binaries=[],
     datas=[],
     hiddenimports=[],
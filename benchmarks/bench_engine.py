@@ -0,0 +1,74 @@
+"""
+Per-call overhead of the two yt-dlp backends (see web_gui/engine.py).
+
+    python benchmarks/bench_engine.py                 # startup overhead only
+    python benchmarks/bench_engine.py URL -n 5        # + real metadata extraction
+
+"startup" compares what every call pays before any network traffic:
+spawning `yt-dlp --version` versus borrowing a warm YoutubeDL from the pool.
+With a URL, both engines run a full extract_info() per iteration (the
+metadata cache is not involved), so the difference is the per-call cost.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web_gui'))
+import engine as engine_mod  # noqa: E402
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def report(label, samples):
+    print(f"{label:<34} mean {statistics.mean(samples) * 1000:8.1f} ms   "
+          f"median {statistics.median(samples) * 1000:8.1f} ms   "
+          f"min {min(samples) * 1000:8.1f} ms   (n={len(samples)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url', nargs='?', help="video URL for the extraction benchmark")
+    parser.add_argument('-n', '--runs', type=int, default=10)
+    parser.add_argument('--cmd', default='yt-dlp', help="yt-dlp executable for the subprocess engine")
+    args = parser.parse_args()
+
+    if engine_mod.yt_dlp is None:
+        print("yt_dlp package not installed: only the subprocess engine can be measured.")
+
+    # Startup overhead
+    report("subprocess: yt-dlp --version", timed(
+        lambda: subprocess.run([args.cmd, '--version'], capture_output=True, check=True), args.runs))
+
+    if engine_mod.yt_dlp is not None:
+        t0 = time.perf_counter()
+        inproc = engine_mod.InProcessEngine(pool_size=1)
+        print(f"{'inprocess: pool warm-up (once)':<34} {(time.perf_counter() - t0) * 1000:8.1f} ms")
+
+        def borrow():
+            ydl = inproc._pool.get()
+            inproc._pool.put(ydl)
+
+        report("inprocess: borrow warm instance", timed(borrow, args.runs))
+
+    if not args.url:
+        return
+
+    # Full extraction
+    subproc = engine_mod.SubprocessEngine(args.cmd)
+    report("subprocess: extract_info", timed(lambda: subproc.extract_info(args.url), args.runs))
+    if engine_mod.yt_dlp is not None:
+        report("inprocess: extract_info", timed(lambda: inproc.extract_info(args.url), args.runs))
+
+
+if __name__ == '__main__':
+    main()
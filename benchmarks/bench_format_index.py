@@ -0,0 +1,192 @@
+"""
+Full `yt-dlp -J` dicts vs. the compact records of web_gui/format_index.py.
+
+    python benchmarks/bench_format_index.py                   # synthetic payloads, 1 h and 3 h
+    python benchmarks/bench_format_index.py --file info.json  # a real `yt-dlp -J URL > info.json`
+    python benchmarks/bench_format_index.py --hours 1 6 -n 20
+
+Synthetic payloads are shaped like real ones: a captions-heavy YouTube-style
+document (long signed URLs, ~150 auto-caption languages in 7 formats each,
+thumbnails, heatmap) and a DASH-style one whose formats list every segment.
+
+For each payload it reports:
+  parse     json.loads alone vs. json.loads + compaction (median of -n runs)
+  retained  memory still held once the text is dropped (tracemalloc)
+  rank      formats.rank_formats() on each, what /formats does per request
+  handoff   rebuilding + serialising the dict a download passes to yt-dlp
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import string
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web_gui'))
+import format_index  # noqa: E402
+import formats  # noqa: E402
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-us,en;q=0.5',
+    'Sec-Fetch-Mode': 'navigate',
+}
+
+
+def token(rng, n):
+    return ''.join(rng.choice(string.ascii_letters + string.digits + '-_') for _ in range(n))
+
+
+def signed_url(rng, host, length=900):
+    return f"https://{host}/videoplayback?expire=1700000000&ei={token(rng, 20)}&sig={token(rng, length)}"
+
+
+def media_format(rng, format_id, height, vcodec, acodec, duration, **extra):
+    tbr = (height or 64) * 3.5
+    fmt = {
+        'format_id': format_id, 'format_note': f"{height}p" if height else 'medium',
+        'ext': 'mp4' if vcodec.startswith('avc') or vcodec == 'none' else 'webm',
+        'protocol': 'https', 'url': signed_url(rng, 'rr3---sn-example.googlevideo.com'),
+        'vcodec': vcodec, 'acodec': acodec, 'width': height and height * 16 // 9, 'height': height,
+        'fps': 30 if height else None, 'tbr': tbr, 'vbr': tbr if acodec == 'none' else None,
+        'abr': None if acodec == 'none' else 128, 'asr': None if acodec == 'none' else 48000,
+        'filesize': int(tbr * 125 * duration), 'filesize_approx': None,
+        'resolution': f"{height * 16 // 9}x{height}" if height else 'audio only',
+        'aspect_ratio': 1.78 if height else None, 'dynamic_range': 'SDR' if height else None,
+        'container': 'mp4_dash', 'quality': float(height or 1), 'has_drm': False, 'source_preference': -1,
+        'language': 'en', 'language_preference': -1, 'preference': None, 'audio_ext': 'none',
+        'video_ext': 'mp4', 'downloader_options': {'http_chunk_size': 10485760},
+        'http_headers': dict(HEADERS), 'format': f"{format_id} - {height}p",
+    }
+    fmt.update(extra)
+    return fmt
+
+
+def youtube_payload(rng, duration):
+    fmts = []
+    for i in range(4):
+        fmts.append({'format_id': f"sb{i}", 'format_note': 'storyboard', 'ext': 'mhtml', 'protocol': 'mhtml',
+                     'vcodec': 'none', 'acodec': 'none', 'width': 160 >> i, 'height': 90 >> i,
+                     'rows': 5, 'columns': 5, 'fps': 0.2, 'url': signed_url(rng, 'i.ytimg.com', 120),
+                     'fragments': [{'url': signed_url(rng, 'i.ytimg.com', 120), 'duration': 125.0}
+                                   for _ in range(int(duration // 125) + 1)]})
+    for format_id, abr in (('139', 48), ('140', 128), ('249', 50), ('250', 70), ('251', 160)):
+        fmts.append(media_format(rng, format_id, None, 'none', 'opus', duration, abr=abr))
+    for height in (144, 240, 360, 480, 720, 1080, 1440, 2160):
+        for vcodec in ('avc1.4d401e', 'vp09.00.40.08', 'av01.0.08M.08'):
+            fmts.append(media_format(rng, f"{height}{vcodec[:2]}", height, vcodec, 'none', duration))
+    fmts.append(media_format(rng, '18', 360, 'avc1.42001E', 'mp4a.40.2', duration))
+
+    captions = {}
+    for i in range(150):
+        lang = f"{token(rng, 2).lower()}-{i}"
+        captions[lang] = [{'ext': ext, 'url': signed_url(rng, 'www.youtube.com', 350), 'name': f"Language {i}"}
+                          for ext in ('json3', 'srv1', 'srv2', 'srv3', 'ttml', 'vtt', 'srt')]
+    info = {
+        'id': token(rng, 11), 'title': "A long stream " + token(rng, 20), 'duration': duration,
+        'duration_string': f"{duration // 3600}:{duration // 60 % 60:02d}:{duration % 60:02d}",
+        'webpage_url': 'https://www.youtube.com/watch?v=xxxxxxxxxxx', 'extractor': 'youtube',
+        'extractor_key': 'Youtube', 'channel': 'Channel', 'uploader': 'Uploader', 'view_count': 123456,
+        'description': token(rng, 4000), 'tags': [token(rng, 8) for _ in range(30)],
+        'thumbnails': [{'url': signed_url(rng, 'i.ytimg.com', 80), 'preference': -i, 'id': str(i),
+                        'height': 90 * (i % 8 + 1), 'width': 160 * (i % 8 + 1)} for i in range(42)],
+        'heatmap': [{'start_time': i * duration / 100, 'end_time': (i + 1) * duration / 100,
+                     'value': rng.random()} for i in range(100)],
+        'automatic_captions': captions,
+        'subtitles': {'en': captions[next(iter(captions))]},
+        'chapters': [{'start_time': i * 600.0, 'end_time': (i + 1) * 600.0, 'title': f"Part {i}"}
+                     for i in range(duration // 600)],
+        'formats': fmts,
+    }
+    info['requested_formats'] = [dict(fmts[-2]), dict(fmts[8])]
+    info.update({k: v for k, v in fmts[-1].items() if k not in ('format_id',)})
+    info['format_id'] = f"{fmts[-2]['format_id']}+{fmts[8]['format_id']}"
+    return info
+
+
+def dash_payload(rng, duration):
+    fmts = []
+    for height in (240, 360, 480, 720, 1080):
+        fmts.append(media_format(rng, f"dash-video={height}", height, 'avc1.64001F', 'none', duration,
+                                 protocol='http_dash_segments', url=None,
+                                 manifest_url=f"https://cdn.example.com/{token(rng, 16)}/manifest.mpd",
+                                 fragment_base_url=f"https://cdn.example.com/{token(rng, 16)}/{height}/",
+                                 fragments=[{'path': f"segment-{i}.m4s", 'duration': 2.0}
+                                            for i in range(int(duration // 2))]))
+    fmts.append(media_format(rng, 'dash-audio=128000', None, 'none', 'mp4a.40.2', duration,
+                             protocol='http_dash_segments', url=None,
+                             fragment_base_url=f"https://cdn.example.com/{token(rng, 16)}/audio/",
+                             fragments=[{'path': f"segment-{i}.m4s", 'duration': 2.0}
+                                        for i in range(int(duration // 2))]))
+    return {'id': token(rng, 8), 'title': "Recorded event", 'duration': duration, 'extractor': 'generic',
+            'extractor_key': 'Generic', 'webpage_url': 'https://example.com/event',
+            'thumbnails': [{'url': signed_url(rng, 'example.com', 60)}], 'formats': fmts}
+
+
+def median_ms(fn, runs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def retained(build):
+    """(object, bytes allocated by build() that are still alive afterwards)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        obj = build()
+        gc.collect()
+        return obj, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def report(label, text, runs):
+    print(f"\n{label}: {len(text) / 1024 / 1024:.1f} MB of JSON")
+    loads = median_ms(lambda: json.loads(text), runs)
+    parse = median_ms(lambda: format_index.parse(text), runs)
+    print(f"  parse     json.loads {loads:8.1f} ms   json.loads + compact {parse:8.1f} ms")
+
+    full, full_bytes = retained(lambda: json.loads(text))
+    record, record_bytes = retained(lambda: format_index.parse(text))
+    print(f"  retained  full dict  {full_bytes / 1024 / 1024:8.2f} MB   record {record_bytes / 1024 / 1024:8.2f} MB"
+          f"   ({full_bytes / max(record_bytes, 1):.1f}x less)")
+
+    rank_full = median_ms(lambda: formats.rank_formats(full, 600, 660, 'smallest', combined_only=False), runs)
+    rank_record = median_ms(lambda: formats.rank_formats(record, 600, 660, 'smallest', combined_only=False), runs)
+    print(f"  rank      full dict  {rank_full:8.2f} ms   record {rank_record:8.2f} ms")
+
+    handoff_full = median_ms(lambda: json.dumps(format_index.to_info(full)), runs)
+    handoff_record = median_ms(lambda: json.dumps(format_index.to_info(record)), runs)
+    print(f"  handoff   full dict  {handoff_full:8.1f} ms   record {handoff_record:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--file', help="`yt-dlp -J` output to measure instead of the synthetic payloads")
+    parser.add_argument('--hours', type=float, nargs='+', default=[1, 3], help="synthetic video lengths")
+    parser.add_argument('-n', '--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding='utf-8') as f:
+            report(os.path.basename(args.file), f.read(), args.runs)
+        return
+
+    rng = random.Random(42)
+    for hours in args.hours:
+        duration = int(hours * 3600)
+        report(f"YouTube-style, {hours:g} h", json.dumps(youtube_payload(rng, duration)), args.runs)
+        report(f"DASH-style, {hours:g} h", json.dumps(dash_payload(rng, duration)), args.runs)
+
+
+if __name__ == '__main__':
+    main()
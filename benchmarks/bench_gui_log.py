@@ -0,0 +1,133 @@
+"""
+Throughput of the desktop GUI's log path (gui.LogPipeline).
+
+    python benchmarks/bench_gui_log.py                      # real Tk window
+    python benchmarks/bench_gui_log.py --headless           # no display: stub widget
+    python benchmarks/bench_gui_log.py --producers 4 --lines 200000
+
+Producer threads push yt-dlp-like lines (mostly progress, as with
+--newline) as fast as they can while the Tk loop drains the pipeline.
+Reports lines pushed/s, lines shown vs. skipped, the longest drain (how
+long the UI was blocked at once) and how many Tk callbacks were needed.
+--headless replaces Tk with a stub, which measures the pipeline's own
+overhead without text-widget costs.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import gui  # noqa: E402
+
+
+class StubRoot:
+    """Enough of tk.Tk for LogPipeline: after() callbacks run by update()."""
+
+    def __init__(self):
+        self._callbacks = []
+        self.scheduled = 0
+
+    def after(self, ms, fn, *args):
+        self.scheduled += 1
+        self._callbacks.append((time.perf_counter() + ms / 1000, fn, args))
+
+    def update(self):
+        now = time.perf_counter()
+        due = [c for c in self._callbacks if c[0] <= now]
+        self._callbacks = [c for c in self._callbacks if c[0] > now]
+        for _, fn, args in due:
+            fn(*args)
+
+    def destroy(self):
+        pass
+
+
+class StubText:
+    """Counts inserted lines instead of rendering them."""
+
+    def __init__(self):
+        self.inserts = 0
+
+    def insert(self, index, text, tag=None):
+        self.inserts += 1
+
+    def delete(self, first, last):
+        pass
+
+    def see(self, index):
+        pass
+
+    def config(self, **kwargs):
+        pass
+
+
+def producer(pipeline, count, index, progress_share):
+    for i in range(count):
+        if i % 100 < progress_share:
+            pipeline.push(f"[download] {i % 1000 / 10:5.1f}% of  102.40MiB at  8.31MiB/s ETA 00:{i % 60:02d}")
+        else:
+            pipeline.push(f"[#{index}] [info] line {i}: Downloading 1 format(s): 18", 'info')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=100000, help="lines per producer")
+    parser.add_argument('--producers', type=int, default=2, help="threads pushing lines (clips downloading)")
+    parser.add_argument('--progress-share', type=int, default=95, help="%% of lines that are progress lines")
+    parser.add_argument('--headless', action='store_true', help="stub Tk (no display needed)")
+    args = parser.parse_args()
+
+    if args.headless:
+        root, widget = StubRoot(), StubText()
+    else:
+        root = gui.tk.Tk()
+        widget = gui.scrolledtext.ScrolledText(root, height=20)
+        widget.pack()
+
+    pipeline = gui.LogPipeline(root, widget)
+
+    # Wrap the drain to time each UI frame (it reschedules itself through the attribute)
+    drains = []
+    original_drain = pipeline._drain
+
+    def timed_drain():
+        t0 = time.perf_counter()
+        original_drain()
+        drains.append(time.perf_counter() - t0)
+    pipeline._drain = timed_drain
+
+    inserted = [0]
+    original_insert = pipeline._insert
+
+    def counting_insert(batch):
+        inserted[0] += len(batch)
+        original_insert(batch)
+    pipeline._insert = counting_insert
+
+    threads = [threading.Thread(target=producer, args=(pipeline, args.lines, i, args.progress_share))
+               for i in range(args.producers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+
+    # Run the UI loop until producers are done and the pipeline is empty
+    while any(t.is_alive() for t in threads) or pipeline._pending:
+        root.update()
+        time.sleep(0.001)
+    produced = time.perf_counter() - started
+    root.update()
+    root.destroy()
+
+    total = args.lines * args.producers
+    print(f"lines pushed        {total:>12,}   ({total / produced:,.0f}/s over {produced:.2f} s)")
+    print(f"lines shown         {inserted[0]:>12,}   (the rest were skipped, log keeps {pipeline.max_lines})")
+    print(f"UI frames           {len(drains):>12,}   (one Tk callback each)")
+    if drains:
+        print(f"longest frame       {max(drains) * 1000:>12.2f} ms (budget {pipeline.budget * 1000:.0f} ms)")
+        print(f"mean frame          {sum(drains) / len(drains) * 1000:>12.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
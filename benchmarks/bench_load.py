@@ -0,0 +1,240 @@
+"""
+Load test of the web app against the local fake yt-dlp (benchmarks/fake_ytdlp.py).
+
+    python benchmarks/bench_load.py                                # both scenarios, 1..16 clients
+    python benchmarks/bench_load.py --scenario formats --levels 1 8 32 --requests 200
+    python benchmarks/bench_load.py --scenario download --speed 5 --extract-latency 1
+
+The app runs in this process on a threaded werkzeug server with
+YT_DLP_CMD pointing at the fake, so no site is contacted. For every
+concurrency level it reports p50/p95/p99 latency, requests/s, and the peak
+RSS and thread count of the server process (the fake yt-dlp processes are
+not included in RSS).
+
+Scenarios:
+  formats   POST /formats; every request uses a new URL (metadata cache miss)
+            unless --cached is given
+  download  POST /download, follow /jobs/<id> until finished, GET the clip;
+            every request cuts a different range, so the clip cache misses
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'web_gui'))
+sys.path.insert(0, HERE)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+JOB_POLL_INTERVAL = 0.05
+
+
+def write_shim(folder):
+    """Executable that runs fake_ytdlp.py with this interpreter (subprocess needs a command)."""
+    fake = os.path.join(HERE, 'fake_ytdlp.py')
+    if os.name == 'nt':
+        path = os.path.join(folder, 'yt-dlp.cmd')
+        with open(path, 'w') as f:
+            f.write(f'@"{sys.executable}" "{fake}" %*\r\n')
+    else:
+        path = os.path.join(folder, 'yt-dlp')
+        with open(path, 'w') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{fake}" "$@"\n')
+        os.chmod(path, 0o755)
+    return path
+
+
+def current_rss():
+    """Resident set size of this process in bytes (peak so far where the current value isn't available)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+    return 0
+
+
+class Sampler:
+    """Background thread recording peak RSS and thread count."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_threads = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_rss = max(self.peak_rss, current_rss())
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            self._stop.wait(self.interval)
+
+
+def request(base, method, path, body=None):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(base + path, data=data, method=method,
+                                 headers={'Content-Type': 'application/json'} if data else {})
+    try:
+        with urllib.request.urlopen(req, timeout=600) as resp:
+            payload = resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        payload = e.read()
+        status = e.code
+    return status, payload
+
+
+def formats_call(base, n, args):
+    url = 'https://fake.test/watch?v=cached' if args.cached else f'https://fake.test/watch?v={n}'
+    status, _ = request(base, 'POST', '/formats', {'url': url})
+    return status == 200
+
+
+def download_call(base, n, args):
+    # Distinct ranges (and URLs) so every request does a real download + cut
+    start = (n * 7) % max(args.duration - args.clip, 1)
+    status, payload = request(base, 'POST', '/download', {
+        'url': f'https://fake.test/watch?v={n % 8}',
+        'format_id': '18',
+        'start_time': f"{start // 60:02d}:{start % 60:02d}",
+        'end_time': f"{(start + args.clip) // 60:02d}:{(start + args.clip) % 60:02d}",
+    })
+    if status != 202:
+        return False
+    job = json.loads(payload)
+    while job.get('status') not in ('finished', 'failed'):
+        time.sleep(JOB_POLL_INTERVAL)
+        status, payload = request(base, 'GET', f"/jobs/{job['job_id']}")
+        if status != 200:
+            return False
+        job = json.loads(payload)
+    if job['status'] != 'finished':
+        return False
+    status, _ = request(base, 'GET', job['download_url'])
+    return status == 200
+
+
+SCENARIOS = {'formats': formats_call, 'download': download_call}
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def run_level(base, scenario, level, total, args, offset):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def one(n):
+        t0 = time.perf_counter()
+        try:
+            ok = SCENARIOS[scenario](base, offset + n, args)
+        except OSError:
+            ok = False
+        elapsed = time.perf_counter() - t0
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors[0] += 1
+
+    with Sampler() as sampler:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=level) as pool:
+            list(pool.map(one, range(total)))
+        wall = time.perf_counter() - started
+
+    if latencies:
+        p50, p95, p99 = (percentile(latencies, p) * 1000 for p in (50, 95, 99))
+        mean = statistics.mean(latencies) * 1000
+    else:
+        p50 = p95 = p99 = mean = float('nan')
+    print(f"{scenario:<9}{level:>5}{total:>6}{errors[0]:>6}{total / wall:>9.1f}"
+          f"{mean:>9.0f}{p50:>9.0f}{p95:>9.0f}{p99:>9.0f}"
+          f"{sampler.peak_rss / 1024 / 1024:>9.0f}{sampler.peak_threads:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=['formats', 'download', 'all'], default='all')
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 2, 4, 8, 16],
+                        help="concurrent clients per step")
+    parser.add_argument('--requests', type=int, default=0,
+                        help="requests per level (default: 4 x concurrency)")
+    parser.add_argument('--cached', action='store_true', help="formats: always the same URL")
+    parser.add_argument('--extract-latency', type=float, default=0.5, help="fake -J latency (s)")
+    parser.add_argument('--speed', type=float, default=20, help="fake download speed (MiB/s)")
+    parser.add_argument('--duration', type=int, default=300, help="fake video length (s)")
+    parser.add_argument('--clip', type=int, default=20, help="download: clip length (s)")
+    parser.add_argument('--workers', type=int, help="DOWNLOAD_WORKERS for the app")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench-load-')
+    os.environ.update({
+        'YT_DLP_CMD': write_shim(work_dir),
+        'YTDLP_ENGINE': 'subprocess',
+        'FAKE_YTDLP_EXTRACT_LATENCY': str(args.extract_latency),
+        'FAKE_YTDLP_SPEED': str(args.speed),
+        'FAKE_YTDLP_DURATION': str(args.duration),
+        # Keep the queue from rejecting the bigger levels
+        'MAX_QUEUED_JOBS': str(max(args.levels) * 8),
+        # Every request hits the same fake site; the per-host limit would 429 most of them
+        'HOST_RATE_PER_MIN': '1000000',
+        'HOST_BURST': '1000000',
+    })
+    if args.workers:
+        os.environ['DOWNLOAD_WORKERS'] = str(args.workers)
+
+    import fake_ytdlp
+    print("Preparing fake media...")
+    fake_ytdlp.ensure_media()
+
+    # The app keeps downloads under ./downloads
+    os.chdir(work_dir)
+    import app as web_app
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, web_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    scenarios = ['formats', 'download'] if args.scenario == 'all' else [args.scenario]
+    print(f"{'scenario':<9}{'conc':>5}{'reqs':>6}{'errs':>6}{'req/s':>9}"
+          f"{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'RSS MB':>9}{'threads':>8}")
+    offset = 0
+    for scenario in scenarios:
+        for level in args.levels:
+            total = args.requests or level * 4
+            run_level(base, scenario, level, total, args, offset)
+            offset += total
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+One yt-dlp process per clip vs. segment-parallel downloads (web_gui/segments.py).
+
+    python benchmarks/bench_segments.py                          # 5/10/20 min clips, 2/4/8 segments
+    python benchmarks/bench_segments.py --lengths 600 --segments 2 4 --speed 1
+
+Both paths download from the local fake yt-dlp (benchmarks/fake_ytdlp.py),
+whose --speed is a per-process limit, like the per-connection throttling
+of streaming sites. The parallel path splits the range, downloads the
+sub-ranges at once and joins them with the concat demuxer; its time
+includes the join. Needs ffmpeg.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'web_gui'))
+sys.path.insert(0, HERE)
+
+URL = 'https://fake.test/watch?v=segments'
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lengths', type=int, nargs='+', default=[300, 600, 1200], help="clip lengths (s)")
+    parser.add_argument('--segments', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--speed', type=float, default=0.5, help="fake download speed per process (MiB/s)")
+    parser.add_argument('--ffmpeg', default='ffmpeg')
+    parser.add_argument('--ffprobe', default='ffprobe')
+    args = parser.parse_args()
+
+    # The fake reads these at import, and so do the yt-dlp processes it runs as
+    os.environ['FAKE_YTDLP_SPEED'] = str(args.speed)
+    os.environ['FAKE_YTDLP_DURATION'] = str(max(args.lengths) + 60)
+    os.environ['FAKE_YTDLP_EXTRACT_LATENCY'] = '0'
+    os.environ['FAKE_YTDLP_FFMPEG'] = args.ffmpeg
+
+    import fake_ytdlp
+    import segments
+    from batch import format_clock
+    from bench_load import write_shim
+    from engine import SubprocessEngine
+
+    print(f"Generating {fake_ytdlp.DURATION}s test video...")
+    fake_ytdlp.ensure_media()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = SubprocessEngine(write_shim(tmp))
+        info = engine.extract_info(URL)
+
+        def download(output_template, start_time, end_time, on_event):
+            engine.download(URL, '18', output_template, start_time, end_time, on_event=on_event, info=info)
+
+        print(f"{'clip':>8} {'segments':>9} {'wall':>9} {'speedup':>8}")
+        for length in args.lengths:
+            start, end = 30.0, 30.0 + length
+            single = timed(lambda: download(os.path.join(tmp, 'single.%(ext)s'), format_clock(start),
+                                            format_clock(end), None))
+            print(f"{length:>7}s {1:>9} {single:>8.2f}s {1:>7.2f}x")
+            for count in args.segments:
+                ranges = segments.split_range(start, end, count)
+                wall = timed(lambda: segments.download_parallel(download, args.ffmpeg, tmp, 'parallel', ranges,
+                                                                ffprobe_cmd=args.ffprobe))
+                print(f"{length:>7}s {count:>9} {wall:>8.2f}s {single / wall:>7.2f}x")
+            for file in os.listdir(tmp):
+                if file.startswith(('single.', 'parallel.')):
+                    os.remove(os.path.join(tmp, file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Smart cut vs. full re-encode of the same range from a local source.
+
+    python benchmarks/bench_smartcut.py                       # synthetic 10 min 720p source
+    python benchmarks/bench_smartcut.py --source video.mp4 --start 61.3 --end 245.9
+
+The re-encode path is what --force-keyframes-at-cuts costs per clip; the
+smart path re-encodes only the partial GOPs at both ends. CPU time is the
+user+system time of the ffmpeg/ffprobe children (Unix only).
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web_gui'))
+import smartcut  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def children_cpu():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def make_source(ffmpeg, path, duration, gop_seconds):
+    """H.264/AAC test video with a keyframe every `gop_seconds` (typical for streaming sites)."""
+    fps = 30
+    subprocess.run([
+        ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate={fps}:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(gop_seconds * fps),
+        '-keyint_min', str(gop_seconds * fps), '-sc_threshold', '0',
+        '-c:a', 'aac', '-shortest', path
+    ], check=True)
+
+
+def measure(label, fn):
+    cpu0, wall0 = children_cpu(), time.perf_counter()
+    result = fn()
+    wall = time.perf_counter() - wall0
+    cpu = children_cpu() - cpu0
+    print(f"{label:<12} wall {wall:7.2f} s   cpu {cpu:7.2f} s   {result or ''}")
+    return wall, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', help="local video to cut (default: generate one)")
+    parser.add_argument('--duration', type=int, default=600, help="length of the generated source (s)")
+    parser.add_argument('--gop', type=int, default=2, help="keyframe interval of the generated source (s)")
+    parser.add_argument('--start', type=float, default=61.3)
+    parser.add_argument('--end', type=float, default=245.9)
+    parser.add_argument('--ffmpeg', default='ffmpeg')
+    parser.add_argument('--ffprobe', default='ffprobe')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = args.source
+        if not source:
+            source = os.path.join(tmp, 'source.mp4')
+            print(f"Generating {args.duration}s source (GOP {args.gop}s)...")
+            make_source(args.ffmpeg, source, args.duration, args.gop)
+
+        ext = os.path.splitext(source)[1]
+        reencoded = os.path.join(tmp, f'reencode{ext}')
+        smart = os.path.join(tmp, f'smart{ext}')
+
+        def reencode():
+            cmd = smartcut.full_reencode_cmd(args.ffmpeg, source, reencoded, args.start, args.end)
+            subprocess.run(cmd, check=True)
+
+        print(f"Cutting {args.start}-{args.end} ({args.end - args.start:.1f}s)")
+        full = measure('re-encode', reencode)
+        fast = measure('smart cut', lambda: smartcut.smart_cut(
+            args.ffmpeg, args.ffprobe, source, smart, args.start, args.end))
+
+        print(f"speed-up     wall x{full[0] / fast[0]:.1f}" +
+              (f"   cpu x{full[1] / fast[1]:.1f}" if fast[1] else ""))
+
+        for path in (reencoded, smart):
+            out = subprocess.run([args.ffprobe, '-v', 'error', '-show_entries', 'format=duration',
+                                  '-of', 'csv=p=0', path], capture_output=True, text=True)
+            print(f"{os.path.basename(path):<14} duration {out.stdout.strip()} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+Local stand-in for the `yt-dlp` executable, for benchmarks and CI.
+
+Understands the subset of options the app uses (-J, -f, -o, --load-info-json,
+--download-sections, --force-keyframes-at-cuts, --flat-playlist -j, ...).
+`-J` prints canned metadata;
+URLs with `list=` are playlists whose flat entries are printed one line at a
+time, the way a paged listing arrives. A download prints
+yt-dlp/ffmpeg style progress lines at a simulated speed and writes a real
+media file cut with ffmpeg from a generated test video. No network access.
+
+Tuned through environment variables:
+
+    FAKE_YTDLP_EXTRACT_LATENCY  seconds spent "talking to the site" per call   (0.5)
+    FAKE_YTDLP_SPEED            simulated download speed in MiB/s               (20)
+    FAKE_YTDLP_DURATION         length of the fake video in seconds             (300)
+    FAKE_YTDLP_FAIL_RATE        share of downloads that fail, 0..1              (0)
+    FAKE_YTDLP_PLAYLIST_SIZE    entries of a fake playlist                      (25)
+    FAKE_YTDLP_MEDIA            media file to serve (default: generated once)
+    FAKE_YTDLP_FFMPEG           ffmpeg command                                  (ffmpeg)
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+EXTRACT_LATENCY = float(os.environ.get('FAKE_YTDLP_EXTRACT_LATENCY', 0.5))
+SPEED = float(os.environ.get('FAKE_YTDLP_SPEED', 20)) * 1024 * 1024
+DURATION = int(os.environ.get('FAKE_YTDLP_DURATION', 300))
+FAIL_RATE = float(os.environ.get('FAKE_YTDLP_FAIL_RATE', 0))
+PLAYLIST_SIZE = int(os.environ.get('FAKE_YTDLP_PLAYLIST_SIZE', 25))
+FFMPEG = os.environ.get('FAKE_YTDLP_FFMPEG', 'ffmpeg')
+MEDIA = os.environ.get('FAKE_YTDLP_MEDIA') or os.path.join(
+    tempfile.gettempdir(), 'fake-ytdlp', f'source-{DURATION}s.mp4')
+
+# Progress lines printed per download
+PROGRESS_STEPS = 10
+
+
+def ensure_media(path=MEDIA, duration=DURATION, ffmpeg=FFMPEG):
+    """Generates the 360p H.264/AAC test video once; concurrent callers race harmlessly."""
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp.mp4"
+    subprocess.run([
+        ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size=640x360:rate=30:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '60', '-c:a', 'aac', '-shortest', tmp
+    ], check=True)
+    os.replace(tmp, path)
+    return path
+
+
+def video_info(url):
+    """What `yt-dlp -J` would print: a few combined formats, one video-only and one audio-only."""
+    video_id = hashlib.sha1(url.encode('utf-8')).hexdigest()[:11]
+    size = os.path.getsize(MEDIA) if os.path.exists(MEDIA) else DURATION * 100 * 1024
+
+    def fmt(format_id, height, vcodec, acodec, note, **extra):
+        f = {
+            'format_id': format_id, 'format_note': note, 'ext': 'mp4', 'protocol': 'https',
+            'url': MEDIA, 'vcodec': vcodec, 'acodec': acodec,
+            'width': height * 16 // 9 if height else None, 'height': height, 'fps': 30 if height else None,
+            'resolution': f"{height * 16 // 9}x{height}" if height else 'audio only',
+        }
+        f.update(extra)
+        return f
+
+    return {
+        'id': video_id,
+        'title': f'Fake video {video_id}',
+        'webpage_url': url,
+        'original_url': url,
+        'extractor': 'fake',
+        'extractor_key': 'Fake',
+        'duration': DURATION,
+        'duration_string': f"{DURATION // 60}:{DURATION % 60:02d}",
+        'formats': [
+            fmt('140', None, 'none', 'mp4a.40.2', 'medium', abr=128, filesize=DURATION * 16 * 1024),
+            fmt('18', 360, 'avc1.42001E', 'mp4a.40.2', '360p', filesize=size),
+            fmt('22', 720, 'avc1.64001F', 'mp4a.40.2', '720p', tbr=2500),
+            fmt('137', 1080, 'avc1.640028', 'none', '1080p', filesize_approx=size * 8),
+        ],
+    }
+
+
+def clock(seconds):
+    m, s = divmod(seconds, 60)
+    h, m = divmod(int(m), 60)
+    return f"{h:02d}:{m:02d}:{s:05.2f}"
+
+
+def mib(n):
+    return f"{n / 1024 / 1024:.2f}MiB"
+
+
+def to_seconds(text):
+    seconds = 0.0
+    for part in text.split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def out(line):
+    print(line, flush=True)
+
+
+def download(info, template, section, force_keyframes=False):
+    if random.random() < FAIL_RATE:
+        out("ERROR: [fake] Simulated failure (FAKE_YTDLP_FAIL_RATE)")
+        return 1
+
+    ensure_media()
+    start, end = section if section else (0.0, float(info['duration']))
+    total = int(os.path.getsize(MEDIA) * (end - start) / info['duration'])
+    fields = {
+        'id': info['id'], 'title': info['title'], 'ext': 'mp4', 'epoch': str(int(time.time())),
+        'section_start': str(int(start)), 'section_end': str(int(end)),
+    }
+    dest = re.sub(r'%\((\w+)\)s', lambda m: fields.get(m.group(1), 'NA'), template)
+
+    out(f"[fake] {info['id']}: Downloading webpage")
+    out(f"[info] {info['id']}: Downloading 1 format(s): 18")
+    out(f"[download] Destination: {dest}")
+    step = total / PROGRESS_STEPS
+    for i in range(1, PROGRESS_STEPS + 1):
+        time.sleep(step / SPEED)
+        done = step * i
+        if section:
+            # Sections go through ffmpeg in the real yt-dlp, so report like ffmpeg does
+            t = (end - start) * i / PROGRESS_STEPS
+            out(f"frame={int(t * 30):5d} fps= 30 q=28.0 size={int(done / 1024):8d}kB "
+                f"time={clock(t)} bitrate=1000.0kbits/s speed={SPEED / max(total / (end - start), 1):.1f}x")
+        else:
+            eta = int((total - done) / SPEED)
+            out(f"[download] {done * 100 / total:5.1f}% of {mib(total):>10} at {mib(SPEED)}/s ETA 00:{eta:02d}")
+
+    if section:
+        # Like yt-dlp: --force-keyframes-at-cuts re-encodes the section with ffmpeg's
+        # default encoders, without it the packets are copied (cuts land on keyframes)
+        codecs = [] if force_keyframes else ['-c', 'copy']
+        subprocess.run([FFMPEG, '-hide_banner', '-loglevel', 'error', '-y', '-ss', f"{start:.3f}",
+                        '-i', MEDIA, '-t', f"{end - start:.3f}", *codecs, dest], check=True)
+    else:
+        shutil.copyfile(MEDIA, dest)
+    out(f"[download] 100% of {mib(total)} in 00:00:01 at {mib(SPEED)}/s")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('url', nargs='?')
+    parser.add_argument('-J', '--dump-single-json', action='store_true')
+    parser.add_argument('-j', '--dump-json', action='store_true')
+    parser.add_argument('--flat-playlist', action='store_true')
+    parser.add_argument('-f', '--format')
+    parser.add_argument('-o', '--output', default='%(title)s [%(id)s].%(ext)s')
+    parser.add_argument('--load-info-json')
+    parser.add_argument('--download-sections')
+    parser.add_argument('--force-keyframes-at-cuts', action='store_true')
+    parser.add_argument('--version', action='store_true')
+    args, _ = parser.parse_known_args()  # --newline, --restrict-filenames, ... change nothing here
+
+    if args.version:
+        out('2099.01.01 (fake)')
+        return 0
+
+    if args.dump_json and args.url and 'list=' in args.url:
+        # Flat listing: a page of entries every tenth of the extract latency
+        for i in range(PLAYLIST_SIZE):
+            time.sleep(EXTRACT_LATENCY / 10)
+            print(json.dumps({'_type': 'url', 'id': f"entry{i:04d}", 'title': f"Fake entry {i + 1}",
+                              'url': f"https://fake.test/watch?v=entry{i:04d}", 'duration': DURATION}),
+                  flush=True)
+        return 0
+
+    if args.load_info_json:
+        with open(args.load_info_json, encoding='utf-8') as f:
+            info = json.load(f)
+    elif args.url:
+        time.sleep(EXTRACT_LATENCY)
+        info = video_info(args.url)
+    else:
+        print("ERROR: You must provide at least one URL.", file=sys.stderr)
+        return 2
+
+    if args.dump_single_json or args.dump_json:
+        print(json.dumps(info))
+        return 0
+
+    section = None
+    if args.download_sections:
+        m = re.match(r'^\*?([\d:.]+)-([\d:.]+)$', args.download_sections)
+        if m:
+            section = (to_seconds(m.group(1)), min(to_seconds(m.group(2)), float(info['duration'])))
+    return download(info, args.output, section, args.force_keyframes_at_cuts)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
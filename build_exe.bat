@@ -3,7 +3,7 @@ echo Installing PyInstaller...
 python -m pip install pyinstaller
 
 echo Building EXE...
-python -m PyInstaller --noconsole --onefile --name "DL-Master" gui.py
+python -m PyInstaller --noconsole --onefile --name "DL-Master" --paths web_gui gui.py
 
 echo.
 echo Build Complete! Look in the 'dist' folder.
@@ -1,24 +1,185 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-import subprocess
 import threading
-import json
+import time
 import os
 import sys
+import math
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared helpers (progress parsing, ...) live next to the web app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web_gui'))
+import progress
+from engine import LazyEngine, EngineError, section_seconds
+import formats
+import preview
+from preview import PreviewCache, PreviewError
 
 # Configure yt-dlp command - assumes it's in the same directory or PATH
 YT_DLP_CMD = 'yt-dlp'
+FFMPEG_CMD = 'ffmpeg'
+
+PHASE_LABELS = {
+    progress.EXTRACT: "Reading video info",
+    progress.DOWNLOAD: "Downloading",
+    progress.CUT: "Cutting clip (ffmpeg)",
+    progress.POSTPROCESS: "Finishing up",
+    progress.DONE: "Done",
+    progress.ERROR: "Error",
+}
+
+# Log pipeline: how many lines the log keeps, how often the UI drains it and
+# how much UI time one drain may use
+LOG_MAX_LINES = int(os.environ.get('DL_LOG_MAX_LINES', 2000))
+LOG_FRAME_MS = 50
+LOG_FRAME_BUDGET = 0.008
+
+# "Best means" choices -> formats.POLICIES
+POLICY_LABELS = [
+    ("Best quality", 'quality'),
+    ("Smallest download", 'smallest'),
+    ("Fastest to cut", 'fastest'),
+]
+
+# Clip queue: how many clips download at once by default / at most
+DEFAULT_PARALLEL_CLIPS = 2
+MAX_PARALLEL_CLIPS = 8
+# Playlist entries that may wait in the clip queue before the listing pauses
+PLAYLIST_BUFFER = 4
+
+# Timeline preview: where the images are kept (PNG, which Tk reads without
+# extra packages), pixels between tiles and tiles rendered at once
+PREVIEW_FOLDER = os.path.join(tempfile.gettempdir(), 'dl-master-previews')
+PREVIEW_GAP = 4
+PREVIEW_WORKERS = 2
+
+def format_time(seconds):
+    """125 -> "02:05", 3725 -> "1:02:05" (what the time fields take)."""
+    m, s = divmod(int(seconds), 60)
+    h, m = divmod(m, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+class LogPipeline:
+    """
+    Thread-safe log feed for a Tk text widget.
+
+    Worker threads push() lines into a bounded queue; the Tk thread drains
+    it every `frame_ms` within a fixed time budget and inserts runs of
+    lines with the same tag in one go. The widget works as a ring buffer
+    capped at `max_lines`. Frequently changing state (like the progress
+    bar) goes through set_latest(), so only the newest value is applied per
+    frame instead of one Tk callback per output line.
+    """
+
+    def __init__(self, root, widget, max_lines=LOG_MAX_LINES, frame_ms=LOG_FRAME_MS, budget=LOG_FRAME_BUDGET):
+        self.root = root
+        self.widget = widget
+        self.max_lines = max_lines
+        self.frame_ms = frame_ms
+        self.budget = budget
+
+        self._lock = threading.Lock()
+        # Lines that wouldn't survive the ring buffer anyway are dropped on arrival
+        self._pending = deque(maxlen=max_lines)
+        self._dropped = 0
+        self._latest = {}
+        self.lines = 0  # lines currently in the widget
+
+        self.root.after(self.frame_ms, self._drain)
+
+    def push(self, message, tag=None):
+        """Queues a log line. Safe to call from any thread."""
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append((message, tag))
+
+    def set_latest(self, name, fn, *args):
+        """Runs fn(*args) on the next frame, replacing any earlier call queued under `name`."""
+        with self._lock:
+            self._latest[name] = (fn, args)
+
+    def discard_latest(self, name):
+        with self._lock:
+            self._latest.pop(name, None)
+
+    def _take(self, limit):
+        with self._lock:
+            batch = [self._pending.popleft() for _ in range(min(limit, len(self._pending)))]
+            dropped, self._dropped = self._dropped, 0
+            return batch, dropped
+
+    def _drain(self):
+        deadline = time.perf_counter() + self.budget
+        try:
+            with self._lock:
+                latest, self._latest = self._latest, {}
+            for fn, args in latest.values():
+                fn(*args)
+
+            wrote = False
+            while time.perf_counter() < deadline:
+                batch, dropped = self._take(200)
+                if not batch and not dropped:
+                    break
+                if not wrote:
+                    self.widget.config(state='normal')
+                    wrote = True
+                if dropped:
+                    self._insert([(f"... {dropped} lines skipped ...", 'info')])
+                self._insert(batch)
+
+            if wrote:
+                self._trim()
+                self.widget.see(tk.END)
+                self.widget.config(state='disabled')
+        finally:
+            self.root.after(self.frame_ms, self._drain)
+
+    def _insert(self, batch):
+        # One insert per run of same-tag lines
+        run, run_tag = [], None
+        for message, tag in batch:
+            if run and tag != run_tag:
+                self.widget.insert(tk.END, "\n".join(run) + "\n", run_tag)
+                run = []
+            run.append(message)
+            run_tag = tag
+            self.lines += message.count("\n") + 1
+        if run:
+            self.widget.insert(tk.END, "\n".join(run) + "\n", run_tag)
+
+    def _trim(self):
+        excess = self.lines - self.max_lines
+        if excess > 0:
+            self.widget.delete('1.0', f'{excess + 1}.0')
+            self.lines -= excess
+
 
 class YtDlpGui:
     def __init__(self, root):
         self.root = root
         self.root.title("DL-Master (yt-dlp GUI)")
-        self.root.geometry("600x500")
+        self.root.geometry("640x760")
         self.root.configure(bg="#f0f0f0")
 
         self.style = ttk.Style()
         self.style.theme_use('clam')
 
+        # One warm yt-dlp instance is plenty for a desktop app
+        self.engine = LazyEngine(os.environ.get('YTDLP_ENGINE', 'auto'), cmd=YT_DLP_CMD, pool_size=1)
+        self.engine.warm_up()
+
+        self.video_info = None
+        self.info_url = None
+
+        # Timeline preview; the cache (and its janitor thread) is created on first use
+        self.preview_cache = None
+        self.preview_pool = ThreadPoolExecutor(max_workers=PREVIEW_WORKERS)
+        self.preview_state = None
+
         self.create_widgets()
 
     def create_widgets(self):
@@ -41,6 +202,12 @@ class YtDlpGui:
         self.check_formats_btn = ttk.Button(fmt_frame, text="Check Formats", command=self.check_formats)
         self.check_formats_btn.pack(side=tk.LEFT, padx=5)
 
+        self.playlist_btn = ttk.Button(fmt_frame, text="Queue Playlist", command=self.queue_playlist)
+        self.playlist_btn.pack(side=tk.LEFT, padx=5)
+
+        self.preview_btn = ttk.Button(fmt_frame, text="Preview Timeline", command=self.show_preview)
+        self.preview_btn.pack(side=tk.LEFT, padx=5)
+
         self.formats_loading = ttk.Label(fmt_frame, text="")
         self.formats_loading.pack(side=tk.LEFT, padx=5)
 
@@ -51,6 +218,17 @@ class YtDlpGui:
         self.quality_combo.pack(fill=tk.X, pady=5)
         self.quality_map = {} # To store format_id mapping
 
+        # With "Best Available", pick the format per clip by policy (formats.py)
+        policy_frame = ttk.Frame(main_frame)
+        policy_frame.pack(fill=tk.X, pady=(0, 5))
+        tk.Label(policy_frame, text="Best means:").pack(side=tk.LEFT, padx=5)
+        self.policy_var = tk.StringVar(value=POLICY_LABELS[0][0])
+        ttk.Combobox(policy_frame, textvariable=self.policy_var, state="readonly", width=20,
+                     values=[label for label, _ in POLICY_LABELS]).pack(side=tk.LEFT)
+        tk.Label(policy_frame, text="At least (p):").pack(side=tk.LEFT, padx=5)
+        self.height_var = tk.StringVar(value="")
+        ttk.Entry(policy_frame, textvariable=self.height_var, width=6).pack(side=tk.LEFT)
+
         # Time Section
         time_frame = ttk.LabelFrame(main_frame, text="Time Range (mm:ss)", padding="10")
         time_frame.pack(fill=tk.X, pady=5)
@@ -68,9 +246,59 @@ class YtDlpGui:
         # Bind Enter key on End Entry to Download
         self.end_entry.bind('<Return>', lambda e: self.start_download())
 
-        # Download Button
-        self.download_btn = ttk.Button(main_frame, text="Download Clip", command=self.start_download)
-        self.download_btn.pack(fill=tk.X, pady=15)
+        # Timeline preview (shown by "Preview Timeline"): tiles are rendered as they scroll into view
+        self.preview_frame = ttk.LabelFrame(main_frame, text="Timeline (click: Start, right-click: End)",
+                                            padding="5")
+        self.preview_canvas = tk.Canvas(self.preview_frame, height=110, bg="#1e293b", highlightthickness=0)
+        self.preview_scroll = ttk.Scrollbar(self.preview_frame, orient=tk.HORIZONTAL,
+                                            command=self.preview_canvas.xview)
+        self.preview_canvas.configure(xscrollcommand=self._preview_scrolled)
+        self.preview_canvas.pack(fill=tk.X)
+        self.preview_scroll.pack(fill=tk.X)
+        self.preview_canvas.bind('<Configure>', lambda e: self._preview_visible())
+        self.preview_canvas.bind('<Button-1>', lambda e: self._preview_pick(e, self.start_var))
+        self.preview_canvas.bind('<Button-3>', lambda e: self._preview_pick(e, self.end_var))
+        self.preview_canvas.bind('<MouseWheel>', lambda e: self.preview_canvas.xview_scroll(
+            -1 if e.delta > 0 else 1, 'units'))
+        self.time_frame = time_frame
+
+        # Download Button (adds to the clip queue, never blocks)
+        self.download_btn = ttk.Button(main_frame, text="Add Clip to Queue", command=self.start_download)
+        self.download_btn.pack(fill=tk.X, pady=(15, 5))
+
+        # Clip Queue Section
+        queue_frame = ttk.LabelFrame(main_frame, text="Clip Queue", padding="5")
+        queue_frame.pack(fill=tk.BOTH, pady=5)
+
+        queue_ctrl = ttk.Frame(queue_frame)
+        queue_ctrl.pack(fill=tk.X)
+        tk.Label(queue_ctrl, text="Parallel downloads:").pack(side=tk.LEFT, padx=5)
+        self.parallel_var = tk.StringVar(value=str(DEFAULT_PARALLEL_CLIPS))
+        ttk.Spinbox(queue_ctrl, from_=1, to=MAX_PARALLEL_CLIPS, width=4, textvariable=self.parallel_var,
+                    command=self._dispatch_clips).pack(side=tk.LEFT)
+        ttk.Button(queue_ctrl, text="Retry Failed", command=self.retry_failed).pack(side=tk.RIGHT, padx=5)
+
+        self.clip_tree = ttk.Treeview(queue_frame, columns=('num', 'range', 'format', 'status'),
+                                      show='headings', height=5)
+        for col, title, width in (('num', "#", 40), ('range', "Range", 130),
+                                  ('format', "Format", 80), ('status', "Status", 280)):
+            self.clip_tree.heading(col, text=title)
+            self.clip_tree.column(col, width=width, stretch=(col == 'status'))
+        self.clip_tree.pack(fill=tk.BOTH, expand=True, pady=(5, 0))
+
+        self.clips = {}                 # id -> clip dict, in the order they were added
+        self.pending_clips = deque()    # clips waiting for a free slot
+        self.running_clips = 0
+        self.clip_seq = 0
+        # Taken by the playlist listing per queued entry, given back when the entry starts
+        self.playlist_slots = threading.Semaphore(PLAYLIST_BUFFER)
+
+        # Overall progress (driven by events from progress.ProgressParser)
+        self.progress_var = tk.DoubleVar(value=0)
+        self.progress_bar = ttk.Progressbar(main_frame, variable=self.progress_var, maximum=100)
+        self.progress_bar.pack(fill=tk.X, pady=(5, 2))
+        self.progress_label = ttk.Label(main_frame, text="")
+        self.progress_label.pack(fill=tk.X, pady=(0, 10))
 
         # Log Area
         log_frame = ttk.LabelFrame(main_frame, text="Log", padding="5")
@@ -84,11 +312,11 @@ class YtDlpGui:
         self.log_area.tag_config('success', foreground='green')
         self.log_area.tag_config('info', foreground='blue')
 
+        self.log_pipeline = LogPipeline(self.root, self.log_area)
+
     def log(self, message, tag=None):
-        self.log_area.config(state='normal')
-        self.log_area.insert(tk.END, message + "\n", tag)
-        self.log_area.see(tk.END)
-        self.log_area.config(state='disabled')
+        """Adds a line to the log. Safe to call from worker threads."""
+        self.log_pipeline.push(message, tag)
 
     def check_formats(self):
         url = self.url_var.get().strip()
@@ -104,27 +332,9 @@ class YtDlpGui:
 
     def _run_formats(self, url):
         try:
-            # Run yt-dlp -J to get JSON info
-            # Using creationflags=subprocess.CREATE_NO_WINDOW to hide console on Windows if packaged
-            startupinfo = None
-            if os.name == 'nt':
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-            process = subprocess.Popen(
-                [YT_DLP_CMD, '-J', url],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8', 
-                startupinfo=startupinfo
-            )
-            stdout, stderr = process.communicate()
-
-            if process.returncode != 0:
-                self.root.after(0, self._formats_error, stderr)
-            else:
-                self.root.after(0, self._formats_success, stdout)
+            # yt-dlp -J equivalent (in-process when the yt_dlp package is available)
+            info = self.engine.extract_info(url)
+            self.root.after(0, self._formats_success, url, info)
 
         except Exception as e:
             self.root.after(0, self._formats_error, str(e))
@@ -134,46 +344,35 @@ class YtDlpGui:
         self.formats_loading.config(text="Error fetching formats", foreground="red")
         self.log(f"Error fetching formats: {error_msg}", "error")
 
-    def _formats_success(self, json_data):
+    def _formats_success(self, url, data):
         self.check_formats_btn.config(state=tk.NORMAL)
+        # Kept for every clip queued from this URL
+        self.video_info = data
+        self.info_url = url
+
         self.formats_loading.config(text="Formats loaded!", foreground="green")
         
         try:
-            data = json.loads(json_data)
             self.log(f"Successfully fetched details for: {data.get('title', 'Unknown Title')}", "success")
             
-            formats = data.get('formats', [])
-            # Filter and process formats
-            video_formats = []
-            
             # Simple list for parsing
             self.quality_map = {} 
             display_values = ["Best Available (Default)"]
             self.quality_map["Best Available (Default)"] = "best"
 
-            # Reverse to get best quality typically at bottom/top depending on list
-            # yt-dlp usually sorts worst to best.
-            for f in reversed(formats):
-                # We want video resolutions, skip audio only usually (vcodec='none')
-                if f.get('vcodec') != 'none' and f.get('resolution') != 'audio only':
-                     fid = f.get('format_id')
-                     res = f.get('resolution') or f"{f.get('width')}x{f.get('height')}"
-                     ext = f.get('ext')
-                     note = f.get('format_note', '')
-                     filesize = f.get('filesize')
-                     fs_str = f"{filesize / 1024 / 1024:.2f} MB" if filesize else "N/A"
-                     
-                     display_str = f"{res} ({ext}) - {note} [{fs_str}]"
-                     display_values.append(display_str)
-                     self.quality_map[display_str] = fid
+            # Video formats (audio-only skipped), best quality first
+            for f in formats.rank_formats(data, combined_only=False):
+                display_values.append(f['display'])
+                self.quality_map[f['display']] = f['id']
 
             self.quality_combo['values'] = display_values
             self.quality_combo.current(0)
 
-        except json.JSONDecodeError:
-            self.log("Failed to parse JSON output from yt-dlp", "error")
+        except (AttributeError, TypeError):
+            self.log("Unexpected metadata returned by yt-dlp", "error")
 
     def start_download(self):
+        """Adds the current (start, end, format) to the clip queue; earlier clips keep running."""
         url = self.url_var.get().strip()
         start = self.start_var.get().strip()
         end = self.end_var.get().strip()
@@ -185,80 +384,327 @@ class YtDlpGui:
         display_quality = self.quality_combo.get()
         format_id = self.quality_map.get(display_quality, 'best')
 
-        self.download_btn.config(state=tk.DISABLED, text="Downloading...")
-        self.log(f"Starting download: {url} [{start} - {end}] (Format: {format_id})", "info")
+        # Metadata from "Check Formats" is reused so queued clips skip extraction
+        info = self.video_info if url == self.info_url else None
+
+        policy = dict(POLICY_LABELS).get(self.policy_var.get(), 'quality')
+        if format_id == 'best' and policy != 'quality' and info is not None:
+            try:
+                height = int(self.height_var.get() or 0)
+            except ValueError:
+                messagebox.showwarning("Invalid Height", "\"At least\" must be a number of pixels, e.g. 720.")
+                return
+            section = section_seconds(start, end) or (None, None)
+            format_id = formats.choose_format(info, section[0], section[1], policy, height)
+
+        # Start/End keep the range until the clip succeeds (see _download_success)
+        self._add_clip(url, start, end, format_id, info)
+
+    def _add_clip(self, url, start, end, format_id, info, title=None):
+        self.clip_seq += 1
+        clip = {
+            'id': f"clip{self.clip_seq}",
+            'number': self.clip_seq,
+            'url': url,
+            'start': start,
+            'end': end,
+            'format_id': format_id,
+            'info': info,
+            'percent': 0.0,
+            # Playlist entries hold a listing slot until they start
+            'holds_slot': title is not None,
+        }
+        self.clips[clip['id']] = clip
+        self.clip_tree.insert('', tk.END, iid=clip['id'],
+                              values=(clip['number'], f"{start} - {end}", format_id, "Queued"))
+        self.clip_tree.see(clip['id'])
+        self.pending_clips.append(clip)
+        self.log(f"Queued clip #{clip['number']}: {title or url} [{start} - {end}] (Format: {format_id})", "info")
+        self._dispatch_clips()
+
+    def queue_playlist(self):
+        """
+        Queues the current range for every entry of a playlist or channel. Entries
+        are listed lazily (flat extraction) and added as they arrive; the listing
+        pauses while PLAYLIST_BUFFER of them are still waiting for a download slot.
+        """
+        url = self.url_var.get().strip()
+        start = self.start_var.get().strip()
+        end = self.end_var.get().strip()
+        if not url or not start or not end:
+            messagebox.showwarning("Missing Info", "Please fill in URL, Start Time, and End Time.")
+            return
 
-        threading.Thread(target=self._run_download, args=(url, start, end, format_id), daemon=True).start()
+        self.playlist_btn.config(state=tk.DISABLED)
+        self.log(f"Listing playlist: {url}", "info")
+        threading.Thread(target=self._run_playlist, args=(url, start, end), daemon=True).start()
 
-    def _run_download(self, url, start, end, format_id):
+    def _run_playlist(self, url, start, end):
+        count = 0
         try:
-            # Construct command
-            # yt-dlp -f format_id url -o ... --download-sections ...
-            cmd = [
-                YT_DLP_CMD,
-                '-f', format_id,
-                url,
-                '-o', '%(title)s_%(section_start)s-%(section_end)s_%(epoch)s.%(ext)s',
-                '--restrict-filenames', # Prevent issues with special characters/length on Windows
-                '--download-sections', f'*{start}-{end}',
-                '--force-keyframes-at-cuts'
-            ]
-
-            startupinfo = None
-            if os.name == 'nt':
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding='utf-8',
-                startupinfo=startupinfo,
-                bufsize=1 # Line buffered
-            )
+            for entry in self.engine.iter_playlist(url):
+                if not entry['url']:
+                    continue
+                self.playlist_slots.acquire()
+                count += 1
+                # Each entry's metadata is extracted by its own download, as it gets a slot
+                self.root.after(0, self._add_clip, entry['url'], start, end, 'best', None, entry['title'])
+            self.root.after(0, self._playlist_done, count, None)
+        except Exception as e:
+            self.root.after(0, self._playlist_done, count, str(e))
 
-            # Read stdout line by line
-            while True:
-                line = process.stdout.readline()
-                if not line and process.poll() is not None:
-                    break
-                if line:
-                    self.root.after(0, self.log, line.strip())
+    def _playlist_done(self, count, error):
+        self.playlist_btn.config(state=tk.NORMAL)
+        if error:
+            self.log(f"Playlist listing stopped after {count} entries: {error}", "error")
+        else:
+            self.log(f"Playlist listed: {count} entries queued", "success")
 
-            # Read stderr for errors
-            stderr_out = process.stderr.read()
-            if stderr_out:
-                self.root.after(0, self.log, stderr_out.strip(), "error")
+    def show_preview(self):
+        """Shows cheap thumbnails over the timeline (preview.py) to pick Start/End before downloading."""
+        url = self.url_var.get().strip()
+        if not url:
+            messagebox.showerror("Error", "Please enter a valid URL")
+            return
 
-            rc = process.poll()
-            
-            if rc == 0:
-                self.root.after(0, self._download_success)
+        self.preview_btn.config(state=tk.DISABLED)
+        info = self.video_info if url == self.info_url else None
+        threading.Thread(target=self._load_preview, args=(url, info), daemon=True).start()
+
+    def _load_preview(self, url, info):
+        try:
+            if info is None:
+                info = self.engine.extract_info(url)
+            # One tile tells the step and tile size of the whole timeline
+            first = preview.tiles(info, 0, 1)
+            self.root.after(0, self._preview_ready, url, info, first)
+        except Exception as e:
+            self.root.after(0, self._preview_error, str(e))
+
+    def _preview_error(self, error_msg):
+        self.preview_btn.config(state=tk.NORMAL)
+        self.log(f"Preview failed: {error_msg}", "error")
+
+    def _preview_ready(self, url, info, first):
+        self.preview_btn.config(state=tk.NORMAL)
+        if self.preview_cache is None:
+            self.preview_cache = PreviewCache(PREVIEW_FOLDER, FFMPEG_CMD, ext='png')
+
+        tile = first['tiles'][0]
+        self.preview_state = {
+            'url': url,
+            'info': info,
+            'step': first['step'],
+            'count': math.ceil(first['duration'] / first['step']),
+            'pitch': tile['width'] + PREVIEW_GAP,
+            'requested': set(),
+            'sheets': {},   # path -> PhotoImage of a whole storyboard sheet
+            'images': [],   # keeps the tiles' PhotoImages alive
+        }
+        height = tile['height'] + 18
+        self.preview_canvas.delete('all')
+        self.preview_canvas.configure(height=height,
+                                      scrollregion=(0, 0, self.preview_state['count'] * self.preview_state['pitch'],
+                                                    height))
+        self.preview_canvas.xview_moveto(0)
+        self.preview_frame.pack(fill=tk.X, pady=5, after=self.time_frame)
+        self.log(f"Timeline preview from {first['source']}, a tile every {first['step']:g}s", "info")
+        self.root.after_idle(self._preview_visible)
+
+    def _preview_scrolled(self, first, last):
+        self.preview_scroll.set(first, last)
+        self._preview_visible()
+
+    def _preview_visible(self):
+        """Queues the tiles in (or next to) the visible part of the timeline that aren't rendered yet."""
+        state = self.preview_state
+        if state is None:
+            return
+        left = self.preview_canvas.canvasx(0)
+        right = self.preview_canvas.canvasx(self.preview_canvas.winfo_width())
+        first = max(0, int(left // state['pitch']) - 2)
+        last = min(state['count'], int(right // state['pitch']) + 3)
+        missing = [i for i in range(first, last) if i not in state['requested']]
+        if not missing:
+            return
+
+        page = preview.tiles(state['info'], missing[0] * state['step'], missing[-1] - missing[0] + 1,
+                             state['step'])
+        for tile in page['tiles']:
+            index = round(tile['time'] / state['step'])
+            if index in state['requested']:
+                continue
+            state['requested'].add(index)
+            x = index * state['pitch']
+            self.preview_canvas.create_rectangle(x, 0, x + tile['width'], tile['height'], fill="#334155",
+                                                 outline="")
+            self.preview_canvas.create_text(x + tile['width'] // 2, tile['height'] + 9,
+                                            text=format_time(tile['time']), fill="#e2e8f0",
+                                            font=("Segoe UI", 8))
+            self.preview_pool.submit(self._render_tile, state, index, tile)
+
+    def _render_tile(self, state, index, tile):
+        try:
+            path = self.preview_cache.image(state['url'], tile['image'], lambda: state['info'])
+            self.root.after(0, self._place_tile, state, index, tile, path)
+        except PreviewError as e:
+            self.log(f"Preview image {tile['image']} failed: {e}", "error")
+
+    def _place_tile(self, state, index, tile, path):
+        if state is not self.preview_state:
+            return  # another URL is previewed now
+        sheet = state['sheets'].get(path)
+        if sheet is None:
+            sheet = state['sheets'][path] = tk.PhotoImage(file=path)
+        if (tile['x'], tile['y']) == (0, 0) and sheet.width() <= tile['width']:
+            image = sheet
+        else:
+            # A tile of a storyboard sprite sheet
+            image = tk.PhotoImage(width=tile['width'], height=tile['height'])
+            image.tk.call(image, 'copy', sheet, '-from', tile['x'], tile['y'], tile['x'] + tile['width'],
+                          tile['y'] + tile['height'], '-to', 0, 0)
+        state['images'].append(image)
+        self.preview_canvas.create_image(index * state['pitch'], 0, anchor=tk.NW, image=image)
+
+    def _preview_pick(self, event, var):
+        state = self.preview_state
+        if state is None:
+            return
+        index = int(self.preview_canvas.canvasx(event.x) // state['pitch'])
+        if 0 <= index < state['count']:
+            var.set(format_time(index * state['step']))
+
+    def _parallel_limit(self):
+        try:
+            return max(1, min(MAX_PARALLEL_CLIPS, int(self.parallel_var.get())))
+        except (tk.TclError, ValueError):
+            return 1
+
+    def _dispatch_clips(self):
+        """Starts queued clips while fewer than the configured number are running."""
+        while self.pending_clips and self.running_clips < self._parallel_limit():
+            clip = self.pending_clips.popleft()
+            if clip.pop('holds_slot', False):
+                self.playlist_slots.release()
+            self.running_clips += 1
+            self._set_clip_status(clip, PHASE_LABELS[progress.EXTRACT])
+            threading.Thread(target=self._run_download, args=(clip,), daemon=True).start()
+        self._update_overall()
+
+    def retry_failed(self):
+        for clip in self.clips.values():
+            if clip.get('failed'):
+                clip['failed'] = False
+                clip['percent'] = 0.0
+                self._set_clip_status(clip, "Queued")
+                self.pending_clips.append(clip)
+                self._show_range(clip)
+        self._dispatch_clips()
+
+    def _show_range(self, clip):
+        """Puts a clip's range back into Start/End, unless the user is already typing another one."""
+        if not self.start_var.get().strip() and not self.end_var.get().strip():
+            self.start_var.set(clip['start'])
+            self.end_var.set(clip['end'])
+
+    def _run_download(self, clip):
+        def on_line(line, event):
+            # yt-dlp stdout and ffmpeg stderr arrive here as they are produced (see engine.py)
+            if event is not None and event['percent'] is not None:
+                self.log_pipeline.set_latest(clip['id'], self._update_progress, clip, event)
             else:
-                self.root.after(0, self._download_error)
+                tag = "error" if line.startswith("ERROR:") else None
+                self.log(f"[#{clip['number']}] {line}", tag)
+
+        try:
+            self.engine.download(
+                clip['url'], clip['format_id'],
+                '%(title)s_%(section_start)s-%(section_end)s_%(epoch)s.%(ext)s',
+                clip['start'], clip['end'],
+                restrict_filenames=True, # Prevent issues with special characters/length on Windows
+                on_line=on_line,
+                info=clip['info']
+            )
+            self.root.after(0, self._download_success, clip)
+
+        except EngineError:
+            # yt-dlp's own error lines are already in the log
+            self.root.after(0, self._download_error, clip)
 
         except Exception as e:
-             self.root.after(0, self._download_error_msg, str(e))
+             self.root.after(0, self._download_error_msg, clip, str(e))
+
+    def _set_clip_status(self, clip, status):
+        values = list(self.clip_tree.item(clip['id'], 'values'))
+        values[3] = status
+        self.clip_tree.item(clip['id'], values=values)
+
+    def _update_progress(self, clip, event):
+        clip['percent'] = event['percent']
+        text = f"{PHASE_LABELS.get(event['phase'], event['phase'])}: {event['percent']:.0f}%"
+        if isinstance(event['speed'], int):
+            text += f" at {event['speed'] / 1024 / 1024:.2f} MB/s"
+        elif event['speed']:
+            text += f" ({event['speed']})"
+        if event['eta'] is not None:
+            text += f" - ETA {int(event['eta'])}s"
+        self._set_clip_status(clip, text)
+        self._update_overall()
+
+    def _update_overall(self):
+        """Main progress bar: share of the whole queue that is done."""
+        if not self.clips:
+            return
+        total = len(self.clips)
+        finished = sum(1 for c in self.clips.values() if c.get('done'))
+        failed = sum(1 for c in self.clips.values() if c.get('failed'))
+        running = sum(c['percent'] for c in self.clips.values()
+                      if not c.get('done') and not c.get('failed')) / 100
+        self.progress_var.set((finished + failed + running) * 100 / total)
+
+        text = f"{finished}/{total} clips done"
+        if self.running_clips:
+            text += f", {self.running_clips} running"
+        if self.pending_clips:
+            text += f", {len(self.pending_clips)} waiting"
+        if failed:
+            text += f", {failed} failed"
+        self.progress_label.config(text=text)
+
+    def _clip_finished(self, clip):
+        self.log_pipeline.discard_latest(clip['id'])
+        self.running_clips -= 1
+        self._dispatch_clips()
+
+    def _download_success(self, clip):
+        clip['done'] = True
+        clip['percent'] = 100.0
+        self._set_clip_status(clip, PHASE_LABELS[progress.DONE])
+        self.log(f"Clip #{clip['number']} Completed Successfully!", "success")
+        self._clip_finished(clip)
 
-    def _download_success(self):
-        self.download_btn.config(state=tk.NORMAL, text="Download Clip")
-        self.log("Download Completed Successfully!", "success")
-        
         # User Requirement: Clear start/end and focus start ONLY on success
-        self.start_var.set("")
-        self.end_var.set("")
-        self.start_entry.focus_set()
-
-    def _download_error(self):
-        self.download_btn.config(state=tk.NORMAL, text="Download Clip")
-        self.log("Download Finished with Errors (Check log above).", "error")
+        # (and only if they still hold this clip's range, not a newer one)
+        if (self.start_var.get().strip(), self.end_var.get().strip()) == (clip['start'], clip['end']):
+            self.start_var.set("")
+            self.end_var.set("")
+            self.start_entry.focus_set()
+
+    def _download_error(self, clip):
+        # The range stays in the queue list, "Retry Failed" runs it again
+        clip['failed'] = True
+        self._set_clip_status(clip, PHASE_LABELS[progress.ERROR])
+        self.log(f"Clip #{clip['number']} Finished with Errors (Check log above).", "error")
+        self._clip_finished(clip)
         # User Requirement: Do NOT clear fields on error
-
-    def _download_error_msg(self, msg):
-        self.download_btn.config(state=tk.NORMAL, text="Download Clip")
-        self.log(f"Execution Error: {msg}", "error")
+        self._show_range(clip)
+
+    def _download_error_msg(self, clip, msg):
+        clip['failed'] = True
+        self._set_clip_status(clip, PHASE_LABELS[progress.ERROR])
+        self.log(f"Clip #{clip['number']} Execution Error: {msg}", "error")
+        self._clip_finished(clip)
+        self._show_range(clip)
 
 
 if __name__ == "__main__":
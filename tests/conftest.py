@@ -0,0 +1,76 @@
+import importlib
+import os
+import shutil
+import sys
+import time
+
+import pytest
+
+# The app's modules import each other by bare name, the way they run from web_gui/
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'web_gui'))
+sys.path.insert(0, os.path.join(HERE, '..', 'benchmarks'))
+
+# Fake video served by benchmarks/fake_ytdlp.py to the app tests
+FAKE_ENV = {
+    'FAKE_YTDLP_DURATION': '60',
+    'FAKE_YTDLP_EXTRACT_LATENCY': '0',
+    'FAKE_YTDLP_SPEED': '100',
+    'YTDLP_ENGINE': 'subprocess',
+    'JOB_STORE_PATH': '',
+    'DOWNLOAD_WORKERS': '4',
+}
+
+
+def needs_ffmpeg():
+    if not (shutil.which('ffmpeg') and shutil.which('ffprobe')):
+        pytest.skip('ffmpeg/ffprobe not installed')
+
+
+@pytest.fixture(scope='session')
+def web_app(tmp_path_factory):
+    """app.py imported against the fake yt-dlp, with its folders in a temporary directory."""
+    pytest.importorskip('flask')
+    needs_ffmpeg()
+    from bench_load import write_shim
+
+    root = tmp_path_factory.mktemp('app')
+    with pytest.MonkeyPatch.context() as mp:
+        for name, value in FAKE_ENV.items():
+            mp.setenv(name, value)
+        mp.setenv('YT_DLP_CMD', write_shim(str(root)))
+        # DOWNLOAD_FOLDER is taken from the working directory at import
+        mp.chdir(root)
+        app = importlib.import_module('app')
+        import fake_ytdlp
+        fake_ytdlp.ensure_media()
+        yield app
+
+
+@pytest.fixture(scope='session')
+def asgi_app(tmp_path_factory):
+    """asgi_app.py imported the same way as web_app."""
+    pytest.importorskip('quart')
+    needs_ffmpeg()
+    from bench_load import write_shim
+
+    root = tmp_path_factory.mktemp('asgi')
+    with pytest.MonkeyPatch.context() as mp:
+        for name, value in FAKE_ENV.items():
+            mp.setenv(name, value)
+        mp.setenv('YT_DLP_CMD', write_shim(str(root)))
+        mp.chdir(root)
+        app = importlib.import_module('asgi_app')
+        import fake_ytdlp
+        fake_ytdlp.ensure_media()
+        yield app
+
+
+def wait_for_job(client, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f'/jobs/{job_id}').get_json()
+        if status['status'] in ('finished', 'failed'):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f'job {job_id} did not finish')
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+URL = 'https://fake.test/watch?v=asgi'
+
+
+def run(asgi_app, requests):
+    """Runs requests(client) against the app, started and stopped like a server does."""
+    async def main():
+        async with asgi_app.app.test_app() as test_app:
+            return await requests(test_app.test_client())
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize('method,path', [
+    ('POST', '/batch'), ('POST', '/playlist'), ('GET', '/jobs/x/zip'), ('GET', '/metrics'),
+])
+def test_routes_of_app_py_only_are_refused(asgi_app, method, path):
+    async def requests(client):
+        return await client.open(path, method=method, json={'url': URL})
+    response = run(asgi_app, requests)
+    assert response.status_code == 501
+
+
+def test_parallel_cut_is_refused_and_hidden(asgi_app):
+    async def requests(client):
+        refused = await client.post('/download', json={'url': URL, 'cut_mode': 'parallel'})
+        page = await client.get('/')
+        return refused.status_code, await page.get_data(as_text=True)
+    status, page = run(asgi_app, requests)
+    assert status == 501
+    assert 'btn btn-secondary hidden" id="playlistBtn"' in page
+    assert '<label class="hidden">\n                        <input type="checkbox" id="parallelCut">' in page
+
+
+def test_full_queue_is_a_429(asgi_app, monkeypatch):
+    monkeypatch.setattr(asgi_app.download_queue, 'max_queued', 0)
+
+    async def requests(client):
+        return await client.post('/download', json={'url': URL, 'format_id': '18'})
+    response = run(asgi_app, requests)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == str(asgi_app.QUEUE_RETRY_AFTER)
+
+
+def test_preview_page(asgi_app):
+    async def requests(client):
+        page = await (await client.post('/preview', json={'url': URL, 'count': 3})).get_json()
+        image = await client.get('/preview/image', query_string={'url': URL, 'name': page['tiles'][1]['image']})
+        return page, image.status_code, await image.get_data()
+    page, status, image = run(asgi_app, requests)
+    assert len(page['tiles']) == 3
+    assert status == 200 and image[:2] == b'\xff\xd8'
+
+
+def test_download_job_and_file(asgi_app):
+    async def requests(client):
+        job = await (await client.post('/download', json={'url': URL, 'format_id': '18', 'start_time': '00:02',
+                                                          'end_time': '00:05'})).get_json()
+        for _ in range(600):
+            status = await (await client.get(f"/jobs/{job['job_id']}")).get_json()
+            if status['status'] in ('finished', 'failed'):
+                break
+            await asyncio.sleep(0.05)
+        file = await client.get(status['download_url'], headers={'Range': 'bytes=0-99'})
+        return status, file.status_code, await file.get_data()
+    status, code, body = run(asgi_app, requests)
+    assert status['status'] == 'finished', status
+    assert code == 206 and len(body) == 100
+
+
+def test_stream_slot_is_held_only_while_the_body_runs(asgi_app):
+    query = {'url': URL, 'format_id': '18', 'start_time': '00:02', 'end_time': '00:04', 'container': 'ts'}
+
+    async def stream():
+        async with asgi_app.app.test_request_context('/stream', query_string=query):
+            return await asgi_app.stream_clip()
+
+    async def requests(client):
+        counts = [asgi_app.active_streams]
+        # The client went away before the first chunk: the body is closed unread
+        async with (await stream()).response:
+            pass
+        counts.append(asgi_app.active_streams)
+        async with (await stream()).response as body:
+            async for chunk in body:
+                counts.append(asgi_app.active_streams)
+                break
+        counts.append(asgi_app.active_streams)
+        # Let the killed ffmpeg's pipes close before the loop does
+        await asyncio.sleep(0.1)
+        return counts
+    assert run(asgi_app, requests) == [0, 0, 1, 0]
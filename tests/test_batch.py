@@ -0,0 +1,59 @@
+import io
+import threading
+import time
+import zipfile
+
+import batch
+from conftest import wait_for_job
+
+
+def test_merge_ranges_joins_overlapping_and_touching():
+    spans = batch.merge_ranges([(50, 60), (0, 10), (10, 20), (5, 8), (100, 110)])
+    assert spans == [(0, 20, [1, 3, 2]), (50, 60, [0]), (100, 110, [4])]
+
+
+def test_merge_ranges_empty():
+    assert batch.merge_ranges([]) == []
+
+
+def test_format_clock_and_section_filename():
+    assert batch.format_clock(3723.25) == '01:02:03.250'
+    assert batch.section_filename(0, 90, 95.5, '.mp4') == '01_00-01-30.000_00-01-35.500.mp4'
+
+
+def test_iter_zip_streams_a_readable_archive(tmp_path):
+    files = []
+    for n in range(3):
+        path = tmp_path / f"{n}.bin"
+        path.write_bytes(bytes([n]) * (batch.ZIP_CHUNK_SIZE + 1000))
+        files.append((f"clip{n}.bin", str(path)))
+    data = b''.join(batch.iter_zip(files))
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.namelist() == ['clip0.bin', 'clip1.bin', 'clip2.bin']
+        assert zf.read('clip2.bin') == bytes([2]) * (batch.ZIP_CHUNK_SIZE + 1000)
+
+
+def test_identical_concurrent_batches_download_once(web_app, monkeypatch):
+    downloads = []
+    lock = threading.Lock()
+    real_download = web_app.run_engine_download
+
+    def counting_download(kind, *args, **kwargs):
+        with lock:
+            downloads.append(kind)
+        time.sleep(0.5)  # keeps the first batch busy while the second one starts
+        real_download(kind, *args, **kwargs)
+
+    monkeypatch.setattr(web_app, 'run_engine_download', counting_download)
+    client = web_app.app.test_client()
+    body = {'url': 'https://fake.test/watch?v=batch-once', 'format_id': '18',
+            'sections': [{'start_time': '00:05', 'end_time': '00:10'},
+                         {'start_time': '00:08', 'end_time': '00:12'},
+                         {'start_time': '00:30', 'end_time': '00:33'}]}
+    jobs = [client.post('/batch', json=body).get_json()['job_id'] for _ in range(2)]
+    results = [wait_for_job(client, job_id) for job_id in jobs]
+
+    assert [r['status'] for r in results] == ['finished', 'finished']
+    assert downloads == ['span', 'span']  # two spans, each fetched by one of the two jobs
+    urls = [[s['download_url'] for s in r['sections']] for r in results]
+    assert urls[0] == urls[1]
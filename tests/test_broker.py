@@ -0,0 +1,43 @@
+import pytest
+
+from broker import SOURCE_PREFIX, SQLiteBroker
+
+KEY = 'a' * 40
+FILENAME = f'{KEY}.mp4'
+
+
+@pytest.fixture
+def broker(tmp_path):
+    broker = SQLiteBroker(str(tmp_path / 'broker.db'))
+    broker.heartbeat('clips', 'http://clips:5000', 2)
+    broker.heartbeat('sources', 'http://sources:5000', 2)
+    return broker
+
+
+def test_locate_skips_source_rows(broker):
+    # A whole-video clip on one node, the smart-cut source of the same video on the other
+    broker.cached('clips', KEY, FILENAME)
+    broker.cached('sources', SOURCE_PREFIX + KEY, FILENAME)
+
+    assert broker.locate(FILENAME, exclude='sources') == 'http://clips:5000'
+    # The node holding only the source is never offered, so the clip node doesn't redirect back
+    assert broker.locate(FILENAME, exclude='clips') is None
+
+
+def test_clip_and_source_rows_are_kept_apart(broker):
+    broker.cached('clips', KEY, FILENAME)
+    broker.cached('clips', SOURCE_PREFIX + KEY, FILENAME)
+
+    # Evicting the source leaves the clip offered
+    broker.cached('clips', SOURCE_PREFIX + KEY, None)
+    assert broker.locate(FILENAME) == 'http://clips:5000'
+    broker.cached('clips', KEY, None)
+    assert broker.locate(FILENAME) is None
+
+
+def test_smart_cut_job_goes_to_the_node_with_the_source(broker):
+    broker.cached('sources', SOURCE_PREFIX + KEY, FILENAME)
+    assert broker.submit('job1', {}, None, SOURCE_PREFIX + KEY, max_queued=10)
+
+    assert broker.claim('clips', [], locality_wait=60) is None
+    assert broker.claim('sources', [], locality_wait=60)['id'] == 'job1'
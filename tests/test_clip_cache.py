@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+
+from clip_cache import ClipCache, clip_key
+
+
+def make_file(folder, name, size=10, age=0):
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    if age:
+        old = time.time() - age
+        os.utime(path, (old, old))
+    return path
+
+
+def cache_in(folder, **kwargs):
+    # A janitor interval long enough that only explicit calls run
+    return ClipCache(str(folder), interval=3600, **kwargs)
+
+
+def test_clip_key_ignores_tracking_params():
+    assert clip_key('https://x.test/v?si=1', '18', 1, 2) == clip_key('https://x.test/v', '18', 1, 2)
+    assert clip_key('https://x.test/v', '18', 1, 2) != clip_key('https://x.test/v', '22', 1, 2)
+
+
+def test_add_and_get(tmp_path):
+    cache = cache_in(tmp_path)
+    key = clip_key('https://x.test/v', '18', 0, 10)
+    filename = cache.add(key, make_file(tmp_path, 'job.mp4'))
+    assert filename == f"{key}.mp4"
+    assert cache.get(key) == filename
+    assert cache.get('0' * 32) is None
+
+
+def test_lru_eviction_skips_clips_being_sent(tmp_path):
+    cache = cache_in(tmp_path, max_bytes=25)
+    keys = [clip_key('https://x.test/v', '18', n, n + 1) for n in range(3)]
+    names = [cache.add(keys[0], make_file(tmp_path, 'a.mp4'))]
+    assert cache.acquire(names[0])
+    names.append(cache.add(keys[1], make_file(tmp_path, 'b.mp4')))
+    names.append(cache.add(keys[2], make_file(tmp_path, 'c.mp4')))
+    # Over budget: the oldest clip is pinned, so the next one goes
+    assert cache.get(keys[0]) == names[0]
+    assert cache.get(keys[1]) is None
+    cache.release(names[0])
+
+
+def test_startup_sweep_reindexes_clips_and_removes_old_leftovers(tmp_path):
+    key = clip_key('https://x.test/v', '18', 0, 10)
+    make_file(tmp_path, f"{key}.mp4")
+    make_file(tmp_path, 'crashed-job.mp4.part', age=7200)
+    make_file(tmp_path, 'young-job.mp4.part')
+    cache = cache_in(tmp_path, orphan_age=3600)
+    assert cache.get(key) == f"{key}.mp4"
+    assert sorted(os.listdir(tmp_path)) == sorted([f"{key}.mp4", 'young-job.mp4.part'])
+
+
+def test_sweep_leaves_running_downloads_alone(tmp_path):
+    cache = cache_in(tmp_path, orphan_age=3600)
+    with cache.writing('long-job'):
+        make_file(tmp_path, 'long-job.f137.mp4.part', age=7200)
+        make_file(tmp_path, 'long-job.seg00.mp4', age=7200)
+        cache.sweep()
+        assert len(os.listdir(tmp_path)) == 2
+    cache.sweep()
+    assert os.listdir(tmp_path) == []
+
+
+def test_building_serialises_one_key(tmp_path):
+    cache = cache_in(tmp_path)
+    inside = []
+    overlaps = []
+
+    def build():
+        with cache.building('k'):
+            inside.append(1)
+            overlaps.append(len(inside))
+            time.sleep(0.02)
+            inside.pop()
+
+    threads = [threading.Thread(target=build) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert overlaps == [1, 1, 1, 1]
@@ -0,0 +1,43 @@
+import functools
+import http.server
+import threading
+
+import pytest
+
+import engine
+import progress
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def media_server(tmp_path):
+    """A plain HTTP server for one 2 MB file, so yt-dlp downloads without extracting anything."""
+    (tmp_path / 'media.mp4').write_bytes(b'\0' * (2 * 1024 * 1024))
+    handler = functools.partial(QuietHandler, directory=str(tmp_path))
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/media.mp4'
+    server.shutdown()
+
+
+def test_inprocess_download_reports_progress_through_on_line(media_server, tmp_path):
+    if engine.yt_dlp is None:
+        pytest.skip('yt_dlp not installed')
+    info = {'id': 'local', 'title': 'local', 'extractor': 'generic', 'extractor_key': 'Generic',
+            'webpage_url': media_server,
+            'formats': [{'format_id': '0', 'url': media_server, 'ext': 'mp4', 'vcodec': 'h264', 'acodec': 'aac'}]}
+    lines = []
+
+    # The GUI passes only on_line
+    engine.InProcessEngine(pool_size=1).download(
+        media_server, '0', str(tmp_path / 'out' / '%(id)s.%(ext)s'),
+        on_line=lambda line, event: lines.append((line, event)), info=info)
+
+    downloads = [(line, event) for line, event in lines if event and event['phase'] == progress.DOWNLOAD]
+    assert downloads and downloads[-1][1]['percent'] == 100.0
+    assert all(line.startswith('[download]') for line, event in downloads)
+    assert (tmp_path / 'out' / 'local.mp4').stat().st_size == 2 * 1024 * 1024
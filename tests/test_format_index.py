@@ -0,0 +1,129 @@
+import copy
+import json
+
+import pytest
+
+import format_index
+from format_index import FragmentList
+
+HEADERS = {'User-Agent': 'Mozilla/5.0', 'Accept': '*/*'}
+
+DOCUMENT = {
+    'id': 'abc123',
+    'title': 'A video',
+    'duration': 600,
+    'webpage_url': 'https://fake.test/watch?v=abc123',
+    'http_headers': dict(HEADERS),
+    'description': 'long text',
+    'subtitles': {'en': [{'url': 'https://fake.test/en.vtt'}]},
+    'thumbnails': [{'url': 'https://fake.test/t.jpg'}],
+    'formats': [
+        {'format_id': '18', 'ext': 'mp4', 'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2', 'height': 360,
+         'url': 'https://fake.test/18.mp4', 'filesize': None, 'http_headers': dict(HEADERS),
+         'downloader_options': {'http_chunk_size': 10485760}},
+        {'format_id': '137', 'ext': 'mp4', 'vcodec': 'avc1.640028', 'acodec': 'none', 'height': 1080,
+         'protocol': 'http_dash_segments', 'fragment_base_url': 'https://fake.test/137/',
+         'fragments': [{'path': f'sq/{i}', 'duration': 5.0} for i in range(4)],
+         'http_headers': dict(HEADERS)},
+        {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2',
+         'fragments': [{'url': 'https://fake.test/140/0', 'duration': 5.0, 'filesize': 1000}],
+         'http_headers': dict(HEADERS)},
+    ],
+    'requested_formats': [
+        {'format_id': '137', 'ext': 'mp4', 'vcodec': 'avc1.640028', 'height': 1080},
+        {'format_id': '140', 'ext': 'm4a', 'acodec': 'mp4a.40.2'},
+    ],
+}
+
+
+def expected_info():
+    """DOCUMENT as to_info() gives it back: no DROPPED_KEYS, no null format fields."""
+    info = {key: value for key, value in copy.deepcopy(DOCUMENT).items() if key not in format_index.DROPPED_KEYS}
+    for fmt in info['formats']:
+        for key in [key for key, value in fmt.items() if value is None]:
+            del fmt[key]
+    info['requested_formats'] = [info['formats'][1], info['formats'][2]]
+    return info
+
+
+def test_parse_round_trip():
+    record = format_index.parse(json.dumps(DOCUMENT))
+    assert format_index.to_info(record) == expected_info()
+
+
+def test_from_info_round_trip():
+    record = format_index.from_info(copy.deepcopy(DOCUMENT))
+    assert record.to_info() == expected_info()
+    # Each call builds a fresh dict
+    info = record.to_info()
+    info['formats'][0]['downloader_options']['http_chunk_size'] = 1
+    info['formats'][1]['http_headers']['Accept'] = 'text/html'
+    assert record.to_info() == expected_info()
+
+
+def test_record_reads_like_the_dict():
+    record = format_index.from_info(copy.deepcopy(DOCUMENT))
+    assert record['title'] == 'A video' and record.get('duration') == 600
+    assert record['id'] == 'abc123'
+    assert 'webpage_url' in record and 'subtitles' not in record
+    assert record.get('subtitles', 'gone') == 'gone'
+    with pytest.raises(KeyError):
+        record['description']
+
+    row = record['formats'][0]
+    assert row['height'] == 360 and row.get('vcodec') == 'avc1.42001E'
+    assert row['downloader_options'] == {'http_chunk_size': 10485760}
+    # A null field reads as missing
+    assert row.get('filesize', 0) == 0 and 'filesize' not in row
+    with pytest.raises(KeyError):
+        row['filesize']
+    with pytest.raises(KeyError):
+        row['fragment_base_url']
+
+
+def test_requested_formats_are_rows_of_the_table():
+    record = format_index.from_info(copy.deepcopy(DOCUMENT))
+    assert record.requested_formats[0] is record.formats[1]
+    assert record.requested_formats[1] is record.formats[2]
+
+
+def test_http_headers_are_shared():
+    record = format_index.from_info(copy.deepcopy(DOCUMENT))
+    assert record.formats[0].http_headers is record.formats[1].http_headers is record['http_headers']
+
+
+def test_fragment_list_packs_path_and_duration():
+    fragments = [{'path': f'sq/{i}', 'duration': 5.0 + i} for i in range(4)]
+    packed = FragmentList.pack(fragments)
+    assert isinstance(packed, FragmentList)
+    assert len(packed) == 4
+    assert packed[1] == {'path': 'sq/1', 'duration': 6.0}
+    assert packed[-1] == fragments[-1]
+    assert packed[1:3] == fragments[1:3]
+    assert packed.to_list() == fragments
+
+
+def test_fragment_list_packs_urls_without_durations():
+    fragments = [{'url': f'https://fake.test/{i}'} for i in range(3)]
+    packed = FragmentList.pack(fragments)
+    assert packed.durations is None
+    assert list(packed) == fragments
+
+
+@pytest.mark.parametrize('fragments', [
+    [],
+    None,
+    [{'url': 'https://fake.test/0', 'duration': 5.0, 'filesize': 1000}],
+    [{'url': 'https://fake.test/0', 'duration': 5.0}, {'url': 'https://fake.test/1'}],
+    [{'path': 'sq/0'}, {'url': 'https://fake.test/1'}],
+])
+def test_fragment_list_leaves_richer_lists_alone(fragments):
+    assert FragmentList.pack(fragments) is fragments
+
+
+def test_to_info_copies_a_plain_dict():
+    info = copy.deepcopy(DOCUMENT)
+    copied = format_index.to_info(info)
+    assert copied == info
+    copied['formats'][0]['http_headers']['Accept'] = 'text/html'
+    assert info['formats'][0]['http_headers']['Accept'] == '*/*'
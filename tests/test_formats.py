@@ -0,0 +1,80 @@
+import pytest
+
+import formats
+
+INFO = {
+    'duration': 600,
+    'formats': [
+        {'format_id': '18', 'ext': 'mp4', 'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2', 'width': 640,
+         'height': 360, 'filesize': 30 * 1000 * 1000},
+        {'format_id': '22', 'ext': 'mp4', 'vcodec': 'avc1.64001F', 'acodec': 'mp4a.40.2', 'width': 1280,
+         'height': 720, 'tbr': 2000},
+        {'format_id': '137', 'ext': 'mp4', 'vcodec': 'avc1.640028', 'acodec': 'none', 'width': 1920,
+         'height': 1080, 'tbr': 4000},
+        {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'resolution': 'audio only',
+         'abr': 128},
+        {'format_id': 'sd', 'ext': 'mp4', 'height': 480},
+    ],
+}
+
+
+@pytest.mark.parametrize('vcodec,family', [
+    ('avc1.64001F', 'h264'), ('hev1.1.6.L93', 'hevc'), ('vp09.00.40.08', 'vp9'), ('av01.0.08M.08', 'av1'),
+    ('none', None), (None, None),
+])
+def test_codec_family(vcodec, family):
+    assert formats.codec_family(vcodec) == family
+
+
+def test_estimate_bytes_prefers_the_filesize():
+    assert formats.estimate_bytes(INFO['formats'][0], 60, 600) == (int(30e6 * 62 / 600), True)
+    assert formats.estimate_bytes(INFO['formats'][1], 60, 600) == (2000 * 1000 // 8 * 62, False)
+    assert formats.estimate_bytes(INFO['formats'][4], 60, 600) == (None, False)
+
+
+def test_smart_cut_estimate_only_for_copyable_pairs():
+    section = 300
+    mp4 = {'vcodec': 'avc1.64001F', 'ext': 'mp4'}
+    av1 = {'vcodec': 'av01.0.08M.08', 'ext': 'mp4'}
+    assert formats.estimate_cut_seconds(mp4, section, smart=True) < formats.estimate_cut_seconds(mp4, section)
+    assert formats.estimate_cut_seconds(av1, section, smart=True) == formats.estimate_cut_seconds(av1, section)
+
+
+def test_rank_by_quality_lists_combined_formats_tallest_first():
+    ranked = formats.rank_formats(INFO, 60, 120)
+    assert [f['id'] for f in ranked] == ['22', 'sd', '18']
+    assert ranked[2]['exact'] and ranked[1]['bytes'] is None
+
+
+def test_rank_smallest_keeps_unknown_sizes_last():
+    ranked = formats.rank_formats(INFO, 60, 120, 'smallest')
+    assert [f['id'] for f in ranked] == ['18', '22', 'sd']
+
+
+def test_rank_respects_the_minimum_height():
+    ranked = formats.rank_formats(INFO, 60, 120, 'smallest', height=720)
+    assert ranked[0]['id'] == '22'
+    # Nothing is that tall: the tallest format is picked
+    assert formats.rank_formats(INFO, 60, 120, 'fastest', height=2160)[0]['id'] == '22'
+
+
+def test_rank_video_only_formats():
+    ranked = formats.rank_formats(INFO, 60, 120, combined_only=False)
+    assert [f['id'] for f in ranked][:2] == ['137', '22']
+    assert '140' not in [f['id'] for f in ranked]
+
+
+def test_choose_format():
+    assert formats.choose_format(INFO, 60, 120) == 'best'
+    assert formats.choose_format(INFO, 60, 120, 'smallest') == '18'
+    assert formats.choose_format({'formats': []}, policy='smallest') == 'best'
+    with pytest.raises(ValueError):
+        formats.rank_formats(INFO, policy='cheapest')
+
+
+def test_formats_response():
+    ranked = formats.rank_formats(INFO, 60, 120, 'smallest')
+    body = formats.formats_response(INFO, ranked, 'smallest')
+    assert body['recommended'] == '18'
+    assert body['formats'][0]['id'] == 'best'
+    assert body['duration_string'] == '10:00'
@@ -0,0 +1,60 @@
+import pytest
+
+from governor import Governor, Overloaded, TokenBucket, source_host
+
+
+def test_source_host():
+    assert source_host('https://www.youtube.com/watch?v=x') == 'youtube.com'
+    assert source_host('https://m.facebook.com/watch') == 'facebook.com'
+
+
+def test_token_bucket_refuses_past_the_burst():
+    bucket = TokenBucket(rate=1, burst=2)
+    assert bucket.take() == 0
+    assert bucket.take() == 0
+    assert 0 < bucket.take() <= 1
+
+
+def test_admit_limits_each_host_separately():
+    governor = Governor(2, 2, host_rate=60, host_burst=2)
+    for _ in range(2):
+        governor.admit('https://a.test/1')
+    with pytest.raises(Overloaded) as e:
+        governor.admit('https://a.test/2')
+    assert e.value.retry_after >= 1
+    governor.admit('https://b.test/1')
+
+
+def test_zero_host_rate_means_no_limit():
+    governor = Governor(2, 2, host_rate=0, host_burst=0)
+    for _ in range(100):
+        governor.admit('https://a.test/1')
+    assert governor.stats()['host_rate_per_min'] == 0
+
+
+def test_zero_burst_still_admits():
+    governor = Governor(2, 2, host_rate=60, host_burst=0)
+    governor.admit('https://a.test/1')
+
+
+def test_work_slots_refuse_when_busy():
+    governor = Governor(1, 1, wait=0.01)
+    release = governor.try_work()
+    with pytest.raises(Overloaded):
+        governor.try_work()
+    release()
+    with governor.work():
+        with pytest.raises(Overloaded):
+            with governor.work(timeout=0.01):
+                pass
+
+
+def test_metadata_slot_waits_then_refuses():
+    governor = Governor(1, 1, wait=0.05)
+    with governor.metadata():
+        with pytest.raises(Overloaded):
+            with governor.metadata():
+                pass
+    with governor.metadata():
+        pass
+    assert governor.stats()['metadata']['rejected'] == 1
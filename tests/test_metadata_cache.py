@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+from metadata_cache import MetadataCache, MetadataError, normalize_url
+
+
+def test_normalize_url_drops_tracking_params_and_fragment():
+    assert normalize_url(' HTTPS://WWW.YouTube.com/watch?v=abc&si=xyz&utm_source=tw#t=30 ') == \
+        'https://www.youtube.com/watch?v=abc'
+
+
+def test_normalize_url_sorts_query():
+    assert normalize_url('https://x.test/p?b=2&a=1') == normalize_url('https://x.test/p?a=1&b=2')
+
+
+def test_normalize_url_keeps_what_is_not_a_url():
+    assert normalize_url('not a url') == 'not a url'
+    assert normalize_url(None) == ''
+
+
+def test_concurrent_lookups_share_one_fetch():
+    calls = []
+    release = threading.Event()
+
+    def fetch(url):
+        calls.append(url)
+        release.wait(5)
+        return {'title': url}
+
+    cache = MetadataCache(fetch)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('https://x.test/v?si=1')))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    while cache.stats()['coalesced'] < 4:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len(results) == 5 and all(r is results[0] for r in results)
+    assert cache.get('https://x.test/v') is results[0]
+
+
+def test_errors_are_not_cached():
+    attempts = []
+
+    def fetch(url):
+        attempts.append(url)
+        if len(attempts) == 1:
+            raise MetadataError('boom')
+        return {'title': 'ok'}
+
+    cache = MetadataCache(fetch)
+    with pytest.raises(MetadataError):
+        cache.get('https://x.test/v')
+    assert cache.get('https://x.test/v') == {'title': 'ok'}
+    assert cache.stats()['errors'] == 1
+
+
+def test_ttl_and_lru_bounds():
+    cache = MetadataCache(lambda url: {'url': url}, ttl=0, max_entries=2)
+    first = cache.get('https://x.test/1')
+    assert cache.get('https://x.test/1') is not first  # expired immediately
+
+    cache = MetadataCache(lambda url: {'url': url}, max_entries=2)
+    for n in range(3):
+        cache.get(f'https://x.test/{n}')
+    assert cache.peek('https://x.test/0') is None
+    assert cache.peek('https://x.test/2') is not None
+    assert cache.stats()['evictions'] == 1
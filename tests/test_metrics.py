@@ -0,0 +1,44 @@
+import io
+import re
+import zipfile
+
+from conftest import wait_for_job
+
+
+def served(client, route):
+    """slice_bytes_served_total for `route`, as /metrics reports it."""
+    match = re.search(rf'^slice_bytes_served_total{{route="{route}"}} (\d+)$',
+                      client.get('/metrics').get_data(as_text=True), re.M)
+    return int(match.group(1)) if match else 0
+
+
+def test_stream_body_is_counted(web_app):
+    client = web_app.app.test_client()
+    before = served(client, 'stream')
+    response = client.get('/stream', query_string={'url': 'https://fake.test/watch?v=metrics-stream',
+                                                   'format_id': '18', 'start_time': '00:02',
+                                                   'end_time': '00:04', 'container': 'ts'})
+    assert response.status_code == 200
+    # Iterated the way a WSGI server does, after the view has returned
+    body = response.get_data()
+    response.close()
+
+    assert body
+    assert served(client, 'stream') - before == len(body)
+
+
+def test_zip_body_is_counted(web_app):
+    client = web_app.app.test_client()
+    job_id = client.post('/batch', json={'url': 'https://fake.test/watch?v=metrics-zip', 'format_id': '18',
+                                         'sections': [{'start_time': '00:01', 'end_time': '00:03'},
+                                                      {'start_time': '00:20', 'end_time': '00:22'}]}
+                         ).get_json()['job_id']
+    assert wait_for_job(client, job_id)['status'] == 'finished'
+    before = served(client, 'zip')
+
+    response = client.get(f'/jobs/{job_id}/zip')
+    body = response.get_data()
+    response.close()
+
+    assert len(zipfile.ZipFile(io.BytesIO(body)).namelist()) == 2
+    assert served(client, 'zip') - before == len(body)
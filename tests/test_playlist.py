@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+import playlist
+from conftest import wait_for_job
+from metadata_cache import MetadataError
+
+
+def listing(count, error=None, read=None):
+    for i in range(count):
+        if read is not None:
+            read.append(i)
+        yield {'url': f"https://fake.test/watch?v=entry{i}", 'title': f"Entry {i}"}
+    if error:
+        raise error
+
+
+def test_every_listed_entry_is_processed():
+    done = []
+    lock = threading.Lock()
+
+    def process(index, entry):
+        with lock:
+            done.append(index)
+
+    listed = []
+    count = playlist.run_pipeline(listing(10), process, concurrency=3,
+                                  on_listed=lambda index, entry: listed.append(index))
+    assert count == 10
+    assert listed == list(range(10))
+    assert sorted(done) == list(range(10))
+
+
+def test_max_entries_stops_the_listing():
+    read = []
+    entries = listing(100, read=read)
+    assert playlist.run_pipeline(entries, lambda index, entry: None, max_entries=5) == 5
+    assert len(read) <= 6
+    assert entries.gi_frame is None  # closed
+
+
+def test_listing_is_not_read_far_ahead_of_the_work():
+    read = []
+    release = threading.Event()
+    ahead = []
+
+    def process(index, entry):
+        if index == 0:
+            release.wait(5)
+        ahead.append(len(read) - index)
+
+    thread = threading.Thread(target=playlist.run_pipeline,
+                              args=(listing(20, read=read), process), kwargs={'concurrency': 1, 'buffer': 2})
+    thread.start()
+    threading.Timer(0.2, release.set).start()
+    thread.join(10)
+    # One entry in the worker, `buffer` waiting, one being put
+    assert max(ahead) <= 4
+
+
+def test_listing_error_is_raised_after_the_listed_entries():
+    done = []
+    with pytest.raises(MetadataError):
+        playlist.run_pipeline(listing(3, MetadataError('rate limited')), lambda index, entry: done.append(index))
+    assert sorted(done) == [0, 1, 2]
+
+
+def test_crashing_entry_does_not_stop_the_others():
+    done = []
+
+    def process(index, entry):
+        if index == 1:
+            raise RuntimeError('boom')
+        done.append(index)
+
+    playlist.run_pipeline(listing(4), process, concurrency=2)
+    assert sorted(done) == [0, 2, 3]
+
+
+def test_broken_off_listing_is_reported_in_the_job(web_app, monkeypatch):
+    monkeypatch.setattr(web_app.engine, 'iter_playlist',
+                        lambda url: listing(2, MetadataError('HTTP Error 429')))
+    client = web_app.app.test_client()
+    response = client.post('/playlist', json={'url': 'https://fake.test/playlist?list=broken',
+                                              'start_time': '00:01', 'end_time': '00:03'})
+    status = wait_for_job(client, response.get_json()['job_id'])
+
+    assert status['status'] == 'finished', status
+    assert status['finished'] == 2
+    assert status['listing_error'] == 'Listing stopped after 2 entries: HTTP Error 429'
+
+
+def test_crashing_entry_is_reported_in_the_job(web_app, monkeypatch):
+    monkeypatch.setattr(web_app.engine, 'iter_playlist', lambda url: listing(3))
+    real_build_clip = web_app.build_clip
+
+    def build_clip(url, *args, **kwargs):
+        if url.endswith('entry1'):
+            raise KeyError('duration')
+        return real_build_clip(url, *args, **kwargs)
+    monkeypatch.setattr(web_app, 'build_clip', build_clip)
+
+    client = web_app.app.test_client()
+    response = client.post('/playlist', json={'url': 'https://fake.test/playlist?list=crash',
+                                              'start_time': '00:01', 'end_time': '00:03'})
+    status = wait_for_job(client, response.get_json()['job_id'])
+
+    assert status['status'] == 'finished', status
+    assert [e['status'] for e in status['entries']] == ['finished', 'failed', 'finished']
+    assert status['entries'][1]['error'] == "'duration'"
@@ -0,0 +1,38 @@
+import pytest
+
+import preview
+from preview import PreviewError
+
+INFO = {
+    'duration': 7200,
+    'formats': [
+        {'format_id': '160', 'ext': 'mp4', 'vcodec': 'avc1.4d400c', 'acodec': 'none', 'width': 256,
+         'height': 144, 'protocol': 'https', 'url': 'https://fake.test/160.mp4'},
+        {'format_id': '18', 'ext': 'mp4', 'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2', 'width': 640,
+         'height': 360, 'protocol': 'https', 'url': 'https://fake.test/18.mp4'},
+    ],
+}
+
+
+def test_keyframe_tiles_come_from_the_smallest_format():
+    page = preview.tiles(INFO, start=0, count=3, step=60)
+    assert page['source'] == 'keyframes' and page['step'] == 60
+    assert [tile['image'] for tile in page['tiles']] == ['kf-160-0', 'kf-160-60', 'kf-160-120']
+
+
+def test_keyframe_zoom_is_bounded():
+    # Two hours over at most MAX_KEYFRAME_TILES tiles: no finer than 5 s
+    assert preview.keyframe_steps(7200)[0] == 5
+    assert preview.tiles(INFO, count=3, step=1)['step'] == 5
+
+
+def test_every_handed_out_keyframe_renders():
+    for step in (5, 15, 3600):
+        for tile in preview.tiles(INFO, start=3500, count=10, step=step)['tiles']:
+            assert preview.render_cmd('ffmpeg', INFO, tile['image'], 'out.jpg')
+
+
+@pytest.mark.parametrize('name', ['kf-160-7200', 'kf-160-99999', 'kf-160-7', 'kf-160-3601', 'kf-18-60'])
+def test_keyframes_off_the_grid_are_refused(name):
+    with pytest.raises(PreviewError):
+        preview.render_cmd('ffmpeg', INFO, name, 'out.jpg')
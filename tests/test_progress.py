@@ -0,0 +1,51 @@
+import progress
+from progress import ProgressParser, parse_clock, parse_size
+
+
+def test_parse_size_and_clock():
+    assert parse_size('10.00MiB') == 10 * 1024 ** 2
+    assert parse_size('~ 1.5KB') == 1500
+    assert parse_size('N/A') is None
+    assert parse_clock('01:02:03.50') == 3723.5
+    assert parse_clock('02:03') == 123
+    assert parse_clock('Unknown') is None
+
+
+def test_download_line():
+    event = ProgressParser().feed('[download]  45.3% of ~ 10.00MiB at  1.20MiB/s ETA 00:05 (frag 3/10)')
+    assert event['phase'] == progress.DOWNLOAD
+    assert event['percent'] == 45.3
+    assert event['total_bytes'] == 10 * 1024 ** 2
+    assert event['speed'] == int(1.2 * 1024 ** 2)
+    assert event['eta'] == 5
+
+
+def test_download_line_with_unknown_total():
+    event = ProgressParser().feed('[download]  12.00MiB at  1.20MiB/s (00:00:05)')
+    assert event['phase'] == progress.DOWNLOAD
+    assert event['percent'] is None
+    assert event['downloaded_bytes'] == 12 * 1024 ** 2
+
+
+def test_ffmpeg_line_uses_section_duration():
+    parser = ProgressParser(section_duration=16)
+    event = parser.feed('frame=  240 fps= 60 q=28.0 size=    1024kB time=00:00:08.00 bitrate=1048.6kbits/s '
+                        'speed=2.0x')
+    assert event['phase'] == progress.CUT
+    assert event['percent'] == 50.0
+    assert event['eta'] == 4.0
+    assert event['downloaded_bytes'] == 1024 * 1024
+    # The closing "100% of X" of yt-dlp doesn't switch a cut back to downloading
+    parser.feed('[download] 100% of 10.00MiB in 00:00:08 at 1.20MiB/s')
+    assert parser.phase == progress.CUT
+
+
+def test_phases_and_errors():
+    parser = ProgressParser()
+    assert parser.feed('[youtube] abc: Downloading webpage')['phase'] == progress.EXTRACT
+    assert parser.feed('[Merger] Merging formats into "x.mp4"')['phase'] == progress.POSTPROCESS
+    assert parser.feed('[youtube] abc: late site line') is None
+    assert parser.feed('') is None
+    error = parser.feed('ERROR: [youtube] abc: Video unavailable')
+    assert error['phase'] == progress.ERROR
+    assert error['message'] == '[youtube] abc: Video unavailable'
@@ -0,0 +1,80 @@
+import subprocess
+
+import pytest
+
+import segments
+from conftest import needs_ffmpeg
+
+
+def test_segment_count():
+    assert segments.segment_count(100, cpus=8) == 1
+    assert segments.segment_count(600, cpus=8) == 5
+    assert segments.segment_count(600, cpus=2) == 2
+    assert segments.segment_count(3600, cpus=64) == segments.MAX_SEGMENTS
+
+
+def test_split_range_touches():
+    assert segments.split_range(10, 40, 3) == [(10, 20), (20, 30), (30, 40)]
+
+
+def test_snap_to_keyframes_moves_inner_points_only():
+    ranges = segments.split_range(0, 300, 3)
+    assert segments.snap_to_keyframes(ranges, [101.0, 230.0]) == [(0, 101.0), (101.0, 200), (200, 300)]
+    # A keyframe past the window, or one that would swallow a whole sub-range, is ignored
+    assert segments.snap_to_keyframes([(0, 10), (10, 20), (20, 30)], [25.0], window=15) == \
+        [(0, 10), (10, 25.0), (25.0, 30)]
+    assert segments.snap_to_keyframes(ranges, [150.0], window=15) == ranges
+
+
+def make_part(src, dest, start, end, extra=()):
+    # What yt-dlp --force-keyframes-at-cuts writes for one sub-range
+    subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-ss', str(start), '-i', src,
+                    '-t', str(end - start), *extra, dest], check=True, capture_output=True)
+
+
+def probe(path, entries, stream):
+    out = subprocess.run(['ffprobe', '-v', 'error', '-select_streams', stream, '-show_entries', entries,
+                          '-of', 'csv=p=0', path], capture_output=True, text=True, check=True).stdout
+    return [line for line in out.split() if line]
+
+
+@pytest.fixture(scope='module')
+def source(tmp_path_factory):
+    needs_ffmpeg()
+    path = str(tmp_path_factory.mktemp('segments') / 'source.mp4')
+    subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+                    '-f', 'lavfi', '-i', 'testsrc2=size=320x240:rate=30:duration=12',
+                    '-f', 'lavfi', '-i', 'sine=frequency=440:duration=12',
+                    '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '30', '-c:a', 'aac', '-shortest', path],
+                   check=True, capture_output=True)
+    return path
+
+
+def test_join_keeps_audio_in_step_with_the_video(source, tmp_path):
+    ranges = [(1.3, 4.0), (4.0, 7.0), (7.0, 9.9)]
+    parts = []
+    for index, (start, end) in enumerate(ranges):
+        parts.append(str(tmp_path / f"it's.seg{index:02d}.mp4"))
+        make_part(source, parts[-1], start, end)
+    dest = str(tmp_path / 'joined.mp4')
+
+    audio_args = segments.join_audio_args('ffprobe', parts[0])
+    segments.join('ffmpeg', parts, dest, [end - start for start, end in ranges], audio_args)
+
+    assert audio_args == ['-c:a', 'aac']
+    assert len(probe(dest, 'packet=pts_time', 'v:0')) == round(8.6 * 30)
+    # Both streams start at 0 and the audio is as long as the clip: nothing added at the seams
+    assert probe(dest, 'stream=start_time', 'v:0') == probe(dest, 'stream=start_time', 'a:0') == ['0.000000']
+    assert float(probe(dest, 'stream=duration', 'a:0')[0]) == pytest.approx(8.6, abs=0.001)
+
+
+def test_join_copies_parts_without_audio_into_any_container(source, tmp_path):
+    parts = [str(tmp_path / f"part{index}.mkv") for index in range(2)]
+    make_part(source, parts[0], 0, 3, ['-an'])
+    make_part(source, parts[1], 3, 6, ['-an'])
+    dest = str(tmp_path / 'joined.mkv')
+
+    assert segments.join_audio_args('ffprobe', parts[0]) is None
+    segments.join('ffmpeg', parts, dest)
+
+    assert len(probe(dest, 'packet=pts_time', 'v:0')) == 180
@@ -0,0 +1,120 @@
+import subprocess
+
+import pytest
+
+import smartcut
+from conftest import needs_ffmpeg, wait_for_job
+
+KEYFRAMES = [0.0, 2.0, 4.0, 6.0, 8.0, 10.0]
+
+
+def test_plan_cut_encodes_only_partial_gops():
+    assert smartcut.plan_cut(KEYFRAMES, 1.3, 7.5) == [
+        ('encode', 1.3, 2.0), ('copy', 2.0, 6.0), ('encode', 6.0, 7.5)]
+
+
+def test_plan_cut_on_keyframes_copies_everything():
+    assert smartcut.plan_cut(KEYFRAMES, 2.0, 8.01) == [('copy', 2.0, 8.0)]
+
+
+def test_plan_cut_without_a_whole_gop():
+    assert smartcut.plan_cut(KEYFRAMES, 2.5, 3.9) is None
+    assert smartcut.plan_cut([], 0, 10) is None
+
+
+def test_smart_codec_pairs():
+    assert smartcut.smart_codec({'codec_name': 'h264'}, 'clip.mp4')['tag'] == 'avc3'
+    assert smartcut.smart_codec({'codec_name': 'vp9'}, 'clip.webm') is not None
+    # The pieces of these can't be joined into that file type
+    assert smartcut.smart_codec({'codec_name': 'vp9'}, 'clip.mp4') is None
+    assert smartcut.smart_codec({'codec_name': 'av1'}, 'clip.mp4') is None
+    assert smartcut.smart_codec(None, 'clip.mp4') is None
+
+
+def test_boundary_encoder_matches_the_source_profile():
+    args = smartcut.boundary_encoder({'codec_name': 'h264', 'profile': 'Main', 'pix_fmt': 'yuv420p'})
+    assert args[-2:] == ['-profile:v', 'main']
+    assert '-pix_fmt' in args
+
+
+def test_concat_list_quotes_paths(tmp_path):
+    list_path = tmp_path / 'parts.txt'
+    smartcut.write_concat_list(str(list_path), ["/tmp/it's.ts", '/tmp/b.ts'])
+    assert list_path.read_text() == "file '/tmp/it'\\''s.ts'\nfile '/tmp/b.ts'\n"
+
+
+def make_source(path, vcodec, extra=()):
+    # 20 s, a keyframe every 2 s, B-frames in the copied GOPs
+    subprocess.run([
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', 'testsrc2=size=320x240:rate=30:duration=20',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:duration=20',
+        '-c:v', vcodec, *extra, '-g', '60', '-keyint_min', '60', '-pix_fmt', 'yuv420p',
+        '-shortest', path
+    ], check=True, capture_output=True)
+
+
+def probe(path, entries, stream='v:0'):
+    out = subprocess.run(['ffprobe', '-v', 'error', '-select_streams', stream, '-show_entries', entries,
+                          '-of', 'csv=p=0', path], capture_output=True, text=True, check=True).stdout
+    return [line for line in out.split() if line]
+
+
+@pytest.mark.parametrize('vcodec,extra,ext,tag', [
+    ('libx264', ['-preset', 'ultrafast', '-bf', '2', '-c:a', 'aac'], '.mp4', 'avc3'),
+    ('libx265', ['-preset', 'ultrafast', '-x265-params', 'log-level=error', '-c:a', 'aac'], '.mp4', 'hev1'),
+    ('libvpx-vp9', ['-deadline', 'realtime', '-cpu-used', '8', '-c:a', 'libopus'], '.webm', None),
+])
+def test_smart_cut_is_frame_accurate(tmp_path, vcodec, extra, ext, tag):
+    needs_ffmpeg()
+    src = str(tmp_path / f'source{ext}')
+    dest = str(tmp_path / f"it's{ext}")
+    try:
+        make_source(src, vcodec, extra)
+    except subprocess.CalledProcessError:
+        pytest.skip(f'ffmpeg has no {vcodec}')
+
+    stats = smartcut.smart_cut('ffmpeg', 'ffprobe', src, dest, 3.3, 15.7)
+
+    assert stats['mode'] == 'smart' and stats['fallback'] is None
+    assert stats['copied_seconds'] == pytest.approx(10.0)
+    dts = [float(t) for t in probe(dest, 'packet=dts_time') if t != 'N/A']
+    assert len(dts) == round(12.4 * 30)
+    assert all(a < b for a, b in zip(dts, dts[1:]))
+    if tag:
+        assert probe(dest, 'stream=codec_tag_string') == [tag]
+    assert probe(dest, 'stream=codec_type', 'a') == ['audio']
+    decode = subprocess.run(['ffmpeg', '-v', 'error', '-i', dest, '-f', 'null', '-'],
+                            capture_output=True, text=True)
+    assert decode.returncode == 0 and not decode.stderr
+
+
+def test_unsupported_container_gets_a_full_reencode(tmp_path):
+    needs_ffmpeg()
+    src = str(tmp_path / 'source.mp4')
+    make_source(src, 'libx264', ['-preset', 'ultrafast', '-c:a', 'aac'])
+    dest = str(tmp_path / 'clip.mkv')
+
+    stats = smartcut.smart_cut('ffmpeg', 'ffprobe', src, dest, 3.3, 15.7)
+
+    assert stats['mode'] == 'reencode'
+    assert len(probe(dest, 'packet=pts_time')) == round(12.4 * 30)
+
+
+def test_failed_smart_cut_falls_back_to_a_reencode(web_app, monkeypatch):
+    cuts = []
+
+    def broken_cut(*args):
+        cuts.append(args)
+        raise smartcut.SmartCutError('corrupt source')
+
+    monkeypatch.setattr(web_app.smartcut, 'smart_cut', broken_cut)
+    client = web_app.app.test_client()
+    job_id = client.post('/download', json={'url': 'https://fake.test/watch?v=smart-fallback', 'format_id': '18',
+                                            'start_time': '00:05', 'end_time': '00:09',
+                                            'cut_mode': 'smart'}).get_json()['job_id']
+    status = wait_for_job(client, job_id)
+
+    assert len(cuts) == 1
+    assert status['status'] == 'finished', status
+    assert client.get(status['download_url']).status_code == 200
@@ -0,0 +1,56 @@
+import sys
+import time
+
+import pytest
+
+import streaming
+from streaming import StreamError
+
+
+INFO = {
+    'formats': [
+        {'format_id': '18', 'protocol': 'https', 'url': 'https://cdn.test/18', 'http_headers': {'A': 'b'}},
+        {'format_id': 'dash', 'protocol': 'http_dash_segments', 'url': None},
+    ],
+    'requested_formats': [
+        {'format_id': '137', 'protocol': 'https', 'url': 'https://cdn.test/v'},
+        {'format_id': '140', 'protocol': 'https', 'url': 'https://cdn.test/a'},
+    ],
+}
+
+
+def test_select_inputs():
+    assert streaming.select_inputs(INFO, '18') == [('https://cdn.test/18', {'A': 'b'})]
+    # "best" is yt-dlp's own pick, video + audio
+    assert [url for url, _ in streaming.select_inputs(INFO, 'best')] == ['https://cdn.test/v', 'https://cdn.test/a']
+    with pytest.raises(StreamError):
+        streaming.select_inputs(INFO, 'dash')
+    with pytest.raises(StreamError):
+        streaming.select_inputs(INFO, 'missing')
+
+
+def test_build_ffmpeg_cmd_seeks_every_input_and_maps_two():
+    inputs = [('https://cdn.test/v', {}), ('https://cdn.test/a', {'A': 'b'})]
+    cmd = streaming.build_ffmpeg_cmd('ffmpeg', inputs, 60, 90, 'ts')
+    assert cmd.count('-ss') == 2
+    assert cmd[cmd.index('-t') + 1] == '30'
+    assert cmd[cmd.index('-headers') + 1] == 'A: b\r\n'
+    assert ['-map', '0:v:0', '-map', '1:a:0'] == cmd[cmd.index('-map'):cmd.index('-map') + 4]
+    assert cmd[-3:] == ['-f', 'mpegts', 'pipe:1']
+    with pytest.raises(StreamError):
+        streaming.build_ffmpeg_cmd('ffmpeg', inputs, container='avi')
+
+
+def test_stream_process_yields_output():
+    cmd = [sys.executable, '-c', "import sys; sys.stdout.buffer.write(b'x' * 200000)"]
+    assert b''.join(streaming.stream_process(cmd, chunk_size=4096)) == b'x' * 200000
+
+
+def test_closing_the_stream_kills_the_process():
+    cmd = [sys.executable, '-c', "import sys, time\nwhile True:\n    sys.stdout.buffer.write(b'x' * 65536)\n"
+                                 "    sys.stdout.flush()\n    time.sleep(0.01)"]
+    chunks = streaming.stream_process(cmd)
+    next(chunks)
+    started = time.monotonic()
+    chunks.close()
+    assert time.monotonic() - started < 5
@@ -0,0 +1,392 @@
+"""
+asyncio counterparts of the engine, metadata cache and job queue, used by
+asgi_app.py. yt-dlp and ffmpeg run as asyncio subprocesses, so one event
+loop supervises any number of them without a thread each, and cancelling
+the awaiting task (client gone, job cancelled) kills the process.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from subprocess import DEVNULL, PIPE, STDOUT
+
+import format_index
+import progress
+from engine import EngineError, SubprocessEngine, get_startupinfo, section_seconds
+from jobs import Job, JobError, QueueFull, QUEUED, RUNNING, FINISHED, FAILED
+from metadata_cache import MetadataError, normalize_url
+from progress import ProgressParser
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def terminate(process, timeout=5):
+    """Stops a child process: terminate, then kill if it doesn't exit within `timeout`."""
+    if process.returncode is not None:
+        return
+    try:
+        process.terminate()
+        await asyncio.wait_for(process.wait(), timeout)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+async def spawn(cmd, stdout=PIPE, stderr=PIPE):
+    return await asyncio.create_subprocess_exec(
+        *cmd, stdin=DEVNULL, stdout=stdout, stderr=stderr, startupinfo=get_startupinfo())
+
+
+async def run(cmd):
+    """Runs `cmd` to completion. Returns (returncode, stdout, stderr) as text."""
+    process = await spawn(cmd)
+    try:
+        stdout, stderr = await process.communicate()
+    except BaseException:
+        # Cancelled: don't leave the child running
+        await terminate(process)
+        raise
+    return process.returncode, stdout.decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace')
+
+
+async def extract_info(cmd, url):
+    """`yt-dlp -J`. Raises MetadataError on failure."""
+    returncode, stdout, stderr = await run([cmd, '-J', url])
+    if returncode != 0:
+        raise MetadataError(stderr or 'Unknown error fetching formats')
+    return format_index.parse(stdout)
+
+
+async def download(cmd, url, format_id, output_template, start_time=None, end_time=None,
+                   on_event=None, info=None):
+    """
+    Same as SubprocessEngine.download() (same command line, same progress
+    events), without blocking a thread. Raises EngineError on failure.
+    """
+    info_path = None
+    if info is not None:
+        with tempfile.NamedTemporaryFile('w', suffix='.info.json', delete=False, encoding='utf-8') as f:
+            json.dump(format_index.to_info(info), f)
+            info_path = f.name
+
+    args = SubprocessEngine(cmd).build_download_cmd(url, format_id, output_template, start_time, end_time,
+                                                    info_path=info_path)
+    section = section_seconds(start_time, end_time)
+    parser = ProgressParser(section_duration=section[1] - section[0] if section else None)
+    tail = deque(maxlen=20)
+    errors = []
+
+    process = await spawn(args, stderr=STDOUT)
+    try:
+        async for raw in process.stdout:
+            line = raw.decode('utf-8', 'replace').strip()
+            if not line:
+                continue
+            tail.append(line)
+            event = parser.feed(line)
+            if event is None:
+                continue
+            if event['phase'] == progress.ERROR:
+                errors.append(event['message'])
+            if on_event is not None:
+                on_event(event)
+        await process.wait()
+    except BaseException:
+        await terminate(process)
+        raise
+    finally:
+        if info_path:
+            os.remove(info_path)
+
+    if process.returncode != 0:
+        raise EngineError('\n'.join(errors or tail) or 'Unknown error while downloading')
+
+
+async def stream_process(cmd, chunk_size=CHUNK_SIZE):
+    """
+    Async version of streaming.stream_process(): yields stdout chunks as they
+    are produced. Reading is demand-driven, so a slow client pauses ffmpeg;
+    closing or cancelling the generator kills it.
+    """
+    process = await spawn(cmd)
+    errors = deque(maxlen=20)
+
+    async def drain_stderr():
+        async for line in process.stderr:
+            errors.append(line.decode('utf-8', 'replace').rstrip())
+
+    drain = asyncio.ensure_future(drain_stderr())
+    try:
+        while True:
+            chunk = await process.stdout.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        await process.wait()
+        if process.returncode != 0:
+            print(f"Streaming ffmpeg exited with {process.returncode}: {' | '.join(errors)}")
+    finally:
+        await terminate(process)
+        drain.cancel()
+
+
+class MetadataCache:
+    """
+    Event-loop version of metadata_cache.MetadataCache: TTL + LRU, and one
+    extraction per URL however many requests wait for it. No locks needed,
+    everything runs on the loop.
+    """
+
+    def __init__(self, fetch, ttl=600, max_entries=256):
+        self.fetch = fetch  # async fetch(url) -> info
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, info)
+        self._inflight = {}            # key -> Task
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.errors = 0
+
+    async def get(self, url):
+        key = normalize_url(url)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, url))
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        # Shielded: one waiter going away must not cancel the extraction for the others
+        return await asyncio.shield(task)
+
+    async def _load(self, key, url):
+        try:
+            info = await self.fetch(url)
+        except MetadataError:
+            self.errors += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, info)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return info
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'entries': len(self._entries),
+            'inflight': len(self._inflight),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'errors': self.errors,
+            'hit_ratio': round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+        }
+
+
+class KeyedLocks:
+    """One asyncio.Lock per key, dropped when nobody holds or waits for it (ClipCache.building for the loop)."""
+
+    def __init__(self):
+        self._locks = {}  # key -> [Lock, users]
+
+    @asynccontextmanager
+    async def hold(self, key):
+        slot = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                yield
+        finally:
+            slot[1] -= 1
+            if slot[1] == 0:
+                del self._locks[key]
+
+
+class AsyncJob(Job):
+    def __init__(self, params, runner=None):
+        super().__init__(params, runner)
+        # Last time a client asked about the job; unwatched jobs get cancelled
+        self.last_seen = time.time()
+
+
+class JobQueue:
+    """
+    jobs.JobQueue on the event loop: `workers` jobs run concurrently as
+    tasks, the rest wait in FIFO order. Job dicts have the same shape.
+
+    Jobs nobody has polled or streamed for `abandon_after` seconds are
+    cancelled (the client closed the page), which kills their processes.
+    Call start() from inside the running loop.
+    """
+
+    def __init__(self, runner, workers=64, max_queued=1000, retention=3600, abandon_after=60):
+        self.runner = runner  # async runner(job) -> result dict
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.abandon_after = abandon_after
+
+        self._pending = deque()
+        self._jobs = {}
+        self._tasks = {}   # job id -> Task of a running job
+        self._watch = {}   # job id -> Event set on the next change
+        self._running = 0
+        self._slots = None
+
+    def start(self):
+        self._slots = asyncio.Semaphore(self.workers)
+        asyncio.ensure_future(self._janitor())
+
+    def submit(self, params, runner=None):
+        self._prune()
+        if len(self._pending) >= self.max_queued:
+            raise QueueFull(f"Too many queued downloads ({self.max_queued}), try again later.")
+        job = AsyncJob(params, runner)
+        self._jobs[job.id] = job
+        self._pending.append(job)
+        asyncio.ensure_future(self._run(job))
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def seen(self, job):
+        job.last_seen = time.time()
+
+    def position(self, job):
+        if job.state != QUEUED:
+            return 0
+        try:
+            return self._pending.index(job) + 1
+        except ValueError:
+            return 0
+
+    def to_dict(self, job):
+        data = {
+            'job_id': job.id,
+            'status': job.state,
+            'position': self.position(job),
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at,
+        }
+        if job.progress is not None:
+            data['progress'] = job.progress
+        if job.state == FINISHED and job.result:
+            data.update(job.result)
+        if job.state == FAILED:
+            data['error'] = job.error
+        return data
+
+    def publish(self, job, event):
+        job.progress = event
+        self._touch(job)
+
+    async def wait_for_update(self, job, seen_version, timeout=None):
+        """Waits until the job changes past `seen_version` (or timeout). Returns the current version."""
+        if job.version == seen_version and not job.done:
+            event = self._watch.setdefault(job.id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job.version
+
+    def cancel(self, job, reason='Cancelled'):
+        """Stops a queued or running job. Returns False if it had already finished."""
+        if job.done:
+            return False
+        task = self._tasks.get(job.id)
+        if task is not None:
+            task.cancel()  # _run() marks it failed
+        elif job in self._pending:
+            self._pending.remove(job)
+            self._finish(job, None, reason)
+        job.cancel_reason = reason
+        return True
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'running': self._running,
+            'queued': len(self._pending),
+            'tracked': len(self._jobs),
+        }
+
+    def _touch(self, job):
+        job.version += 1
+        event = self._watch.pop(job.id, None)
+        if event is not None:
+            event.set()
+
+    def _finish(self, job, result, error):
+        job.finished_at = time.time()
+        if error is None:
+            job.result = result
+            job.state = FINISHED
+        else:
+            job.error = error
+            job.state = FAILED
+        self._touch(job)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        expired = [jid for jid, j in self._jobs.items() if j.done and j.finished_at < cutoff]
+        for jid in expired:
+            del self._jobs[jid]
+
+    async def _run(self, job):
+        async with self._slots:
+            if job.done:  # cancelled while waiting
+                return
+            self._pending.remove(job)
+            job.state = RUNNING
+            job.started_at = time.time()
+            self._running += 1
+            self._touch(job)
+
+            task = asyncio.ensure_future((job.runner or self.runner)(job))
+            self._tasks[job.id] = task
+            result, error = None, None
+            try:
+                result = await task
+            except asyncio.CancelledError:
+                error = getattr(job, 'cancel_reason', 'Cancelled')
+            except JobError as e:
+                error = str(e)
+            except Exception as e:
+                print(f"Job {job.id} crashed: {e}")
+                error = str(e)
+            finally:
+                del self._tasks[job.id]
+                self._running -= 1
+            self._finish(job, result, error)
+
+    async def _janitor(self):
+        while True:
+            await asyncio.sleep(max(1, self.abandon_after / 4))
+            cutoff = time.time() - self.abandon_after
+            for job in list(self._jobs.values()):
+                if not job.done and job.last_seen < cutoff:
+                    print(f"Job {job.id}: no client for {self.abandon_after}s, cancelling")
+                    self.cancel(job, 'Cancelled: the client went away')
@@ -1,29 +1,183 @@
 import os
-import subprocess
 import json
 import uuid
 import threading
-from flask import Flask, render_template, request, jsonify, send_file, after_this_request
+from flask import Flask, render_template, request, jsonify, send_file, Response, g, redirect
+from metadata_cache import MetadataCache, MetadataError
+from jobs import JobQueue, BrokerQueue, JobError, QueueFull, FINISHED
+from job_store import JobStore
+from broker import SOURCE_PREFIX, SQLiteBroker, default_node_name
+import progress
+import streaming
+from streaming import StreamError
+from werkzeug.utils import secure_filename
+from engine import LazyEngine, EngineError, PARTIAL_SUFFIXES, get_startupinfo
+from clip_cache import ClipCache, clip_key
+from validation import time_to_seconds, request_section, request_policy, check_range
+import batch
+import playlist
+import preview
+import segments
+import smartcut
+import formats
+import metrics
+import time
+from smartcut import SmartCutError
+from preview import PreviewCache, PreviewError
+from governor import Governor, Overloaded
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 
 app = Flask(__name__)
 # Configure yt-dlp command - assumes it's in the PATH or same directory
-YT_DLP_CMD = 'yt-dlp'
+# (overridable, e.g. benchmarks/fake_ytdlp.py for load tests)
+YT_DLP_CMD = os.environ.get('YT_DLP_CMD', 'yt-dlp')
+FFMPEG_CMD = os.environ.get('FFMPEG_CMD', 'ffmpeg')
+FFPROBE_CMD = os.environ.get('FFPROBE_CMD', 'ffprobe')
 DOWNLOAD_FOLDER = os.path.join(os.getcwd(), 'downloads')
+# Full source videos kept for smart cutting (cut_mode='smart')
+SOURCE_FOLDER = os.path.join(DOWNLOAD_FOLDER, 'sources')
+# Timeline preview images, a folder per URL
+PREVIEW_FOLDER = os.path.join(DOWNLOAD_FOLDER, 'previews')
+
+# yt-dlp backend: 'inprocess' (Python API, warm YoutubeDL pool), 'subprocess' or 'auto'
+YTDLP_ENGINE = os.environ.get('YTDLP_ENGINE', 'auto')
+YTDLP_POOL_SIZE = int(os.environ.get('YTDLP_POOL_SIZE', 4))
+
+# Metadata cache: how long a `yt-dlp -J` result stays valid and how many URLs we keep
+METADATA_CACHE_TTL = int(os.environ.get('METADATA_CACHE_TTL', 600))
+METADATA_CACHE_SIZE = int(os.environ.get('METADATA_CACHE_SIZE', 256))
+
+# Clip cache: disk budget for finished clips, how long an unused clip is kept,
+# and how often the janitor thread evicts/sweeps
+CLIP_CACHE_MAX_BYTES = int(os.environ.get('CLIP_CACHE_MAX_MB', 5 * 1024)) * 1024 * 1024
+CLIP_CACHE_MAX_AGE = int(os.environ.get('CLIP_CACHE_MAX_AGE', 3600))
+JANITOR_INTERVAL = int(os.environ.get('JANITOR_INTERVAL', 60))
+# Source cache (smart cut): disk budget and idle lifetime of downloaded full videos
+SOURCE_CACHE_MAX_BYTES = int(os.environ.get('SOURCE_CACHE_MAX_MB', 10 * 1024)) * 1024 * 1024
+SOURCE_CACHE_MAX_AGE = int(os.environ.get('SOURCE_CACHE_MAX_AGE', 6 * 3600))
+
+# Cache-Control max-age for /get-file responses (clips are immutable per name)
+FILE_MAX_AGE = int(os.environ.get('FILE_MAX_AGE', 3600))
+
+# Download job pool: how many clips are processed at once and how many may wait
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', 2))
+MAX_QUEUED_JOBS = int(os.environ.get('MAX_QUEUED_JOBS', 100))
+# SQLite file jobs are persisted to, so they survive a restart (empty = memory only).
+# Outside DOWNLOAD_FOLDER, whose janitor removes files it doesn't know.
+JOB_STORE_PATH = os.environ.get('JOB_STORE_PATH', os.path.join(os.getcwd(), 'jobs.db'))
+# Several nodes: the shared broker database (empty = this process runs its own
+# queue), this node's name, the URL other nodes reach its /get-file at, how long
+# a silent node keeps its jobs, and how long a job waits for the node that has
+# its files cached. DOWNLOAD_WORKERS=0 makes a front-end-only node.
+BROKER_PATH = os.environ.get('BROKER_PATH', '')
+NODE_NAME = os.environ.get('NODE_NAME') or default_node_name()
+NODE_URL = os.environ.get('NODE_URL') or None
+BROKER_LEASE = int(os.environ.get('BROKER_LEASE', 30))
+LOCALITY_WAIT = int(os.environ.get('LOCALITY_WAIT', 10))
+# Batch clipping: sections per request and how many merged spans download at once
+MAX_BATCH_SECTIONS = int(os.environ.get('MAX_BATCH_SECTIONS', 50))
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 3))
+# Segment-parallel clips (cut_mode='parallel'): shortest sub-range and most
+# sub-ranges per clip (also capped by cores and governor work slots)
+SEGMENT_MIN_SECONDS = int(os.environ.get('SEGMENT_MIN_SECONDS', segments.MIN_SEGMENT_SECONDS))
+MAX_SEGMENTS = int(os.environ.get('MAX_SEGMENTS', segments.MAX_SEGMENTS))
+# Playlist/channel jobs: entries per job, how many are clipped at once, and how
+# often an entry's metadata lookup may be deferred by the per-site rate limit
+PLAYLIST_MAX_ENTRIES = int(os.environ.get('PLAYLIST_MAX_ENTRIES', 100))
+PLAYLIST_CONCURRENCY = int(os.environ.get('PLAYLIST_CONCURRENCY', 3))
+PLAYLIST_METADATA_ATTEMPTS = int(os.environ.get('PLAYLIST_METADATA_ATTEMPTS', 30))
+# Timeline previews (/preview): ffmpeg processes rendering images at once (they
+# are small and don't take governor work slots), disk budget and idle lifetime
+PREVIEW_CONCURRENCY = int(os.environ.get('PREVIEW_CONCURRENCY', 2))
+PREVIEW_CACHE_MAX_BYTES = int(os.environ.get('PREVIEW_CACHE_MAX_MB', 512)) * 1024 * 1024
+PREVIEW_CACHE_MAX_AGE = int(os.environ.get('PREVIEW_CACHE_MAX_AGE', 24 * 3600))
+# Front-end controls this server backs (asgi_app.py serves fewer)
+FEATURES = {'playlist': True, 'parallel': True, 'preview': True}
+# Zero-disk streaming (/stream): each stream holds a request thread and an ffmpeg process
+MAX_STREAMS = int(os.environ.get('MAX_STREAMS', 4))
+# Seconds between keepalive comments on idle progress streams
+SSE_KEEPALIVE = 15
+# Governor: concurrent metadata extractions and download/cut processes (0 = size
+# from CPU count and RAM), requests per minute (0 = no limit) and burst per
+# source site, and how long a request may wait for a metadata slot before getting a 429
+GOVERNOR_METADATA_LIMIT = int(os.environ.get('GOVERNOR_METADATA_LIMIT', 0))
+GOVERNOR_WORK_LIMIT = int(os.environ.get('GOVERNOR_WORK_LIMIT', 0))
+HOST_RATE_PER_MIN = int(os.environ.get('HOST_RATE_PER_MIN', 30))
+HOST_BURST = int(os.environ.get('HOST_BURST', 10))
+GOVERNOR_WAIT = float(os.environ.get('GOVERNOR_WAIT', 2))
 
 if not os.path.exists(DOWNLOAD_FOLDER):
     os.makedirs(DOWNLOAD_FOLDER)
+if not os.path.exists(SOURCE_FOLDER):
+    os.makedirs(SOURCE_FOLDER)
 
-def cleanup_file(filepath):
-    """Deletes the file after response is sent."""
-    try:
-        if os.path.exists(filepath):
-            os.remove(filepath)
-    except Exception as e:
-        print(f"Error removing file {filepath}: {e}")
+# Every yt-dlp/ffmpeg child goes through the governor
+governor = Governor(GOVERNOR_METADATA_LIMIT, GOVERNOR_WORK_LIMIT, HOST_RATE_PER_MIN, HOST_BURST,
+                    wait=GOVERNOR_WAIT)
+
+engine = LazyEngine(YTDLP_ENGINE, cmd=YT_DLP_CMD, pool_size=YTDLP_POOL_SIZE)
+engine.warm_up()
+
+# Prometheus metrics (/metrics). Histograms are in seconds.
+registry = metrics.Registry()
+METADATA_SECONDS = registry.histogram('slice_metadata_extract_seconds', 'yt-dlp metadata extraction (cache misses only)')
+DOWNLOAD_SECONDS = registry.histogram('slice_download_seconds', 'yt-dlp download of a clip, span or source', ['kind'])
+CUT_SECONDS = registry.histogram('slice_cut_seconds', 'Local ffmpeg cut', ['mode'])
+DELIVERY_SECONDS = registry.histogram('slice_delivery_seconds', 'Time from request to the last byte sent', ['route'])
+YTDLP_ACTIVE = registry.gauge('slice_ytdlp_active', 'yt-dlp downloads running right now')
+BYTES_SERVED = registry.counter('slice_bytes_served_total', 'Bytes sent to clients', ['route'])
+ERRORS = registry.counter('slice_errors_total', 'Errors by category', ['category'])
+
+def fetch_video_info(url):
+    """`yt-dlp -J` equivalent through the configured engine. Raises MetadataError on failure."""
+    # A cache miss talks to the site: counts against its rate and needs a slot
+    governor.admit(url)
+    with governor.metadata(), metrics.timed(METADATA_SECONDS, 'extract'):
+        try:
+            return engine.extract_info(url)
+        except MetadataError:
+            ERRORS.inc(category='metadata')
+            raise
+
+def run_engine_download(kind, *args, **kwargs):
+    """engine.download() with timing and the active-downloads gauge. `kind` is clip, source or span."""
+    with governor.work(), YTDLP_ACTIVE.track(), metrics.timed(DOWNLOAD_SECONDS, 'download', kind=kind):
+        try:
+            engine.download(*args, **kwargs)
+        except EngineError:
+            ERRORS.inc(category='download')
+            raise
+
+# Shared by /formats and /download so one clip costs a single metadata extraction
+metadata_cache = MetadataCache(fetch_video_info, ttl=METADATA_CACHE_TTL, max_entries=METADATA_CACHE_SIZE)
+
+# Multi-node mode: jobs go through the broker, which also learns what this node
+# has cached. Reset first, so the caches' startup sweep reports a clean slate.
+broker = None
+cache_listener = None
+source_listener = None
+if BROKER_PATH:
+    broker = SQLiteBroker(BROKER_PATH, lease=BROKER_LEASE)
+    broker.reset_node(NODE_NAME)
+    cache_listener = lambda key, filename: broker.cached(NODE_NAME, key, filename)
+    # Sources share keys and filenames with whole-video clips: kept apart in the broker
+    source_listener = lambda key, filename: broker.cached(NODE_NAME, SOURCE_PREFIX + key, filename)
+
+# Finished clips stay on disk (within the budget) so repeated requests are instant.
+# The janitor thread inside ClipCache replaces per-file deletion timers.
+clip_cache = ClipCache(DOWNLOAD_FOLDER, max_bytes=CLIP_CACHE_MAX_BYTES, max_age=CLIP_CACHE_MAX_AGE,
+                       interval=JANITOR_INTERVAL, on_change=cache_listener)
+# Same mechanics for whole source videos; many clips are cut from one source
+source_cache = ClipCache(SOURCE_FOLDER, max_bytes=SOURCE_CACHE_MAX_BYTES, max_age=SOURCE_CACHE_MAX_AGE,
+                         interval=JANITOR_INTERVAL, on_change=source_listener)
+# Timeline previews (storyboard sheets, keyframes), rendered on demand
+preview_cache = PreviewCache(PREVIEW_FOLDER, FFMPEG_CMD, concurrency=PREVIEW_CONCURRENCY,
+                             max_bytes=PREVIEW_CACHE_MAX_BYTES, max_age=PREVIEW_CACHE_MAX_AGE)
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', features=FEATURES)
 
 @app.route('/formats', methods=['POST'])
 def get_formats():
@@ -32,106 +186,463 @@ def get_formats():
         return jsonify({'error': 'URL is required'}), 400
 
     try:
-        # Run yt-dlp -J to get JSON info
-        cmd = [YT_DLP_CMD, '-J', url]
-        
-        # Windows-specific startup info to hide console window
-        startupinfo = None
-        if os.name == 'nt':
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding='utf-8', 
-            startupinfo=startupinfo
-        )
-        stdout, stderr = process.communicate()
-
-        if process.returncode != 0:
-            return jsonify({'error': stderr or 'Unknown error fetching formats'}), 500
-
-        data = json.loads(stdout)
-        formats = data.get('formats', [])
-        
-        filtered_formats = []
-        
-        # User Logic: Filter out "Video Only" and "Audio Only"
-        # We want Combined (vcodec != 'none' and acodec != 'none')
-        # OR if user explicitly wants to see everything, but the request says:
-        # "Show me things that don't have this [video only/audio only], meaning video and audio together"
-        
-        for f in formats:
-            # Use 'unknown' as default to avoid filtering out formats where codec info is missing (like generic 'sd'/'hd')
-            vcodec = f.get('vcodec', 'unknown')
-            acodec = f.get('acodec', 'unknown')
-            
-            # Skip only if explicitly marked as 'none' (meaning stream is missing that component)
-            if vcodec == 'none' or acodec == 'none':
-                continue
-                
-            fid = f.get('format_id')
-            # Handle "unknown resolution" logic: if resolution is 'unknown' or not present, use width x height
-            res = f.get('resolution')
-            width = f.get('width')
-            height = f.get('height')
-            
-            if not res or res == 'unknown':
-                if width and height:
-                     res = f"{width}x{height}"
-                else:
-                     res = f"{fid}"
-            
-            ext = f.get('ext', '')
-            note = f.get('format_note', '')
-            filesize = f.get('filesize')
-            fs_str = f"{filesize / 1024 / 1024:.2f} MB" if filesize else "N/A"
-            
-            display_str = f"{res} ({ext}) - {note} [{fs_str}]"
-            
-            filtered_formats.append({
-                'id': fid,
-                'display': display_str,
-                'res': res, # For sorting potentially
-                'filesize': filesize or 0
-            })
-            
-        # Sort by filesize usually indicates quality for combined streams
-        filtered_formats.sort(key=lambda x: x['filesize'], reverse=True)
-        
-        # Add a "Best" option at the top
-        filtered_formats.insert(0, {'id': 'best', 'display': 'Best Quality (Default)'})
-
-        # Extract duration
-        duration_sec = data.get('duration', 0)
-        duration_str = data.get('duration_string')
-        
-        # If no duration is provided, treat it as less than an hour (3600 seconds)
-        if not duration_sec:
-            duration_sec = 3600
-        
-        # Fallback formatting if duration_string is missing
-        if not duration_str:
-             m, s = divmod(int(duration_sec), 60)
-             h, m = divmod(m, 60)
-             if h > 0:
-                 duration_str = f"{h}:{m:02d}:{s:02d}"
-             else:
-                 duration_str = f"{m:02d}:{s:02d}"
-
-        return jsonify({
-            'title': data.get('title', 'Unknown'), 
-            'formats': filtered_formats,
-            'duration': duration_sec,
-            'duration_string': duration_str
-        })
+        # yt-dlp -J (cached, so the following /download reuses it)
+        try:
+            with metrics.timed(None, 'metadata'):
+                data = metadata_cache.get(url)
+        except MetadataError as e:
+            return jsonify({'error': str(e)}), 500
+        except Overloaded as e:
+            return too_many_requests(e)
+
+        # Optional section/policy: size and time estimates are for the clip, not the whole video
+        try:
+            start_sec, end_sec = request_section(request.json)
+            policy, height = request_policy(request.json)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Combined (video + audio) formats only, ordered by the policy
+        with metrics.timed(None, 'rank'):
+            ranked = formats.rank_formats(data, start_sec, end_sec, policy, height,
+                                          smart=request.json.get('cut_mode') == 'smart')
+        return jsonify(formats.formats_response(data, ranked, policy))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def run_download_job(job):
+    """Runs on a download worker thread: validates against the duration, downloads and cuts the clip."""
+    url = job.params['url']
+    format_id = job.params['format_id']
+    start_time = job.params['start_time']
+    end_time = job.params['end_time']
+    # Phases of this job, reported by /jobs/<id> as Server-Timing
+    metrics.start_timings()
+
+    # Get video duration first to validate times (usually a cache hit after /formats)
+    try:
+        with metrics.timed(None, 'metadata'):
+            video_info = job_video_info(url)
+    except MetadataError:
+        video_info = None
+
+    if video_info is not None:
+        error = check_range(video_info, start_time, end_time)
+        if error:
+            raise JobError(error)
+
+    # Files are named after the job, so a job re-run after a restart finds its partial files
+    filename, cached, format_id = build_clip(
+        url, format_id, start_time, end_time, video_info, job.id, cut_mode=job.params.get('cut_mode'),
+        policy=job.params.get('policy', 'quality'), height=job.params.get('height'),
+        on_event=lambda event: download_queue.publish(job, event))
+
+    download_queue.publish(job, progress.make_event(progress.DONE, percent=100.0))
+
+    # The file name the client uses to fetch the result
+    return {'download_url': f'/get-file/{filename}', 'cached': cached, 'format_id': format_id,
+            'timings': job_timings()}
+
+def build_clip(url, format_id, start_time, end_time, video_info, file_id, cut_mode='reencode',
+               policy='quality', height=None, on_event=None):
+    """
+    One clip through the clip cache, downloaded (or smart cut) on a miss.
+    `file_id` names the download's files. Returns (filename, cached, format_id),
+    format_id being the one actually used.
+    """
+    # Identical requests (same URL, format and range) are served from the clip cache
+    start_sec = time_to_seconds(start_time) if start_time and end_time else None
+    end_sec = time_to_seconds(end_time) if start_time and end_time else None
+    smart = cut_mode == 'smart' and start_sec is not None
+
+    # "best" + a policy: pick the concrete format for this section (keys the cache too)
+    if format_id == 'best' and policy != 'quality' and video_info is not None:
+        format_id = formats.choose_format(video_info, start_sec, end_sec, policy, height, smart=smart)
+
+    key = clip_key(url, f"{format_id}+smart" if smart else format_id, start_sec, end_sec)
+
+    with clip_cache.building(key):
+        cached = clip_cache.get(key)
+        if cached:
+            return cached, True, format_id
+
+        downloaded_file = None
+        if smart:
+            try:
+                downloaded_file = smart_cut_clip(url, format_id, start_sec, end_sec, video_info, on_event)
+            except SmartCutError as e:
+                # The source couldn't be cut locally: let yt-dlp cut the clip instead
+                if on_event is not None:
+                    on_event(progress.make_event(progress.CUT, message=f"Smart cut failed, re-encoding: {e}"))
+        if downloaded_file is None:
+            if cut_mode == 'parallel' and start_sec is not None:
+                downloaded_file = download_segmented(file_id, url, format_id, start_sec, end_sec, video_info,
+                                                     on_event)
+            else:
+                downloaded_file = download_section(file_id, url, format_id, start_time, end_time, video_info,
+                                                   on_event)
+        return clip_cache.add(key, downloaded_file), False, format_id
+
+def too_many_requests(e, category='overloaded'):
+    """429 for an Overloaded refusal; clients should wait Retry-After seconds."""
+    ERRORS.inc(category=category)
+    response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
+def job_video_info(url, attempts=5):
+    """metadata_cache.get() for jobs: waits out the governor instead of failing the job."""
+    for attempt in range(attempts):
+        try:
+            return metadata_cache.get(url)
+        except Overloaded as e:
+            if attempt == attempts - 1:
+                raise JobError(str(e))
+            time.sleep(e.retry_after)
+
+def job_timings():
+    """{phase: milliseconds} of the job running on this thread."""
+    timings = {}
+    for name, seconds, _ in metrics.take_timings():
+        timings[name] = round(timings.get(name, 0) + seconds * 1000, 1)
+    return timings
+
+def find_download(folder, file_id):
+    """Path of the file yt-dlp wrote for template <file_id>.%(ext)s, or None."""
+    for file in os.listdir(folder):
+        if file.startswith(f"{file_id}.") and not file.endswith(PARTIAL_SUFFIXES):
+            return os.path.join(folder, file)
+    return None
+
+def download_section(file_id, url, format_id, start_time, end_time, video_info=None, on_event=None):
+    """Default path: yt-dlp downloads the range and re-encodes it (--force-keyframes-at-cuts)."""
+    # Template for output filename: id.ext
+    output_template = os.path.join(DOWNLOAD_FOLDER, f"{file_id}.%(ext)s")
+
+    # The janitor must not take the .part files of a long download for leftovers
+    with clip_cache.writing(file_id):
+        try:
+            run_engine_download('clip', url, format_id, output_template, start_time, end_time,
+                                on_event=on_event, info=video_info)
+        except EngineError as e:
+            raise JobError(str(e))
+
+        # Find the downloaded file
+        downloaded_file = find_download(DOWNLOAD_FOLDER, file_id)
+    if not downloaded_file:
+        raise JobError('Download failed, file not found.')
+    return downloaded_file
+
+def download_segmented(file_id, url, format_id, start_sec, end_sec, video_info=None, on_event=None):
+    """
+    Parallel path for long ranges: sub-ranges split on source keyframes are
+    downloaded side by side and joined losslessly. Ranges too short to split
+    take the default path.
+    """
+    count = segments.segment_count(end_sec - start_sec, min_segment=SEGMENT_MIN_SECONDS,
+                                   max_segments=min(MAX_SEGMENTS, governor.work_limit.size))
+    if count < 2:
+        return download_section(file_id, url, format_id, batch.format_clock(start_sec),
+                                batch.format_clock(end_sec), video_info, on_event)
+
+    ranges = segments.split_range(start_sec, end_sec, count)
+    # Split points move to the next keyframe of the (video) format, read remotely around each point
+    video_format_id = format_id.split('+')[0]
+    fmt = next((f for f in (video_info or {}).get('formats') or [] if f.get('format_id') == video_format_id),
+               None)
+    if fmt and fmt.get('url') and (fmt.get('protocol') or 'https').startswith('http'):
+        keyframes = segments.probe_keyframes_near(FFPROBE_CMD, fmt['url'], [start for start, _ in ranges[1:]])
+        ranges = segments.snap_to_keyframes(ranges, keyframes)
+
+    def download(output_template, start_time, end_time, on_segment_event):
+        run_engine_download('segment', url, format_id, output_template, start_time, end_time,
+                            on_event=on_segment_event, info=video_info)
+
+    # Segments are <file_id>.segNN.*
+    try:
+        with clip_cache.writing(file_id):
+            return segments.download_parallel(download, FFMPEG_CMD, DOWNLOAD_FOLDER, file_id, ranges, on_event,
+                                              ffprobe_cmd=FFPROBE_CMD)
+    except (EngineError, RuntimeError) as e:
+        raise JobError(str(e))
+
+def smart_cut_clip(url, format_id, start_sec, end_sec, video_info=None, on_event=None):
+    """
+    Smart-cut path: the whole source is downloaded once into the source cache,
+    then the clip is cut locally, re-encoding only the partial GOPs at the cuts.
+    Raises SmartCutError when the source can't be cut (build_clip() then
+    falls back to download_section()).
+    """
+    source_key = clip_key(url, format_id, None, None)
+    with source_cache.building(source_key):
+        source = source_cache.get(source_key)
+        if not source:
+            # Named after the key: an interrupted download resumes from its .part file,
+            # a finished one that never got indexed is picked up by the startup sweep
+            file_id = source_key
+            output_template = os.path.join(SOURCE_FOLDER, f"{file_id}.%(ext)s")
+            try:
+                run_engine_download('source', url, format_id, output_template,
+                                    on_event=on_event, info=video_info)
+            except EngineError as e:
+                raise JobError(str(e))
+            downloaded_file = find_download(SOURCE_FOLDER, file_id)
+            if not downloaded_file:
+                raise JobError('Download failed, file not found.')
+            source = source_cache.add(source_key, downloaded_file)
+        # Keep the source on disk while we cut from it
+        source_cache.acquire(source)
+
+    try:
+        if on_event is not None:
+            on_event(progress.make_event(progress.CUT, message='Cutting from cached source'))
+        source_path = os.path.join(SOURCE_FOLDER, source)
+        dest = os.path.join(DOWNLOAD_FOLDER, f"{uuid.uuid4()}{os.path.splitext(source)[1]}")
+        try:
+            with governor.work(), metrics.timed(CUT_SECONDS, 'cut', mode='smart'):
+                stats = smartcut.smart_cut(FFMPEG_CMD, FFPROBE_CMD, source_path, dest, start_sec, end_sec)
+        except SmartCutError:
+            ERRORS.inc(category='cut')
+            if os.path.exists(dest):
+                os.remove(dest)
+            raise
+        if on_event is not None:
+            message = (f"Cut {stats['copied_seconds']:g}s copied, {stats['encoded_seconds']:g}s re-encoded"
+                       if stats['mode'] == 'smart' else f"Cut re-encoded ({stats['fallback'] or 'no whole GOP'})")
+            on_event(progress.make_event(progress.CUT, percent=100, message=message))
+        return dest
+    finally:
+        source_cache.release(source)
+
+def run_batch_job(job):
+    """
+    Cuts many sections of one video: metadata is fetched once, overlapping or
+    touching sections are merged into spans that are downloaded once each, and
+    the spans are processed in parallel (BATCH_CONCURRENCY at a time).
+    """
+    url = job.params['url']
+    format_id = job.params['format_id']
+    sections = job.params['sections']
+
+    try:
+        video_info = job_video_info(url)
+    except MetadataError as e:
+        raise JobError(str(e))
+
+    for section in sections:
+        error = check_range(video_info, section['start_time'], section['end_time'])
+        if error:
+            raise JobError(f"Section {section['start_time']}-{section['end_time']}: {error}")
+
+    results = [{'index': i, 'start_time': sec['start_time'], 'end_time': sec['end_time']}
+               for i, sec in enumerate(sections)]
+    ranges = [(time_to_seconds(sec['start_time']), time_to_seconds(sec['end_time'])) for sec in sections]
+    keys = [clip_key(url, format_id, start, end) for start, end in ranges]
+
+    # Sections already in the clip cache need no download at all
+    pending = []
+    for i, key in enumerate(keys):
+        cached = clip_cache.get(key)
+        if cached:
+            results[i].update({'download_url': f'/get-file/{cached}', 'cached': True})
+        else:
+            pending.append(i)
+
+    progress_lock = threading.Lock()
+    ready = [len(sections) - len(pending)]
+
+    def section_done(count):
+        with progress_lock:
+            ready[0] += count
+            download_queue.publish(job, progress.make_event(
+                progress.CUT, percent=ready[0] * 100 / len(sections),
+                message=f"{ready[0]}/{len(sections)} sections ready"))
+
+    def process_span(numbered):
+        n, (span_start, span_end, members) = numbered
+        members = [pending[m] for m in members]
+        # Stable across restarts (same job, same sections -> same spans), for resuming
+        file_id = f"{job.id}-{n}"
+        output_template = os.path.join(DOWNLOAD_FOLDER, f"{file_id}.%(ext)s")
+        span_keys = sorted(set(keys[i] for i in members))
+
+        try:
+            # Same single-flight as build_clip(), for every clip of the span. Keys are
+            # taken in sorted order, so batches sharing clips can't deadlock.
+            with ExitStack() as held:
+                for key in span_keys:
+                    held.enter_context(clip_cache.building(key))
+                # Whoever held a key before us may have built it meanwhile
+                missing = [key for key in span_keys if not clip_cache.get(key)]
+                if missing:
+                    span_start = min(ranges[keys.index(key)][0] for key in missing)
+                    span_end = max(ranges[keys.index(key)][1] for key in missing)
+                    build_span(file_id, output_template, span_start, span_end, missing)
+
+            for i in members:
+                filename = clip_cache.get(keys[i])
+                if filename:
+                    results[i].update({'download_url': f'/get-file/{filename}', 'cached': False})
+                else:
+                    results[i]['error'] = 'Clip was evicted before the batch finished.'
+        except (EngineError, JobError, RuntimeError, OSError) as e:
+            for i in members:
+                results[i]['error'] = str(e)
+        section_done(len(members))
+
+    def build_span(file_id, output_template, span_start, span_end, span_keys):
+        # The span file (and its .part files) are ours until the sections are cut from it
+        with clip_cache.writing(file_id):
+            run_engine_download('span', url, format_id, output_template,
+                                batch.format_clock(span_start), batch.format_clock(span_end), info=video_info)
+            paths = batch.span_paths(DOWNLOAD_FOLDER, file_id)
+            if not paths:
+                raise JobError('Download failed, file not found.')
+            span_file = paths[0]
+            ext = os.path.splitext(span_file)[1]
+
+            # Each distinct range in the span is cut once from the local file;
+            # a section that is the whole span just takes the downloaded file
+            keep_span_as = None
+            for key in span_keys:
+                start, end = ranges[keys.index(key)]
+                if (start, end) == (span_start, span_end):
+                    keep_span_as = key
+                    continue
+                cut_path = os.path.join(DOWNLOAD_FOLDER, f"{uuid.uuid4()}{ext}")
+                try:
+                    with governor.work(), metrics.timed(CUT_SECONDS, 'cut', mode='batch'):
+                        batch.cut_local(FFMPEG_CMD, span_file, cut_path, start - span_start, end - start)
+                except RuntimeError:
+                    ERRORS.inc(category='cut')
+                    raise
+                clip_cache.add(key, cut_path)
+
+            if keep_span_as:
+                clip_cache.add(keep_span_as, span_file)
+            else:
+                os.remove(span_file)
+
+    spans = batch.merge_ranges([ranges[i] for i in pending])
+    if spans:
+        with ThreadPoolExecutor(max_workers=min(BATCH_CONCURRENCY, len(spans))) as pool:
+            list(pool.map(process_span, enumerate(spans)))
+
+    if all('error' in r for r in results):
+        raise JobError(results[0]['error'])
+
+    download_queue.publish(job, progress.make_event(progress.DONE, percent=100.0))
+    return {
+        'sections': results,
+        'spans_downloaded': len(spans),
+        'zip_url': f'/jobs/{job.id}/zip',
+    }
+
+def run_playlist_job(job):
+    """
+    Cuts the same range (or takes the whole video) from every entry of a
+    playlist or channel. Entries are listed lazily and clipped by a bounded
+    pipeline while the listing goes on; every progress event carries the
+    entries so far, so clients get each clip as soon as it is ready.
+    """
+    url = job.params['url']
+    format_id = job.params['format_id']
+    start_time = job.params['start_time']
+    end_time = job.params['end_time']
+
+    entries = []  # one summary per listed entry, in playlist order
+    lock = threading.Lock()
+
+    def publish(message=None):
+        # Caller holds the lock
+        done = sum(1 for e in entries if e['status'] in ('finished', 'failed'))
+        event = progress.make_event(progress.PLAYLIST,
+                                    message=message or f"{done}/{len(entries)} listed entries done")
+        event['entries'] = [dict(e) for e in entries]
+        download_queue.publish(job, event)
+
+    def listed(index, entry):
+        with lock:
+            entries.append({'index': index, 'title': entry['title'], 'url': entry['url'], 'status': 'queued'})
+            publish()
+
+    def process(index, entry):
+        try:
+            if not entry['url']:
+                raise JobError('Entry has no URL.')
+            video_info = job_video_info(entry['url'], attempts=PLAYLIST_METADATA_ATTEMPTS)
+            error = check_range(video_info, start_time, end_time)
+            if error:
+                raise JobError(error)
+            filename, cached, used_format = build_clip(
+                entry['url'], format_id, start_time, end_time, video_info, f"{job.id}-{index}",
+                policy=job.params.get('policy', 'quality'), height=job.params.get('height'))
+            update = {'status': 'finished', 'download_url': f'/get-file/{filename}', 'cached': cached,
+                      'format_id': used_format}
+        except (JobError, MetadataError, OSError) as e:
+            update = {'status': 'failed', 'error': str(e)}
+        except Exception as e:
+            # Odd metadata, an engine error...: only this entry fails, the others go on
+            print(f"Job {job.id} entry {index} crashed: {e!r}")
+            update = {'status': 'failed', 'error': str(e) or type(e).__name__}
+        with lock:
+            entries[index].update(update)
+            publish()
+
+    listing_error = None
+    try:
+        playlist.run_pipeline(engine.iter_playlist(url), process, concurrency=PLAYLIST_CONCURRENCY,
+                              max_entries=job.params['max_entries'], on_listed=listed)
+    except MetadataError as e:
+        if not entries:
+            raise JobError(str(e))
+        # The listing broke off: keep what was listed, say why the rest is missing
+        ERRORS.inc(category='metadata')
+        listing_error = f"Listing stopped after {len(entries)} entries: {e}"
+        with lock:
+            publish(listing_error)
+
+    if not entries:
+        raise JobError('The playlist has no entries.')
+    finished = sum(1 for e in entries if e['status'] == 'finished')
+    if not finished:
+        raise JobError(entries[0].get('error') or 'No entry could be clipped.')
+
+    download_queue.publish(job, progress.make_event(progress.DONE, percent=100.0))
+    return {
+        'entries': entries,
+        'finished': finished,
+        'failed': len(entries) - finished,
+        'listing_error': listing_error,
+        'zip_url': f'/jobs/{job.id}/zip',
+    }
+
+stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
+
+# yt-dlp/ffmpeg runs on these worker threads, never on a request thread
+if broker is not None:
+    # Any node's workers may run a job submitted here, the one with the files cached first
+    download_queue = BrokerQueue(run_download_job, broker, NODE_NAME, NODE_URL, workers=DOWNLOAD_WORKERS,
+                                 max_queued=MAX_QUEUED_JOBS, runners=[run_batch_job, run_playlist_job],
+                                 locality_wait=LOCALITY_WAIT)
+    download_queue.start()
+else:
+    job_store = JobStore(JOB_STORE_PATH) if JOB_STORE_PATH else None
+    download_queue = JobQueue(run_download_job, workers=DOWNLOAD_WORKERS, max_queued=MAX_QUEUED_JOBS,
+                              store=job_store, runners=[run_batch_job, run_playlist_job])
+    # Jobs from before a restart: results stay available, interrupted jobs run again
+    download_queue.recover()
+
+def elsewhere(filename, path):
+    """307 to the node that has `filename` cached (multi-node mode), or None."""
+    if broker is None:
+        return None
+    node_url = broker.locate(filename, exclude=NODE_NAME)
+    if node_url is None:
+        return None
+    return redirect(f"{node_url.rstrip('/')}{path}", code=307)
+
 @app.route('/download', methods=['POST'])
 def download_video():
     data = request.json
@@ -139,141 +650,488 @@ def download_video():
     format_id = data.get('format_id', 'best')
     start_time = data.get('start_time')
     end_time = data.get('end_time')
+    # 'reencode' (yt-dlp cuts with --force-keyframes-at-cuts), 'smart' (cached source + smart cut)
+    # or 'parallel' (long range in sub-ranges downloaded at once, then joined)
+    cut_mode = data.get('cut_mode', 'reencode')
 
     if not url:
         return jsonify({'error': 'URL is required'}), 400
+    if cut_mode not in ('reencode', 'smart', 'parallel'):
+        return jsonify({'error': f'Unknown cut_mode: {cut_mode}'}), 400
 
-    # Helper function to convert time string to seconds
-    def time_to_seconds(time_str):
-        if not time_str:
-            return 0
-        parts = time_str.strip().split(':')[::-1]
-        seconds = 0
-        if len(parts) > 0:
-            seconds += int(parts[0])
-        if len(parts) > 1:
-            seconds += int(parts[1]) * 60
-        if len(parts) > 2:
-            seconds += int(parts[2]) * 3600
-        return seconds
-
-    # Validate time inputs
-    if start_time and end_time:
-        start_sec = time_to_seconds(start_time)
-        end_sec = time_to_seconds(end_time)
-        if end_sec <= start_sec:
+    # Validate time inputs (cheap checks only, the duration check runs inside the job)
+    try:
+        if start_time and end_time:
+            if time_to_seconds(end_time) <= time_to_seconds(start_time):
+                return jsonify({'error': 'End time must be greater than Start time.'}), 400
+    except ValueError:
+        return jsonify({'error': 'Invalid time format, use mm:ss or hh:mm:ss.'}), 400
+
+    # Used when format_id is 'best': 'smallest'/'fastest' format at least `height` tall
+    try:
+        policy, height = request_policy(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # The job will download from the site: charge its bucket now, so a flood gets a 429 instead of a queue
+    try:
+        governor.admit(url)
+    except Overloaded as e:
+        return too_many_requests(e)
+
+    # Multi-node: the node that has this clip (or, for smart cuts, its source) cached should run it
+    if cut_mode == 'smart':
+        locality = SOURCE_PREFIX + clip_key(url, format_id, None, None)
+    elif start_time and end_time:
+        locality = clip_key(url, format_id, time_to_seconds(start_time), time_to_seconds(end_time))
+    else:
+        locality = clip_key(url, format_id, None, None)
+
+    try:
+        with metrics.timed(None, 'enqueue'):
+            job = download_queue.submit({
+                'url': url,
+                'format_id': format_id,
+                'start_time': start_time,
+                'end_time': end_time,
+                'cut_mode': cut_mode,
+                'policy': policy,
+                'height': height,
+            }, locality=locality)
+    except QueueFull as e:
+        return too_many_requests(Overloaded(str(e), governor.retry_after), 'queue_full')
+
+    # Client polls status_url until the job is finished and carries a download_url
+    response = download_queue.to_dict(job)
+    response['status_url'] = f'/jobs/{job.id}'
+    return jsonify(response), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = download_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    # Where the job's time went, next to this request's own timing
+    if job.state == FINISHED and isinstance(job.result, dict):
+        for name, ms in job.result.get('timings', {}).items():
+            metrics.record(f'job-{name}', ms / 1000)
+    return jsonify(download_queue.to_dict(job))
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events: a `progress` event per parsed yt-dlp/ffmpeg update, `status` on state changes."""
+    job = download_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    def generate():
+        seen = -1
+        last_state = None
+        while True:
+            version = download_queue.wait_for_update(job, seen, timeout=SSE_KEEPALIVE)
+            if version == seen and not job.done:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            seen = version
+
+            if job.progress is not None:
+                yield sse('progress', job.progress)
+            if job.state != last_state or job.done:
+                last_state = job.state
+                yield sse('status', download_queue.to_dict(job))
+            if job.done:
+                return
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(generate(), mimetype='text/event-stream', headers=headers)
+
+@app.route('/batch', methods=['POST'])
+def batch_download():
+    """
+    Many sections of one video in a single job:
+    {"url": ..., "format_id": ..., "sections": [{"start_time": "01:00", "end_time": "01:30"}, ...]}
+    """
+    data = request.json
+    url = data.get('url')
+    format_id = data.get('format_id', 'best')
+    sections = data.get('sections')
+
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+    if not isinstance(sections, list) or not sections:
+        return jsonify({'error': 'At least one section is required'}), 400
+    if len(sections) > MAX_BATCH_SECTIONS:
+        return jsonify({'error': f'At most {MAX_BATCH_SECTIONS} sections per batch.'}), 400
+
+    cleaned = []
+    for section in sections:
+        start_time = (section or {}).get('start_time')
+        end_time = (section or {}).get('end_time')
+        if not start_time or not end_time:
+            return jsonify({'error': 'Every section needs a start_time and an end_time.'}), 400
+        try:
+            if time_to_seconds(end_time) <= time_to_seconds(start_time):
+                return jsonify({'error': f'Section {start_time}-{end_time}: End time must be greater than Start time.'}), 400
+        except ValueError:
+            return jsonify({'error': 'Invalid time format, use mm:ss or hh:mm:ss.'}), 400
+        cleaned.append({'start_time': start_time, 'end_time': end_time})
+
+    # The job will download from the site: charge its bucket now, so a flood gets a 429 instead of a queue
+    try:
+        governor.admit(url)
+    except Overloaded as e:
+        return too_many_requests(e)
+
+    try:
+        job = download_queue.submit({
+            'url': url,
+            'format_id': format_id,
+            'sections': cleaned,
+        }, runner=run_batch_job)
+    except QueueFull as e:
+        return too_many_requests(Overloaded(str(e), governor.retry_after), 'queue_full')
+
+    response = download_queue.to_dict(job)
+    response['status_url'] = f'/jobs/{job.id}'
+    return jsonify(response), 202
+
+@app.route('/playlist', methods=['POST'])
+def playlist_download():
+    """
+    The same clip from every entry of a playlist or channel:
+    {"url": ..., "format_id": "best", "start_time": ..., "end_time": ..., "max_entries": 50}
+    Entries show up in the job's progress (`entries`) as they are listed and clipped.
+    """
+    data = request.json
+    url = data.get('url')
+    format_id = data.get('format_id', 'best')
+    start_time = data.get('start_time')
+    end_time = data.get('end_time')
+
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+    try:
+        if start_time and end_time and time_to_seconds(end_time) <= time_to_seconds(start_time):
             return jsonify({'error': 'End time must be greater than Start time.'}), 400
+    except ValueError:
+        return jsonify({'error': 'Invalid time format, use mm:ss or hh:mm:ss.'}), 400
+    try:
+        policy, height = request_policy(data)
+        max_entries = int(data.get('max_entries') or PLAYLIST_MAX_ENTRIES)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not 0 < max_entries <= PLAYLIST_MAX_ENTRIES:
+        return jsonify({'error': f'max_entries must be between 1 and {PLAYLIST_MAX_ENTRIES}'}), 400
 
     try:
-        # Get video duration first to validate times
-        cmd_info = [YT_DLP_CMD, '-J', url]
-        startupinfo = None
-        if os.name == 'nt':
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-        process = subprocess.Popen(
-            cmd_info,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding='utf-8',
-            startupinfo=startupinfo
-        )
-        stdout, stderr = process.communicate()
-        
-        if process.returncode == 0:
-            video_info = json.loads(stdout)
-            duration = video_info.get('duration', 0)
-            
-            # If no duration is provided, treat it as less than an hour (3599 seconds)
-            if not duration:
-                duration = 3599
-            
-            # Validate start_time and end_time against duration
-            if start_time:
-                start_sec = time_to_seconds(start_time)
-                if start_sec > duration:
-                    return jsonify({'error': f'Start time exceeds video duration ({duration} seconds).'}), 400
-            
-            if end_time:
-                end_sec = time_to_seconds(end_time)
-                if end_sec > (duration+1):
-                    return jsonify({'error': f'End time exceeds video duration ({duration} seconds).'}), 400
-
-        # Generate unique filename for temp storage
-        file_id = str(uuid.uuid4())
-        # Template for output filename: id.ext
-        output_template = os.path.join(DOWNLOAD_FOLDER, f"{file_id}.%(ext)s")
+        governor.admit(url)
+    except Overloaded as e:
+        return too_many_requests(e)
 
-        cmd = [
-            YT_DLP_CMD,
-            '-f', format_id,
-            url,
-            '-o', output_template,
-            '--force-keyframes-at-cuts'
-        ]
+    try:
+        job = download_queue.submit({
+            'url': url,
+            'format_id': format_id,
+            'start_time': start_time,
+            'end_time': end_time,
+            'policy': policy,
+            'height': height,
+            'max_entries': max_entries,
+        }, runner=run_playlist_job)
+    except QueueFull as e:
+        return too_many_requests(Overloaded(str(e), governor.retry_after), 'queue_full')
 
-        if start_time and end_time:
-             cmd.extend(['--download-sections', f'*{start_time}-{end_time}'])
-
-        startupinfo = None
-        if os.name == 'nt':
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding='utf-8',
-            startupinfo=startupinfo
-        )
-        stdout, stderr = process.communicate()
-
-        if process.returncode != 0:
-             return jsonify({'error': stderr}), 500
+    response = download_queue.to_dict(job)
+    response['status_url'] = f'/jobs/{job.id}'
+    return jsonify(response), 202
 
-        # Find the downloaded file
-        downloaded_file = None
-        for file in os.listdir(DOWNLOAD_FOLDER):
-            if file.startswith(file_id):
-                downloaded_file = os.path.join(DOWNLOAD_FOLDER, file)
-                break
-        
-        if not downloaded_file:
-            return jsonify({'error': 'Download failed, file not found.'}), 500
+@app.route('/jobs/<job_id>/zip')
+def job_zip(job_id):
+    """Streams every clip of a finished batch or playlist job as one ZIP."""
+    job = download_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.state != 'finished' or not job.result or not ('sections' in job.result or 'entries' in job.result):
+        return jsonify({'error': 'Batch is not finished'}), 409
 
-        # Return the file name for the client to request download
-        return jsonify({'download_url': f'/get-file/{os.path.basename(downloaded_file)}'})
+    files = []  # (arcname, filename)
+    for section in job.result.get('sections', []):
+        if 'download_url' not in section:
+            continue
+        filename = section['download_url'].rsplit('/', 1)[1]
+        arcname = batch.section_filename(section['index'], time_to_seconds(section['start_time']),
+                                         time_to_seconds(section['end_time']), os.path.splitext(filename)[1])
+        files.append((arcname, filename))
+    for entry in job.result.get('entries', []):
+        if 'download_url' not in entry:
+            continue
+        filename = entry['download_url'].rsplit('/', 1)[1]
+        title = secure_filename(entry['title']) or 'clip'
+        files.append((f"{entry['index'] + 1:03d}_{title}{os.path.splitext(filename)[1]}", filename))
 
-    except Exception as e:
+    # Pin every clip while the archive is being sent
+    pinned = []
+    for _, filename in files:
+        if not clip_cache.acquire(filename):
+            for name in pinned:
+                clip_cache.release(name)
+            # The batch ran on another node: that one builds the archive
+            response = elsewhere(filename, f'/jobs/{job_id}/zip')
+            if response is not None:
+                return response
+            return jsonify({'error': 'Some clips have expired, run the batch again.'}), 410
+        pinned.append(filename)
+
+    def release_all():
+        for filename in pinned:
+            clip_cache.release(filename)
+
+    entries = [(arcname, os.path.join(DOWNLOAD_FOLDER, filename)) for arcname, filename in files]
+    response = Response(count_served(batch.iter_zip(entries), 'zip', g.request_started),
+                        mimetype='application/zip',
+                        headers={'Content-Disposition': 'attachment; filename="clips.zip"'})
+    response.call_on_close(release_all)
+    return response
+
+@app.route('/stream')
+def stream_clip():
+    """
+    Opt-in zero-disk mode: ffmpeg cuts the clip straight from the source URL and
+    the muxed output (fragmented MP4 or MPEG-TS) is sent as it is produced.
+    Nothing is written to DOWNLOAD_FOLDER; closing the connection kills ffmpeg.
+    """
+    url = request.args.get('url')
+    format_id = request.args.get('format_id', 'best')
+    start_time = request.args.get('start_time')
+    end_time = request.args.get('end_time')
+    container = request.args.get('container', 'mp4')
+
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+    if container not in streaming.CONTAINERS:
+        return jsonify({'error': f'Unsupported container: {container}'}), 400
+
+    try:
+        start_sec = time_to_seconds(start_time) if start_time else None
+        end_sec = time_to_seconds(end_time) if end_time else None
+    except ValueError:
+        return jsonify({'error': 'Invalid time format, use mm:ss or hh:mm:ss.'}), 400
+    if start_sec is not None and end_sec is not None and end_sec <= start_sec:
+        return jsonify({'error': 'End time must be greater than Start time.'}), 400
+
+    try:
+        video_info = metadata_cache.get(url)
+    except MetadataError as e:
+        return jsonify({'error': str(e)}), 500
+    except Overloaded as e:
+        return too_many_requests(e)
+
+    error = check_range(video_info, start_time, end_time)
+    if error:
+        return jsonify({'error': error}), 400
+
+    try:
+        inputs = streaming.select_inputs(video_info, format_id)
+        cmd = streaming.build_ffmpeg_cmd(FFMPEG_CMD, inputs, start_sec, end_sec, container)
+    except StreamError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not stream_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many active streams, try again later or use the normal download.'}), 503
+    # The ffmpeg child counts against the same download/cut limit as jobs
+    try:
+        release_work = governor.try_work()
+    except Overloaded as e:
+        stream_slots.release()
+        return too_many_requests(e)
+
+    title = secure_filename(video_info.get('title') or '') or 'clip'
+    ext = streaming.CONTAINERS[container]['ext']
+    headers = {
+        'Content-Disposition': f'attachment; filename="{title}.{ext}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',
+    }
+    # No Content-Length -> chunked transfer encoding
+    body = streaming.stream_process(cmd, startupinfo=get_startupinfo())
+    response = Response(count_served(body, 'stream', g.request_started),
+                        mimetype=streaming.CONTAINERS[container]['mimetype'], headers=headers)
+    # Runs when the WSGI server closes the response, also if the client left before the first byte
+    response.call_on_close(stream_slots.release)
+    response.call_on_close(release_work)
+    return response
+
+@app.route('/preview', methods=['POST'])
+def preview_timeline():
+    """
+    One page of cheap thumbnails over the timeline, to pick cut points before
+    paying for the clip. The page asks for the next one (start = 'next') as
+    the user scrolls; each tile's image comes from /preview/image.
+    """
+    url = request.json.get('url')
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+    try:
+        start = float(request.json.get('start') or 0)
+        count = int(request.json.get('count') or preview.PAGE_TILES)
+        step = float(request.json.get('step') or 0) or None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'start, count and step must be numbers'}), 400
+
+    try:
+        video_info = metadata_cache.get(url)
+    except MetadataError as e:
         return jsonify({'error': str(e)}), 500
+    except Overloaded as e:
+        return too_many_requests(e)
+
+    try:
+        return jsonify(preview.tiles(video_info, start, count, step))
+    except PreviewError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/preview/image')
+def preview_image():
+    """A storyboard sheet or keyframe named by /preview, rendered on first request and cached per URL."""
+    url = request.args.get('url')
+    name = request.args.get('name')
+    if not url or not name:
+        return jsonify({'error': 'url and name are required'}), 400
+
+    try:
+        # Metadata is only needed to render a missing image
+        path = preview_cache.image(url, name, lambda: metadata_cache.get(url))
+    except MetadataError as e:
+        return jsonify({'error': str(e)}), 500
+    except Overloaded as e:
+        return too_many_requests(e)
+    except PreviewError as e:
+        ERRORS.inc(category='preview')
+        return jsonify({'error': str(e)}), 404
+    return send_file(path, mimetype='image/jpeg', conditional=True, max_age=PREVIEW_CACHE_MAX_AGE)
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify({
+        'engine': engine.name,
+        'metadata': metadata_cache.stats(),
+        'jobs': download_queue.stats(),
+        'clips': clip_cache.stats(),
+        'sources': source_cache.stats(),
+        'governor': governor.stats(),
+        'previews': preview_cache.stats(),
+    })
 
 @app.route('/get-file/<filename>')
 def get_file(filename):
-    filepath = os.path.join(DOWNLOAD_FOLDER, filename)
-    if not os.path.exists(filepath):
+    """
+    Sends a finished clip. Supports Range requests (resume, parallel chunks) and
+    ETag/Last-Modified revalidation; the body goes through the server's
+    wsgi.file_wrapper, which gunicorn turns into sendfile().
+    """
+    # Only clips in the cache index are served (it is rebuilt from disk on startup),
+    # and the clip stays pinned for as long as this response is sending it
+    if not clip_cache.acquire(filename):
+        # Made by another node's worker
+        response = elsewhere(filename, f'/get-file/{filename}')
+        if response is not None:
+            return response
+        ERRORS.inc(category='not_found')
+        return "File not found", 404
+
+    try:
+        response = send_file(os.path.join(DOWNLOAD_FOLDER, filename), as_attachment=True, conditional=True,
+                             etag=True, max_age=FILE_MAX_AGE)
+    except FileNotFoundError:
+        clip_cache.release(filename)
+        ERRORS.inc(category='not_found')
         return "File not found", 404
 
-    @after_this_request
-    def remove_file(response):
+    # Advertise resume support on full responses too, not only on 206s
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.call_on_close(lambda: clip_cache.release(filename))
+
+    # Content-Length is the part actually sent (0 for a 304, the range for a 206)
+    sent = response.content_length or 0
+    started = g.request_started
+    def delivered():
+        BYTES_SERVED.inc(sent, route='file')
+        DELIVERY_SECONDS.observe(time.perf_counter() - started, route='file')
+    response.call_on_close(delivered)
+    return response
+
+def count_served(chunks, route, started):
+    """
+    Passes a streamed body through, counting bytes and the time from `started`
+    (the request's g.request_started) until the last chunk or disconnect.
+    The body is iterated after the view returns, outside the app context, so
+    `started` is read by the view rather than here.
+    """
+    try:
+        for chunk in chunks:
+            BYTES_SERVED.inc(len(chunk), route=route)
+            yield chunk
+    finally:
+        DELIVERY_SECONDS.observe(time.perf_counter() - started, route=route)
+
+def folder_bytes(folder):
+    """Disk usage of a folder, subfolders included."""
+    total = 0
+    for entry in os.scandir(folder):
         try:
-            # Clean up in a separate thread/timer to allow file handle release? 
-            # Flask usually handles streaming fine, but on Windows file locks can be tricky.
-            # We'll rely on OS simple remove, wrapped in try-except.
-            # Actually, `send_file` keeps it open. We might need `send_from_directory`.
-            # A robust way is a scheduled cleanup. But let's try immediate remove.
-            # Wait, standard practice for temp downloads is hard in simple Flask.
-            # We will use a timer based cleanup or just leave them for now?
-            # User wants a robust solution. I'll add a timer thread to delete it after 60s.
-            threading.Timer(60, lambda: cleanup_file(filepath)).start()
-        except Exception as e:
-            print(e)
-        return response
+            if entry.is_dir(follow_symlinks=False):
+                total += folder_bytes(entry.path)
+            else:
+                total += entry.stat(follow_symlinks=False).st_size
+        except FileNotFoundError:
+            pass  # removed by the janitor while we were walking
+    return total
+
+registry.callback('slice_jobs', 'Download jobs by state',
+                  lambda: {state: download_queue.stats()[state] for state in ('running', 'queued')},
+                  labels=['state'])
+registry.callback('slice_bytes_written_total', 'Bytes of finished clips and sources written to disk',
+                  lambda: {'clips': clip_cache.stats()['added_bytes'],
+                           'sources': source_cache.stats()['added_bytes']},
+                  labels=['cache'], kind='counter')
+registry.callback('slice_disk_usage_bytes', 'Disk used by the download folder (sources included)',
+                  lambda: folder_bytes(DOWNLOAD_FOLDER))
+registry.callback('slice_metadata_cache_hits_total', 'Metadata cache hits',
+                  lambda: metadata_cache.stats()['hits'], kind='counter')
+registry.callback('slice_metadata_cache_misses_total', 'Metadata cache misses',
+                  lambda: metadata_cache.stats()['misses'], kind='counter')
+
+registry.callback('slice_governor_slots', 'Governor slots by limit and state',
+                  lambda: {(name, state): governor.stats()[name][state]
+                           for name in ('metadata', 'work') for state in ('limit', 'active', 'waiting')},
+                  labels=['limit', 'state'])
+registry.callback('slice_governor_rejected_total', 'Requests refused by the governor',
+                  lambda: {'metadata': governor.stats()['metadata']['rejected'],
+                           'work': governor.stats()['work']['rejected'],
+                           'host': sum(governor.stats()['host_rejected'].values())},
+                  labels=['reason'], kind='counter')
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition format."""
+    return Response(registry.render(), mimetype=metrics.Registry.CONTENT_TYPE)
+
+@app.before_request
+def start_request_timings():
+    g.request_started = time.perf_counter()
+    metrics.start_timings()
 
-    return send_file(filepath, as_attachment=True)
+@app.after_request
+def add_server_timing(response):
+    # Phase timings (metadata, rank, job-download, ...) plus the total handler time
+    timings = metrics.take_timings()
+    timings.append(('total', time.perf_counter() - g.request_started, None))
+    response.headers['Server-Timing'] = metrics.server_timing(timings)
+    return response
 
 if __name__ == '__main__':
     # Determine port from env or default to 5000
@@ -0,0 +1,557 @@
+"""
+asyncio server mode: the same API and front end as app.py, served by an
+ASGI server from one event loop.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+    python asgi_app.py
+
+yt-dlp and ffmpeg run as asyncio subprocesses (see aio.py), so a download
+in progress costs a task and a child process, not an OS thread, and one
+process can supervise hundreds of them. Work is cancelled when its client
+goes away: /stream kills ffmpeg as soon as the connection drops, and a
+/download job that no client polls or streams for ABANDON_AFTER seconds is
+cancelled (DELETE /jobs/<id> cancels it right away). The exception is the
+local cut of a smart-cut job, which runs smartcut.py on a thread: a
+cancelled job stops waiting for it, but its ffmpeg runs finish and their
+output is deleted afterwards. Previews render on threads the same way.
+
+Not everything app.py does is served here. /batch, /playlist,
+/jobs/<id>/zip and /metrics answer 501, cut_mode 'parallel' is refused the
+same way, and the front end hides those controls (FEATURES). There is no
+governor (admission control, per-host rate limits) and no job store: jobs
+live in memory and are lost, not resumed, on a restart.
+"""
+import asyncio
+import json
+import os
+import uuid
+
+from quart import Quart, Response, jsonify, render_template, request, send_file
+from werkzeug.utils import secure_filename
+
+import aio
+import formats
+import preview
+import progress
+import smartcut
+import streaming
+from clip_cache import ClipCache, clip_key
+from engine import EngineError, PARTIAL_SUFFIXES
+from jobs import JobError, QueueFull
+from metadata_cache import MetadataError
+from preview import PreviewCache, PreviewError
+from smartcut import SmartCutError
+from streaming import StreamError
+from validation import check_range, request_policy, request_section, time_to_seconds
+
+app = Quart(__name__)
+# Streams and SSE stay open as long as they need to
+app.config['RESPONSE_TIMEOUT'] = None
+
+# Same settings (and environment variables) as app.py
+YT_DLP_CMD = os.environ.get('YT_DLP_CMD', 'yt-dlp')
+FFMPEG_CMD = os.environ.get('FFMPEG_CMD', 'ffmpeg')
+FFPROBE_CMD = os.environ.get('FFPROBE_CMD', 'ffprobe')
+DOWNLOAD_FOLDER = os.path.join(os.getcwd(), 'downloads')
+SOURCE_FOLDER = os.path.join(DOWNLOAD_FOLDER, 'sources')
+PREVIEW_FOLDER = os.path.join(DOWNLOAD_FOLDER, 'previews')
+
+METADATA_CACHE_TTL = int(os.environ.get('METADATA_CACHE_TTL', 600))
+METADATA_CACHE_SIZE = int(os.environ.get('METADATA_CACHE_SIZE', 256))
+CLIP_CACHE_MAX_BYTES = int(os.environ.get('CLIP_CACHE_MAX_MB', 5 * 1024)) * 1024 * 1024
+CLIP_CACHE_MAX_AGE = int(os.environ.get('CLIP_CACHE_MAX_AGE', 3600))
+JANITOR_INTERVAL = int(os.environ.get('JANITOR_INTERVAL', 60))
+SOURCE_CACHE_MAX_BYTES = int(os.environ.get('SOURCE_CACHE_MAX_MB', 10 * 1024)) * 1024 * 1024
+SOURCE_CACHE_MAX_AGE = int(os.environ.get('SOURCE_CACHE_MAX_AGE', 6 * 3600))
+FILE_MAX_AGE = int(os.environ.get('FILE_MAX_AGE', 3600))
+MAX_QUEUED_JOBS = int(os.environ.get('MAX_QUEUED_JOBS', 1000))
+PREVIEW_CONCURRENCY = int(os.environ.get('PREVIEW_CONCURRENCY', 2))
+PREVIEW_CACHE_MAX_BYTES = int(os.environ.get('PREVIEW_CACHE_MAX_MB', 512)) * 1024 * 1024
+PREVIEW_CACHE_MAX_AGE = int(os.environ.get('PREVIEW_CACHE_MAX_AGE', 24 * 3600))
+SSE_KEEPALIVE = 15
+
+# No thread per download here, so many more can run at once
+ASYNC_DOWNLOAD_WORKERS = int(os.environ.get('ASYNC_DOWNLOAD_WORKERS', 64))
+ASYNC_MAX_STREAMS = int(os.environ.get('ASYNC_MAX_STREAMS', 64))
+# Seconds without a poll/stream before a job counts as abandoned
+ABANDON_AFTER = int(os.environ.get('ABANDON_AFTER', 60))
+# Retry-After (s) of the 429 for a full queue (app.py takes its governor's)
+QUEUE_RETRY_AFTER = int(os.environ.get('QUEUE_RETRY_AFTER', 5))
+
+# What the front end may offer; the rest is only served by app.py
+FEATURES = {'playlist': False, 'parallel': False, 'preview': True}
+
+os.makedirs(SOURCE_FOLDER, exist_ok=True)
+
+
+async def fetch_video_info(url):
+    return await aio.extract_info(YT_DLP_CMD, url)
+
+metadata_cache = aio.MetadataCache(fetch_video_info, ttl=METADATA_CACHE_TTL, max_entries=METADATA_CACHE_SIZE)
+
+# ClipCache only takes short locks, so it is shared with the loop as is;
+# "building" uses loop locks instead of its thread locks
+clip_cache = ClipCache(DOWNLOAD_FOLDER, max_bytes=CLIP_CACHE_MAX_BYTES, max_age=CLIP_CACHE_MAX_AGE,
+                       interval=JANITOR_INTERVAL)
+source_cache = ClipCache(SOURCE_FOLDER, max_bytes=SOURCE_CACHE_MAX_BYTES, max_age=SOURCE_CACHE_MAX_AGE,
+                         interval=JANITOR_INTERVAL)
+building = aio.KeyedLocks()
+preview_cache = PreviewCache(PREVIEW_FOLDER, FFMPEG_CMD, concurrency=PREVIEW_CONCURRENCY,
+                             max_bytes=PREVIEW_CACHE_MAX_BYTES, max_age=PREVIEW_CACHE_MAX_AGE)
+
+active_streams = 0
+
+
+def find_download(folder, file_id):
+    for file in os.listdir(folder):
+        if file.startswith(f"{file_id}.") and not file.endswith(PARTIAL_SUFFIXES):
+            return os.path.join(folder, file)
+    return None
+
+
+def remove_partial(folder, file_id):
+    """Leftovers (.part, fragments) of a download that was cancelled or failed."""
+    for file in os.listdir(folder):
+        if file.startswith(file_id):
+            try:
+                os.remove(os.path.join(folder, file))
+            except OSError:
+                pass
+
+
+async def fetch_section(job, cache, url, format_id, start_time=None, end_time=None, video_info=None):
+    """Downloads into the folder of `cache` and returns the file path; cleans up if cancelled or failed."""
+    folder = cache.folder
+    file_id = str(uuid.uuid4())
+    output_template = os.path.join(folder, f"{file_id}.%(ext)s")
+    # Keeps the cache's janitor off the .part files however long this takes
+    with cache.writing(file_id):
+        try:
+            await aio.download(YT_DLP_CMD, url, format_id, output_template, start_time, end_time,
+                               on_event=lambda event: download_queue.publish(job, event), info=video_info)
+        except EngineError as e:
+            remove_partial(folder, file_id)
+            raise JobError(str(e))
+        except BaseException:
+            remove_partial(folder, file_id)
+            raise
+
+        downloaded_file = find_download(folder, file_id)
+    if not downloaded_file:
+        raise JobError('Download failed, file not found.')
+    return downloaded_file
+
+
+async def smart_cut_clip(job, url, format_id, start_sec, end_sec, video_info=None):
+    source_key = clip_key(url, format_id, None, None)
+    async with building.hold(f"source:{source_key}"):
+        source = source_cache.get(source_key)
+        if not source:
+            downloaded_file = await fetch_section(job, source_cache, url, format_id, video_info=video_info)
+            source = source_cache.add(source_key, downloaded_file)
+        source_cache.acquire(source)
+
+    download_queue.publish(job, progress.make_event(progress.CUT, message='Cutting from cached source'))
+    source_path = os.path.join(SOURCE_FOLDER, source)
+    dest = os.path.join(DOWNLOAD_FOLDER, f"{uuid.uuid4()}{os.path.splitext(source)[1]}")
+
+    def discard(_=None):
+        if os.path.exists(dest):
+            os.remove(dest)
+        source_cache.release(source)
+
+    # Several short ffmpeg runs; kept on a thread rather than rewritten for the loop.
+    # A thread can't be interrupted: if the job is cancelled, the cut runs to its
+    # end and its output is dropped then (the source stays pinned until it does).
+    cut = asyncio.ensure_future(asyncio.to_thread(smartcut.smart_cut, FFMPEG_CMD, FFPROBE_CMD,
+                                                  source_path, dest, start_sec, end_sec))
+    try:
+        stats = await asyncio.shield(cut)
+    except asyncio.CancelledError:
+        cut.add_done_callback(discard)
+        raise
+    except BaseException:
+        discard()
+        raise
+    source_cache.release(source)
+
+    message = (f"Cut {stats['copied_seconds']:g}s copied, {stats['encoded_seconds']:g}s re-encoded"
+               if stats['mode'] == 'smart' else f"Cut re-encoded ({stats['fallback'] or 'no whole GOP'})")
+    download_queue.publish(job, progress.make_event(progress.CUT, percent=100, message=message))
+    return dest
+
+
+async def run_download_job(job):
+    url = job.params['url']
+    format_id = job.params['format_id']
+    start_time = job.params['start_time']
+    end_time = job.params['end_time']
+
+    try:
+        video_info = await metadata_cache.get(url)
+    except MetadataError:
+        video_info = None
+
+    if video_info is not None:
+        error = check_range(video_info, start_time, end_time)
+        if error:
+            raise JobError(error)
+
+    start_sec = time_to_seconds(start_time) if start_time and end_time else None
+    end_sec = time_to_seconds(end_time) if start_time and end_time else None
+    smart = job.params.get('cut_mode') == 'smart' and start_sec is not None
+
+    policy = job.params.get('policy', 'quality')
+    if format_id == 'best' and policy != 'quality' and video_info is not None:
+        format_id = formats.choose_format(video_info, start_sec, end_sec, policy,
+                                          job.params.get('height'), smart=smart)
+
+    key = clip_key(url, f"{format_id}+smart" if smart else format_id, start_sec, end_sec)
+
+    async with building.hold(key):
+        cached = clip_cache.get(key)
+        if cached:
+            download_queue.publish(job, progress.make_event(progress.DONE, percent=100.0))
+            return {'download_url': f'/get-file/{cached}', 'cached': True, 'format_id': format_id}
+
+        downloaded_file = None
+        if smart:
+            try:
+                downloaded_file = await smart_cut_clip(job, url, format_id, start_sec, end_sec, video_info)
+            except SmartCutError as e:
+                # Same fallback as app.build_clip(): let yt-dlp cut the clip instead
+                download_queue.publish(job, progress.make_event(
+                    progress.CUT, message=f"Smart cut failed, re-encoding: {e}"))
+        if downloaded_file is None:
+            downloaded_file = await fetch_section(job, clip_cache, url, format_id,
+                                                  start_time, end_time, video_info)
+        filename = clip_cache.add(key, downloaded_file)
+
+    download_queue.publish(job, progress.make_event(progress.DONE, percent=100.0))
+    return {'download_url': f'/get-file/{filename}', 'cached': False, 'format_id': format_id}
+
+
+download_queue = aio.JobQueue(run_download_job, workers=ASYNC_DOWNLOAD_WORKERS, max_queued=MAX_QUEUED_JOBS,
+                              abandon_after=ABANDON_AFTER)
+
+
+@app.before_serving
+async def start_queue():
+    download_queue.start()
+
+
+@app.route('/')
+async def index():
+    return await render_template('index.html', features=FEATURES)
+
+
+@app.route('/formats', methods=['POST'])
+async def get_formats():
+    data = await request.get_json()
+    url = data.get('url')
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+
+    try:
+        info = await metadata_cache.get(url)
+    except MetadataError as e:
+        return jsonify({'error': str(e)}), 500
+
+    try:
+        start_sec, end_sec = request_section(data)
+        policy, height = request_policy(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    ranked = formats.rank_formats(info, start_sec, end_sec, policy, height,
+                                  smart=data.get('cut_mode') == 'smart')
+    return jsonify(formats.formats_response(info, ranked, policy))
+
+
+@app.route('/download', methods=['POST'])
+async def download_video():
+    data = await request.get_json()
+    url = data.get('url')
+    format_id = data.get('format_id', 'best')
+    start_time = data.get('start_time')
+    end_time = data.get('end_time')
+    cut_mode = data.get('cut_mode', 'reencode')
+
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+    if cut_mode == 'parallel':
+        return not_served('Parallel segments')
+    if cut_mode not in ('reencode', 'smart'):
+        return jsonify({'error': f'Unknown cut_mode: {cut_mode}'}), 400
+
+    try:
+        if start_time and end_time:
+            if time_to_seconds(end_time) <= time_to_seconds(start_time):
+                return jsonify({'error': 'End time must be greater than Start time.'}), 400
+    except ValueError:
+        return jsonify({'error': 'Invalid time format, use mm:ss or hh:mm:ss.'}), 400
+
+    try:
+        policy, height = request_policy(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        job = download_queue.submit({
+            'url': url,
+            'format_id': format_id,
+            'start_time': start_time,
+            'end_time': end_time,
+            'cut_mode': cut_mode,
+            'policy': policy,
+            'height': height,
+        })
+    except QueueFull as e:
+        # Same answer as app.py: clients back off for Retry-After seconds
+        response = jsonify({'error': str(e), 'retry_after': QUEUE_RETRY_AFTER})
+        response.headers['Retry-After'] = str(QUEUE_RETRY_AFTER)
+        return response, 429
+
+    response = download_queue.to_dict(job)
+    response['status_url'] = f'/jobs/{job.id}'
+    return jsonify(response), 202
+
+
+@app.route('/jobs/<job_id>')
+async def job_status(job_id):
+    job = download_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    download_queue.seen(job)
+    return jsonify(download_queue.to_dict(job))
+
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+async def cancel_job(job_id):
+    job = download_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not download_queue.cancel(job):
+        return jsonify({'error': 'Job already finished'}), 409
+    return jsonify(download_queue.to_dict(job))
+
+
+@app.route('/jobs/<job_id>/events')
+async def job_events(job_id):
+    job = download_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    async def generate():
+        seen = -1
+        last_state = None
+        while True:
+            # An open stream counts as a watching client
+            download_queue.seen(job)
+            version = await download_queue.wait_for_update(job, seen, timeout=SSE_KEEPALIVE)
+            if version == seen and not job.done:
+                yield ": keepalive\n\n"
+                continue
+            seen = version
+
+            if job.progress is not None:
+                yield sse('progress', job.progress)
+            if job.state != last_state or job.done:
+                last_state = job.state
+                yield sse('status', download_queue.to_dict(job))
+            if job.done:
+                return
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(generate(), mimetype='text/event-stream', headers=headers)
+
+
+@app.route('/stream')
+async def stream_clip():
+    url = request.args.get('url')
+    format_id = request.args.get('format_id', 'best')
+    start_time = request.args.get('start_time')
+    end_time = request.args.get('end_time')
+    container = request.args.get('container', 'mp4')
+
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+    if container not in streaming.CONTAINERS:
+        return jsonify({'error': f'Unsupported container: {container}'}), 400
+
+    try:
+        start_sec = time_to_seconds(start_time) if start_time else None
+        end_sec = time_to_seconds(end_time) if end_time else None
+    except ValueError:
+        return jsonify({'error': 'Invalid time format, use mm:ss or hh:mm:ss.'}), 400
+    if start_sec is not None and end_sec is not None and end_sec <= start_sec:
+        return jsonify({'error': 'End time must be greater than Start time.'}), 400
+
+    try:
+        video_info = await metadata_cache.get(url)
+    except MetadataError as e:
+        return jsonify({'error': str(e)}), 500
+
+    error = check_range(video_info, start_time, end_time)
+    if error:
+        return jsonify({'error': error}), 400
+
+    try:
+        inputs = streaming.select_inputs(video_info, format_id)
+        cmd = streaming.build_ffmpeg_cmd(FFMPEG_CMD, inputs, start_sec, end_sec, container)
+    except StreamError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if active_streams >= ASYNC_MAX_STREAMS:
+        return jsonify({'error': 'Too many active streams, try again later or use the normal download.'}), 503
+
+    async def generate():
+        global active_streams
+        # Counted from inside the body: a client gone before the first chunk never
+        # starts the generator, and nothing outside it would give the slot back
+        active_streams += 1
+        try:
+            # Client disconnect cancels this generator, which kills ffmpeg
+            async for chunk in aio.stream_process(cmd):
+                yield chunk
+        finally:
+            active_streams -= 1
+
+    title = secure_filename(video_info.get('title') or '') or 'clip'
+    ext = streaming.CONTAINERS[container]['ext']
+    headers = {
+        'Content-Disposition': f'attachment; filename="{title}.{ext}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',
+    }
+    return Response(generate(), mimetype=streaming.CONTAINERS[container]['mimetype'], headers=headers)
+
+
+@app.route('/preview', methods=['POST'])
+async def preview_timeline():
+    """Same as app.py: one page of timeline thumbnails, images from /preview/image."""
+    data = await request.get_json()
+    url = data.get('url')
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+    try:
+        start = float(data.get('start') or 0)
+        count = int(data.get('count') or preview.PAGE_TILES)
+        step = float(data.get('step') or 0) or None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'start, count and step must be numbers'}), 400
+
+    try:
+        video_info = await metadata_cache.get(url)
+    except MetadataError as e:
+        return jsonify({'error': str(e)}), 500
+
+    try:
+        return jsonify(preview.tiles(video_info, start, count, step))
+    except PreviewError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/preview/image')
+async def preview_image():
+    url = request.args.get('url')
+    name = request.args.get('name')
+    if not url or not name:
+        return jsonify({'error': 'url and name are required'}), 400
+
+    loop = asyncio.get_running_loop()
+
+    def get_info():
+        # Called on the render thread, only for a missing image
+        return asyncio.run_coroutine_threadsafe(metadata_cache.get(url), loop).result()
+
+    try:
+        # PreviewCache renders with blocking ffmpeg runs and thread locks: keep it off the loop
+        path = await asyncio.to_thread(preview_cache.image, url, name, get_info)
+    except MetadataError as e:
+        return jsonify({'error': str(e)}), 500
+    except PreviewError as e:
+        return jsonify({'error': str(e)}), 404
+    return await send_file(path, mimetype='image/jpeg', conditional=True, cache_timeout=PREVIEW_CACHE_MAX_AGE)
+
+
+def not_served(feature):
+    return jsonify({'error': f"{feature} are only available on the threaded server (app.py)."}), 501
+
+
+@app.route('/batch', methods=['POST'])
+async def batch_download():
+    return not_served('Batches')
+
+
+@app.route('/playlist', methods=['POST'])
+async def playlist_download():
+    return not_served('Playlists')
+
+
+@app.route('/jobs/<job_id>/zip')
+async def job_zip(job_id):
+    return not_served('ZIP downloads of batches')
+
+
+@app.route('/metrics')
+async def metrics():
+    return not_served('Prometheus metrics')
+
+
+@app.route('/cache/stats')
+async def cache_stats():
+    return jsonify({
+        'engine': 'asyncio-subprocess',
+        'metadata': metadata_cache.stats(),
+        'jobs': download_queue.stats(),
+        'clips': clip_cache.stats(),
+        'sources': source_cache.stats(),
+        'previews': preview_cache.stats(),
+        'streams': active_streams,
+    })
+
+
+class _ReleaseOnClose:
+    """Wraps a Quart response body so `release` runs once sending ends (or fails)."""
+
+    def __init__(self, body, release):
+        self._body = body
+        self._release = release
+
+    async def __aenter__(self):
+        return await self._body.__aenter__()
+
+    async def __aexit__(self, *exc):
+        try:
+            return await self._body.__aexit__(*exc)
+        finally:
+            self._release()
+
+    def __getattr__(self, name):
+        return getattr(self._body, name)
+
+
+@app.route('/get-file/<filename>')
+async def get_file(filename):
+    """Same as app.py: Range and conditional requests, clip pinned while it is being sent."""
+    if not clip_cache.acquire(filename):
+        return "File not found", 404
+    try:
+        response = await send_file(os.path.join(DOWNLOAD_FOLDER, filename), as_attachment=True,
+                                   conditional=True, add_etags=True, cache_timeout=FILE_MAX_AGE)
+    except FileNotFoundError:
+        clip_cache.release(filename)
+        return "File not found", 404
+
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.response = _ReleaseOnClose(response.response, lambda: clip_cache.release(filename))
+    return response
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
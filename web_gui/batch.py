@@ -0,0 +1,102 @@
+import os
+import subprocess
+import zipfile
+
+from engine import PARTIAL_SUFFIXES, get_startupinfo
+
+ZIP_CHUNK_SIZE = 256 * 1024
+
+
+def format_clock(seconds):
+    """90.5 -> "00:01:30.500" (what both yt-dlp --download-sections and ffmpeg accept)."""
+    m, s = divmod(float(seconds), 60)
+    h, m = divmod(int(m), 60)
+    return f"{h:02d}:{m:02d}:{s:06.3f}"
+
+
+def merge_ranges(ranges):
+    """
+    Merges overlapping or touching (start, end) ranges.
+
+    Returns a list of (start, end, members) sorted by start, where
+    `members` are the indexes of the input ranges that the span covers.
+    Each span is downloaded once and the requested sections are cut from it.
+    """
+    order = sorted(range(len(ranges)), key=lambda i: ranges[i])
+    spans = []
+    for i in order:
+        start, end = ranges[i]
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+            spans[-1][2].append(i)
+        else:
+            spans.append([start, end, [i]])
+    return [(start, end, members) for start, end, members in spans]
+
+
+def cut_local(ffmpeg_cmd, src, dest, offset, duration):
+    """
+    Cuts [offset, offset + duration) out of a local file, re-encoding so the
+    clip starts exactly at `offset` (same accuracy as --force-keyframes-at-cuts).
+    """
+    cmd = [
+        ffmpeg_cmd, '-hide_banner', '-nostdin', '-loglevel', 'error', '-y',
+        '-ss', f"{offset:.3f}", '-i', src, '-t', f"{duration:.3f}",
+        '-map', '0', '-c:v', 'libx264', '-preset', 'veryfast', '-c:a', 'aac',
+        dest
+    ]
+    process = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8',
+                             errors='replace', startupinfo=get_startupinfo())
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip() or f'ffmpeg exited with {process.returncode}')
+
+
+class _ZipSink:
+    """Write-only, unseekable file object: zipfile then emits data descriptors we can stream."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def iter_zip(files):
+    """
+    Yields a ZIP archive of `files` ((arcname, path) pairs) chunk by chunk.
+
+    Entries are STORED (video doesn't compress further) and written through
+    an unseekable sink, so memory stays at about one chunk per entry.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as zf:
+        for arcname, path in files:
+            with open(path, 'rb') as src, zf.open(arcname, 'w', force_zip64=True) as dest:
+                while True:
+                    chunk = src.read(ZIP_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+
+def section_filename(index, start, end, ext):
+    """Name of a section inside the zip, sorted by request order."""
+    return f"{index + 1:02d}_{format_clock(start).replace(':', '-')}_{format_clock(end).replace(':', '-')}{ext}"
+
+
+def span_paths(folder, file_id):
+    """Files yt-dlp produced for a span downloaded with template <file_id>.%(ext)s."""
+    return [os.path.join(folder, f) for f in os.listdir(folder)
+            if f.startswith(f"{file_id}.") and not f.endswith(PARTIAL_SUFFIXES)]
@@ -0,0 +1,250 @@
+import json
+import socket
+import sqlite3
+import threading
+import time
+
+QUEUED = 'queued'
+RUNNING = 'running'
+
+# Cache rows of whole source videos (smart cut) are keyed 'source:<clip key>'. A
+# whole-video clip has the same clip key and filename, but only clips can be
+# served by /get-file, so locate() skips source rows.
+SOURCE_PREFIX = 'source:'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    runner TEXT,
+    params TEXT NOT NULL,
+    locality TEXT,
+    state TEXT NOT NULL,
+    node TEXT,
+    progress TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created_at);
+CREATE TABLE IF NOT EXISTS nodes (
+    name TEXT PRIMARY KEY,
+    url TEXT,
+    workers INTEGER NOT NULL,
+    seen_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT NOT NULL,
+    node TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    PRIMARY KEY (key, node)
+);
+CREATE INDEX IF NOT EXISTS cache_filename ON cache (filename);
+"""
+
+
+def default_node_name():
+    return socket.gethostname()
+
+
+class Broker:
+    """
+    Where front ends and executors of several nodes meet (see jobs.BrokerQueue).
+
+    Holds the jobs with their progress and results, the live nodes, and
+    which node has which clip/source cached, so executors can prefer jobs
+    whose files they already have and any front end can find a result.
+    Job rows are dicts with the columns of SQLiteBroker's `jobs` table.
+    """
+
+    def submit(self, job_id, params, runner, locality, max_queued):
+        """Adds a queued job. Returns False if `max_queued` jobs are already waiting."""
+        raise NotImplementedError
+
+    def claim(self, node, runners, locality_wait):
+        """Takes the next job for `node` (marks it running) and returns its row, or None."""
+        raise NotImplementedError
+
+    def progress(self, job_id, event):
+        raise NotImplementedError
+
+    def finish(self, job_id, result, error):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def position(self, job_id):
+        """1-based place among all queued jobs, 0 if not queued."""
+        raise NotImplementedError
+
+    def heartbeat(self, node, url, workers):
+        raise NotImplementedError
+
+    def reset_node(self, node):
+        """A node (re)starts: its running jobs go back to the queue, its cache rows are dropped."""
+        raise NotImplementedError
+
+    def cached(self, node, key, filename):
+        """Records that `node` has `key` cached as `filename` (None: no longer)."""
+        raise NotImplementedError
+
+    def locate(self, filename, exclude=None):
+        """URL of a live node that has `filename` as a clip (not a source), or None."""
+        raise NotImplementedError
+
+    def prune(self, before):
+        """Forgets jobs finished before `before`."""
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+
+class SQLiteBroker(Broker):
+    """
+    Broker in a SQLite file. Several processes on one host (or nodes sharing
+    a filesystem with working locks) open the same file; claims run in an
+    IMMEDIATE transaction so two executors never take the same job.
+
+    A node that stops sending heartbeats for `lease` seconds is considered
+    dead: its running jobs are queued again and its cached files are no
+    longer offered.
+    """
+
+    def __init__(self, path, lease=30):
+        self.path = path
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+
+    def submit(self, job_id, params, runner, locality, max_queued):
+        with self._lock, self._db:
+            self._db.execute('BEGIN IMMEDIATE')
+            queued = self._db.execute('SELECT COUNT(*) FROM jobs WHERE state = ?', (QUEUED,)).fetchone()[0]
+            if queued >= max_queued:
+                return False
+            self._db.execute(
+                'INSERT INTO jobs (id, runner, params, locality, state, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, runner, json.dumps(params), locality, QUEUED, time.time()))
+            return True
+
+    def claim(self, node, runners, locality_wait):
+        now = time.time()
+        runners = list(runners)
+        marks = ', '.join('?' * len(runners)) or "''"
+        with self._lock, self._db:
+            self._db.execute('BEGIN IMMEDIATE')
+            self._requeue_dead(now)
+            # The oldest job whose file this node already has, else the oldest one
+            # no other live node has cached (or that waited `locality_wait` for it)
+            row = self._db.execute(f"""
+                SELECT *, EXISTS (SELECT 1 FROM cache c WHERE c.key = j.locality AND c.node = ?) AS here
+                FROM jobs j
+                WHERE state = ? AND (runner IS NULL OR runner IN ({marks}))
+                  AND (created_at < ? OR NOT EXISTS (
+                      SELECT 1 FROM cache c JOIN nodes n ON n.name = c.node
+                      WHERE c.key = j.locality AND c.node != ? AND n.seen_at > ?)
+                      OR EXISTS (SELECT 1 FROM cache c WHERE c.key = j.locality AND c.node = ?))
+                ORDER BY here DESC, created_at
+                LIMIT 1
+            """, (node, QUEUED, *runners, now - locality_wait, node, now - self.lease, node)).fetchone()
+            if row is None:
+                return None
+            self._db.execute('UPDATE jobs SET state = ?, node = ?, started_at = ?, version = version + 1 '
+                             'WHERE id = ?', (RUNNING, node, now, row['id']))
+        job = self._decode(row)
+        del job['here']
+        job.update(state=RUNNING, node=node, started_at=now)
+        return job
+
+    def progress(self, job_id, event):
+        with self._lock:
+            self._db.execute('UPDATE jobs SET progress = ?, version = version + 1 WHERE id = ?',
+                             (json.dumps(event), job_id))
+
+    def finish(self, job_id, result, error):
+        state = 'failed' if error is not None else 'finished'
+        with self._lock:
+            self._db.execute(
+                'UPDATE jobs SET state = ?, result = ?, error = ?, finished_at = ?, version = version + 1 '
+                'WHERE id = ?',
+                (state, json.dumps(result) if result is not None else None, error, time.time(), job_id))
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._decode(row) if row is not None else None
+
+    def position(self, job_id):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT COUNT(*) FROM jobs WHERE state = ? AND created_at <= '
+                '(SELECT created_at FROM jobs WHERE id = ? AND state = ?)',
+                (QUEUED, job_id, QUEUED)).fetchone()
+        return row[0]
+
+    def heartbeat(self, node, url, workers):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO nodes (name, url, workers, seen_at) VALUES (?, ?, ?, ?)',
+                             (node, url, workers, time.time()))
+
+    def reset_node(self, node):
+        with self._lock, self._db:
+            self._db.execute('BEGIN IMMEDIATE')
+            self._db.execute('UPDATE jobs SET state = ?, node = NULL, version = version + 1 '
+                             'WHERE state = ? AND node = ?', (QUEUED, RUNNING, node))
+            self._db.execute('DELETE FROM cache WHERE node = ?', (node,))
+
+    def cached(self, node, key, filename):
+        with self._lock:
+            if filename is None:
+                self._db.execute('DELETE FROM cache WHERE key = ? AND node = ?', (key, node))
+            else:
+                self._db.execute('INSERT OR REPLACE INTO cache (key, node, filename) VALUES (?, ?, ?)',
+                                 (key, node, filename))
+
+    def locate(self, filename, exclude=None):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT n.url FROM cache c JOIN nodes n ON n.name = c.node '
+                'WHERE c.filename = ? AND c.key NOT LIKE ? AND c.node != ? AND n.seen_at > ? '
+                'AND n.url IS NOT NULL ORDER BY n.seen_at DESC LIMIT 1',
+                (filename, SOURCE_PREFIX + '%', exclude or '', time.time() - self.lease)).fetchone()
+        return row[0] if row is not None else None
+
+    def prune(self, before):
+        with self._lock:
+            self._db.execute('DELETE FROM jobs WHERE finished_at < ?', (before,))
+
+    def stats(self):
+        alive = time.time() - self.lease
+        with self._lock:
+            counts = dict(self._db.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+            nodes = [dict(row) for row in self._db.execute(
+                'SELECT n.name, n.url, n.workers, n.seen_at > ? AS alive, '
+                '(SELECT COUNT(*) FROM jobs WHERE node = n.name AND state = ?) AS running, '
+                '(SELECT COUNT(*) FROM cache WHERE node = n.name) AS cached '
+                'FROM nodes n ORDER BY n.name', (alive, RUNNING)).fetchall()]
+        return {'jobs': counts, 'nodes': nodes}
+
+    def _requeue_dead(self, now):
+        # Caller holds the lock inside a transaction
+        self._db.execute(
+            'UPDATE jobs SET state = ?, node = NULL, version = version + 1 WHERE state = ? AND node IN '
+            '(SELECT name FROM nodes WHERE seen_at < ?)', (QUEUED, RUNNING, now - self.lease))
+
+    @staticmethod
+    def _decode(row):
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        for column in ('progress', 'result'):
+            if job[column] is not None:
+                job[column] = json.loads(job[column])
+        return job
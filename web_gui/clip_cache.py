@@ -0,0 +1,257 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from metadata_cache import normalize_url
+
+# Cached clips are named <32 hex chars>.<ext>; anything else in the folder is scratch space
+CLIP_NAME_RE = re.compile(r'^[0-9a-f]{32}\.[A-Za-z0-9]+$')
+
+
+def clip_key(url, format_id, start_sec, end_sec):
+    """Content address of a clip: same URL, format and range -> same key."""
+    raw = f"{normalize_url(url)}\n{format_id or 'best'}\n{start_sec}\n{end_sec}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+class _Entry:
+    __slots__ = ('filename', 'size', 'last_access', 'active')
+
+    def __init__(self, filename, size, last_access):
+        self.filename = filename
+        self.size = size
+        self.last_access = last_access
+        self.active = 0  # responses currently sending this file
+
+
+class ClipCache:
+    """
+    Finished clips in `folder`, indexed by clip_key() and bounded by a disk budget.
+
+    Eviction is LRU: when the cached bytes exceed `max_bytes` the least
+    recently served clips go first, and clips untouched for `max_age`
+    seconds are dropped regardless. On startup the folder is swept: cached
+    clips from a previous run are re-indexed, leftovers of interrupted
+    downloads are removed. A single janitor thread repeats the eviction and
+    sweep every `interval` seconds.
+
+    A clip that is being sent (see acquire()/release()) is never evicted,
+    and its idle time only starts counting when the last delivery ends, so
+    resumed and parallel range requests find it still on disk.
+
+    `on_change(key, filename)` is told about every clip that enters the index
+    and, with filename None, every clip that leaves it (the broker uses this
+    to know which node has which file).
+    """
+
+    def __init__(self, folder, max_bytes=5 * 1024 ** 3, max_age=3600, orphan_age=3600, interval=60,
+                 on_change=None):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.orphan_age = orphan_age
+        self.interval = interval
+        self.on_change = on_change
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> _Entry, least recently used first
+        self._bytes = 0
+        self._building = {}            # key -> [lock, users]
+        self._writing = {}             # file id -> downloads writing <file id>.* right now
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.added_bytes = 0
+
+        self.sweep(startup=True)
+        threading.Thread(target=self._janitor, name='clip-cache-janitor', daemon=True).start()
+
+    def get(self, key):
+        """Returns the cached file name for `key` (and marks it used), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and os.path.exists(os.path.join(self.folder, entry.filename)):
+                entry.last_access = time.time()
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.filename
+            if entry is not None:
+                # Removed behind our back
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def acquire(self, filename):
+        """Pins a cached clip while a response is sending it. Returns False for unknown files."""
+        with self._lock:
+            entry = self._entries.get(filename.split('.')[0])
+            if entry is None or entry.filename != filename:
+                return False
+            entry.active += 1
+            entry.last_access = time.time()
+            self._entries.move_to_end(entry.filename.split('.')[0])
+            return True
+
+    def release(self, filename):
+        """End of a delivery started with acquire(); the eviction clock restarts now."""
+        with self._lock:
+            entry = self._entries.get(filename.split('.')[0])
+            if entry is not None and entry.active > 0:
+                entry.active -= 1
+                entry.last_access = time.time()
+                self._entries.move_to_end(entry.filename.split('.')[0])
+
+    def add(self, key, path):
+        """Moves a finished download into the cache under its key. Returns the new file name."""
+        ext = os.path.splitext(path)[1]
+        filename = f"{key}{ext}"
+        target = os.path.join(self.folder, filename)
+        os.replace(path, target)
+        size = os.path.getsize(target)
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key, delete=False)
+            self._entries[key] = _Entry(filename, size, time.time())
+            self._bytes += size
+            self.added_bytes += size
+        self._changed(key, filename)
+        self.evict()
+        return filename
+
+    @contextmanager
+    def building(self, key):
+        """Serialises work on one key, so identical concurrent requests download once."""
+        with self._lock:
+            slot = self._building.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._building[key]
+
+    @contextmanager
+    def writing(self, file_id):
+        """
+        Marks <file_id>.* as the files of a download in progress: the sweep
+        leaves them alone however long the download takes.
+        """
+        with self._lock:
+            self._writing[file_id] = self._writing.get(file_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._writing[file_id] -= 1
+                if self._writing[file_id] == 0:
+                    del self._writing[file_id]
+
+    def evict(self):
+        now = time.time()
+        with self._lock:
+            for key in list(self._entries):
+                entry = self._entries[key]
+                if self._bytes <= self.max_bytes and now - entry.last_access < self.max_age:
+                    # LRU order: everything after this one is newer
+                    break
+                if entry.active:
+                    # Being sent right now, skip it and evict something newer instead
+                    continue
+                self._drop(key)
+                self.evictions += 1
+
+    def sweep(self, startup=False):
+        """Removes orphaned files; on startup also re-indexes clips left by a previous run."""
+        now = time.time()
+        try:
+            names = os.listdir(self.folder)
+        except FileNotFoundError:
+            return
+
+        with self._lock:
+            known = {e.filename for e in self._entries.values()}
+            # Files of running downloads are named after their file id (or, for
+            # sources, after the key being built)
+            in_progress = set(self._building) | set(self._writing)
+
+        found = []
+        for name in names:
+            path = os.path.join(self.folder, name)
+            if name in known or not os.path.isfile(path):
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            if startup and CLIP_NAME_RE.match(name):
+                found.append((stat.st_mtime, name, stat.st_size))
+                continue
+            # Leftovers of crashed or abandoned downloads
+            if now - stat.st_mtime > self.orphan_age and name.split('.')[0] not in in_progress:
+                self._remove_file(name)
+
+        if found:
+            with self._lock:
+                for mtime, name, size in sorted(found):
+                    key = name.split('.')[0]
+                    self._entries[key] = _Entry(name, size, mtime)
+                    self._bytes += size
+                    self._changed(key, name)
+            print(f"Clip cache: re-indexed {len(found)} clips ({self._bytes / 1024 / 1024:.1f} MB)")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'delivering': sum(1 for e in self._entries.values() if e.active),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'added_bytes': self.added_bytes,
+            }
+
+    def _drop(self, key, delete=True):
+        # Caller holds the lock
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        if delete:
+            self._remove_file(entry.filename)
+            self._changed(key, None)
+
+    def _changed(self, key, filename):
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(key, filename)
+        except Exception as e:
+            print(f"Clip cache listener error: {e}")
+
+    def _remove_file(self, filename):
+        try:
+            os.remove(os.path.join(self.folder, filename))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # e.g. still open for sending on Windows; the next janitor pass retries
+            print(f"Error removing file {filename}: {e}")
+
+    def _janitor(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.evict()
+                self.sweep()
+            except Exception as e:
+                print(f"Clip cache janitor error: {e}")
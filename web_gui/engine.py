@@ -0,0 +1,399 @@
+import json
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+from collections import deque
+
+import format_index
+import progress
+from metadata_cache import MetadataError
+from progress import ProgressParser
+
+try:
+    import yt_dlp
+    from yt_dlp.utils import DownloadError, download_range_func
+except ImportError:
+    yt_dlp = None
+
+# Extractors instantiated up front on every pooled YoutubeDL, so the first real
+# request for these sites doesn't pay the import/initialisation cost
+WARM_EXTRACTORS = ['Youtube', 'Facebook', 'Instagram', 'Twitter', 'TikTok', 'Generic']
+# Files yt-dlp keeps next to an unfinished download; left in place, the next
+# download to the same output template resumes from them
+PARTIAL_SUFFIXES = ('.part', '.ytdl', '.temp')
+
+
+class EngineError(Exception):
+    """yt-dlp failed to download. The message is what yt-dlp reported."""
+    pass
+
+
+def get_startupinfo():
+    """Windows-specific startup info to hide the console window of child processes."""
+    if os.name != 'nt':
+        return None
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return startupinfo
+
+
+def playlist_entry(raw):
+    """The fields the playlist pipeline needs from a flat (or full) entry."""
+    return {
+        'id': raw.get('id'),
+        'url': raw.get('webpage_url') or raw.get('url'),
+        'title': raw.get('title') or raw.get('id') or 'Untitled',
+        'duration': raw.get('duration'),
+    }
+
+
+def section_seconds(start_time, end_time):
+    """(start, end) in seconds for a "mm:ss" range, or None if no usable range was given."""
+    start_sec = progress.parse_clock(start_time)
+    end_sec = progress.parse_clock(end_time)
+    if start_sec is None or end_sec is None or end_sec <= start_sec:
+        return None
+    return start_sec, end_sec
+
+
+class SubprocessEngine:
+    """Runs a fresh `yt-dlp` process per call. Always available, used as the fallback."""
+
+    name = 'subprocess'
+
+    def __init__(self, cmd='yt-dlp'):
+        self.cmd = cmd
+
+    def extract_info(self, url):
+        process = subprocess.Popen(
+            [self.cmd, '-J', url],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            startupinfo=get_startupinfo()
+        )
+        stdout, stderr = process.communicate()
+
+        if process.returncode != 0:
+            raise MetadataError(stderr or 'Unknown error fetching formats')
+
+        # Only the compact record outlives this call, not the (possibly multi-MB) document
+        return format_index.parse(stdout)
+
+    def iter_playlist(self, url):
+        """
+        Lists a playlist or channel lazily: one entry per line of
+        `yt-dlp --flat-playlist --lazy-playlist -j`, yielded as yt-dlp prints
+        it. A single video yields itself. Closing the generator early kills
+        yt-dlp; if nobody reads, yt-dlp blocks on the full pipe.
+        """
+        process = subprocess.Popen(
+            [self.cmd, '--flat-playlist', '--lazy-playlist', '-j', url],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            startupinfo=get_startupinfo()
+        )
+        # Drained on the side so a chatty stderr can't fill its pipe and stall stdout
+        errors = deque(maxlen=20)
+        drain = threading.Thread(target=lambda: errors.extend(line.rstrip() for line in process.stderr),
+                                 daemon=True)
+        drain.start()
+        try:
+            for line in process.stdout:
+                line = line.strip()
+                if line:
+                    yield playlist_entry(json.loads(line))
+            process.wait()
+            drain.join()
+            if process.returncode != 0:
+                raise MetadataError('\n'.join(errors) or 'Unknown error listing the playlist')
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+    def build_download_cmd(self, url, format_id, output_template, start_time=None, end_time=None,
+                           restrict_filenames=False, info_path=None):
+        cmd = [
+            self.cmd,
+            '-f', format_id,
+            # Reuse already extracted metadata instead of extracting the URL again
+            *(['--load-info-json', info_path] if info_path else [url]),
+            '-o', output_template,
+            '--force-keyframes-at-cuts',
+            # One progress line per update instead of \r-overwritten lines
+            '--newline'
+        ]
+        if restrict_filenames:
+            cmd.append('--restrict-filenames')
+        if start_time and end_time:
+            cmd.extend(['--download-sections', f'*{start_time}-{end_time}'])
+        return cmd
+
+    def download(self, url, format_id, output_template, start_time=None, end_time=None,
+                 restrict_filenames=False, on_event=None, on_line=None, info=None):
+        """
+        Downloads (and cuts) one clip. Raises EngineError with yt-dlp's message on failure.
+        `info` is metadata from extract_info(); when given, yt-dlp skips extraction.
+        """
+        info_path = None
+        if info is not None:
+            with tempfile.NamedTemporaryFile('w', suffix='.info.json', delete=False, encoding='utf-8') as f:
+                json.dump(format_index.to_info(info), f)
+                info_path = f.name
+        try:
+            self._download(url, format_id, output_template, start_time, end_time,
+                           restrict_filenames, on_event, on_line, info_path)
+        finally:
+            if info_path:
+                os.remove(info_path)
+
+    def _download(self, url, format_id, output_template, start_time, end_time,
+                  restrict_filenames, on_event, on_line, info_path):
+        cmd = self.build_download_cmd(url, format_id, output_template, start_time, end_time,
+                                      restrict_filenames, info_path)
+        section = section_seconds(start_time, end_time)
+
+        # ffmpeg (used for sections) reports on stderr, so merge it into stdout and parse everything
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            startupinfo=get_startupinfo()
+        )
+
+        parser = ProgressParser(section_duration=section[1] - section[0] if section else None)
+        tail = deque(maxlen=20)  # last lines, reported if yt-dlp fails
+        errors = []
+        for line in process.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            tail.append(line)
+            event = parser.feed(line)
+            if event is not None and event['phase'] == progress.ERROR:
+                errors.append(event['message'])
+            if on_line is not None:
+                on_line(line, event)
+            if event is not None and on_event is not None:
+                on_event(event)
+        process.wait()
+
+        if process.returncode != 0:
+            raise EngineError('\n'.join(errors or tail) or 'Unknown error while downloading')
+
+
+class _Logger:
+    """yt-dlp logger that forwards messages as output lines."""
+
+    def __init__(self, on_line=None):
+        self.on_line = on_line
+        self.errors = []
+
+    def debug(self, msg):
+        # yt-dlp sends info-level messages through debug() too
+        if self.on_line is not None and not msg.startswith('[debug] '):
+            self.on_line(msg, None)
+
+    def info(self, msg):
+        if self.on_line is not None:
+            self.on_line(msg, None)
+
+    def warning(self, msg):
+        if self.on_line is not None:
+            self.on_line(f"WARNING: {msg}", None)
+
+    def error(self, msg):
+        self.errors.append(msg)
+        if self.on_line is not None:
+            self.on_line(msg, None)
+
+
+class InProcessEngine:
+    """
+    Drives yt-dlp through its Python API inside this process.
+
+    Metadata extraction borrows a YoutubeDL from a pool of pre-warmed
+    instances (extractors already imported and initialised). A YoutubeDL is
+    not thread-safe, so each one is used by a single caller at a time.
+    Downloads need per-call options and get their own YoutubeDL, which is
+    still cheap since the interpreter and extractor modules are warm.
+    Unexpected internal errors fall back to the subprocess engine.
+    """
+
+    name = 'inprocess'
+
+    BASE_PARAMS = {
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+    }
+
+    def __init__(self, pool_size=4, fallback=None):
+        if yt_dlp is None:
+            raise RuntimeError("yt_dlp is not installed")
+        self.fallback = fallback
+        self._pool = queue.Queue()
+        self.pool_size = pool_size
+        for _ in range(pool_size):
+            self._pool.put(self._new_instance())
+
+    def _new_instance(self):
+        ydl = yt_dlp.YoutubeDL(dict(self.BASE_PARAMS))
+        for key in WARM_EXTRACTORS:
+            try:
+                ydl.get_info_extractor(key)
+            except Exception:
+                pass
+        return ydl
+
+    def extract_info(self, url):
+        ydl = self._pool.get()
+        try:
+            info = ydl.extract_info(url, download=False)
+            # Same shape as `yt-dlp -J` (JSON-serialisable, no internal keys), kept compact
+            return format_index.from_info(ydl.sanitize_info(info))
+        except DownloadError as e:
+            raise MetadataError(str(e))
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            print(f"In-process extraction failed ({e}), falling back to {self.fallback.name}")
+            return self.fallback.extract_info(url)
+        finally:
+            self._pool.put(ydl)
+
+    def iter_playlist(self, url):
+        """Same as SubprocessEngine.iter_playlist(), with a flat, lazy YoutubeDL."""
+        params = dict(self.BASE_PARAMS, extract_flat='in_playlist', lazy_playlist=True)
+        try:
+            with yt_dlp.YoutubeDL(params) as ydl:
+                # process=False keeps the entries an unevaluated generator
+                info = ydl.extract_info(url, download=False, process=False)
+                for _ in range(3):
+                    # Channel/short URLs point at the real playlist first
+                    if info.get('_type') not in ('url', 'url_transparent'):
+                        break
+                    info = ydl.extract_info(info['url'], download=False, process=False)
+                if info.get('_type') not in ('playlist', 'multi_video'):
+                    yield playlist_entry(info)
+                    return
+                for raw in info.get('entries') or []:
+                    yield playlist_entry(raw)
+        except DownloadError as e:
+            raise MetadataError(str(e))
+
+    def download(self, url, format_id, output_template, start_time=None, end_time=None,
+                 restrict_filenames=False, on_event=None, on_line=None, info=None):
+        logger = _Logger(on_line)
+
+        def emit(line, event):
+            # Same (line, event) pairs as the subprocess engine; yt-dlp's own progress lines are off
+            if on_line is not None:
+                on_line(line, event)
+            if on_event is not None:
+                on_event(event)
+
+        def progress_hook(d):
+            if on_event is None and on_line is None:
+                return
+            if d.get('status') == 'downloading':
+                done = d.get('downloaded_bytes')
+                total = d.get('total_bytes') or d.get('total_bytes_estimate')
+                event = progress.make_event(
+                    progress.DOWNLOAD,
+                    percent=done * 100 / total if done and total else None,
+                    downloaded_bytes=done, total_bytes=total,
+                    speed=int(d['speed']) if d.get('speed') else None,
+                    eta=d.get('eta'))
+                if event['percent'] is not None:
+                    emit(f"[download] {event['percent']:5.1f}% of {total} bytes", event)
+                else:
+                    emit(f"[download] {done} bytes", event)
+            elif d.get('status') == 'error':
+                emit('ERROR: Download failed', progress.make_event(progress.ERROR, message='Download failed'))
+
+        def postprocessor_hook(d):
+            if d.get('status') == 'started':
+                emit(f"[{d.get('postprocessor')}] Started",
+                     progress.make_event(progress.POSTPROCESS, message=d.get('postprocessor')))
+
+        params = dict(self.BASE_PARAMS)
+        params.update({
+            'format': format_id,
+            'outtmpl': output_template,
+            'restrictfilenames': restrict_filenames,
+            'logger': logger,
+            'progress_hooks': [progress_hook],
+            'postprocessor_hooks': [postprocessor_hook],
+        })
+        section = section_seconds(start_time, end_time)
+        if section:
+            params['download_ranges'] = download_range_func(None, [section])
+            params['force_keyframes_at_cuts'] = True
+
+        try:
+            with yt_dlp.YoutubeDL(params) as ydl:
+                if info is not None:
+                    # Same as --load-info-json: format selection + download, no extraction
+                    ydl.process_ie_result(format_index.to_info(info), download=True)
+                elif ydl.download([url]) != 0:
+                    raise EngineError('\n'.join(logger.errors) or 'Unknown error while downloading')
+        except DownloadError as e:
+            raise EngineError('\n'.join(logger.errors) or str(e))
+        except EngineError:
+            raise
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            print(f"In-process download failed ({e}), falling back to {self.fallback.name}")
+            self.fallback.download(url, format_id, output_template, start_time, end_time,
+                                   restrict_filenames, on_event, on_line, info)
+
+
+def create_engine(kind='auto', cmd='yt-dlp', pool_size=4):
+    """
+    Returns the engine to use. `kind` is 'inprocess', 'subprocess' or 'auto'
+    (in-process when the yt_dlp package is importable, else subprocess).
+    """
+    fallback = SubprocessEngine(cmd)
+    if kind == 'subprocess':
+        return fallback
+    if yt_dlp is None:
+        if kind == 'inprocess':
+            print("yt_dlp package not installed, using the yt-dlp executable instead")
+        return fallback
+    return InProcessEngine(pool_size=pool_size, fallback=fallback)
+
+
+class LazyEngine:
+    """Creates the real engine on first use, so warming the pool doesn't delay startup."""
+
+    def __init__(self, *args, **kwargs):
+        self._args = args
+        self._kwargs = kwargs
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = create_engine(*self._args, **self._kwargs)
+        return self._engine
+
+    def warm_up(self):
+        """Builds the engine on a background thread."""
+        threading.Thread(target=self.get, name='engine-warmup', daemon=True).start()
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
@@ -0,0 +1,204 @@
+"""
+Compact per-video records built from `yt-dlp -J` output.
+
+A -J document for a long video runs to megabytes, mostly caption tracks,
+thumbnails and per-format fragment lists, while the app reads a handful of
+fields per format. parse() keeps the top-level fields a download needs,
+turns every format into a slotted FormatRow and lets the rest go. Records
+answer get() and [] like the dicts they replace, so formats.py,
+streaming.py, preview.py etc. take either; to_info() rebuilds the plain
+dict yt-dlp gets back (--load-info-json, process_ie_result).
+
+Null values are not kept: get() returns the default for a field that was
+null, the same as for a missing one.
+"""
+import copy
+import json
+from array import array
+from collections.abc import Sequence
+
+# Top-level keys nothing downstream reads and yt-dlp doesn't need to download
+# a section: subtitle/caption tracks (often most of the document), thumbnails,
+# the "most replayed" heatmap and the description
+DROPPED_KEYS = frozenset({'automatic_captions', 'subtitles', 'requested_subtitles', 'thumbnails', 'heatmap',
+                          'description'})
+
+# Format fields held in slots (what format ranking, streaming and previews read);
+# the format's other fields stay in FormatRow.extra for yt-dlp
+FORMAT_FIELDS = ('format_id', 'format_note', 'ext', 'protocol', 'url', 'vcodec', 'acodec', 'width', 'height',
+                 'fps', 'tbr', 'vbr', 'abr', 'filesize', 'filesize_approx', 'resolution', 'http_headers',
+                 'fragments', 'rows', 'columns')
+
+_SLOTTED = frozenset(FORMAT_FIELDS)
+_RECORD_SLOTTED = frozenset({'title', 'duration', 'formats', 'requested_formats'})
+_MISSING = object()
+
+
+class FragmentList(Sequence):
+    """
+    A format's fragment list as one location per fragment plus a packed
+    array of durations. Indexing builds the fragment's dict on the fly.
+    """
+
+    __slots__ = ('key', 'locations', 'durations')
+
+    def __init__(self, key, locations, durations):
+        self.key = key              # 'url' or 'path' (relative to fragment_base_url)
+        self.locations = locations
+        self.durations = durations  # array('d'), or None when fragments have no duration
+
+    @classmethod
+    def pack(cls, fragments):
+        """FragmentList for a list of {'url'|'path', 'duration'} dicts; anything richer is returned as is."""
+        if not fragments or not isinstance(fragments, list):
+            return fragments
+        first = fragments[0]
+        key = 'url' if 'url' in first else 'path'
+        timed = 'duration' in first
+        size = 2 if timed else 1
+        # Same size and the keys present -> exactly {key, 'duration'}
+        try:
+            if any(len(fragment) != size for fragment in fragments):
+                return fragments
+            locations = tuple([fragment[key] for fragment in fragments])
+            durations = array('d', [fragment['duration'] for fragment in fragments]) if timed else None
+        except (KeyError, TypeError):
+            return fragments
+        return cls(key, locations, durations)
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        fragment = {self.key: self.locations[index]}
+        if self.durations is not None:
+            fragment['duration'] = self.durations[index]
+        return fragment
+
+    def to_list(self):
+        return [self[i] for i in range(len(self))]
+
+
+class FormatRow:
+    """One entry of the format table. Reads like the format's dict: row.get('height'), row['url']."""
+
+    __slots__ = FORMAT_FIELDS + ('extra',)
+
+    def __init__(self, fmt, shared):
+        # `fmt` is consumed: what is left of it becomes `extra`
+        for name in FORMAT_FIELDS:
+            setattr(self, name, fmt.pop(name, None))
+        if self.http_headers:
+            self.http_headers = _share(self.http_headers, shared)
+        if self.fragments:
+            self.fragments = FragmentList.pack(self.fragments)
+        self.extra = fmt or None
+
+    def get(self, key, default=None):
+        if key in _SLOTTED:
+            value = getattr(self, key)
+            return default if value is None else value
+        if self.extra is None:
+            return default
+        return self.extra.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def to_dict(self):
+        fmt = {name: getattr(self, name) for name in FORMAT_FIELDS if getattr(self, name) is not None}
+        if 'http_headers' in fmt:
+            fmt['http_headers'] = dict(fmt['http_headers'])
+        if isinstance(self.fragments, FragmentList):
+            fmt['fragments'] = self.fragments.to_list()
+        if self.extra:
+            fmt.update(copy.deepcopy(self.extra))
+        return fmt
+
+
+class VideoRecord:
+    """
+    What the app keeps of one video's metadata: title, duration, the format
+    table (FormatRow), yt-dlp's own pick (requested_formats, rows of the
+    same table) and the remaining top-level fields.
+    """
+
+    __slots__ = ('title', 'duration', 'formats', 'requested_formats', 'fields')
+
+    def __init__(self, title, duration, formats, requested_formats, fields):
+        self.title = title
+        self.duration = duration
+        self.formats = formats
+        self.requested_formats = requested_formats
+        self.fields = fields
+
+    def get(self, key, default=None):
+        if key in _RECORD_SLOTTED:
+            value = getattr(self, key)
+            return default if value is None else value
+        return self.fields.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def to_info(self):
+        """A fresh plain dict in `yt-dlp -J` shape (minus DROPPED_KEYS)."""
+        info = copy.deepcopy(self.fields)
+        if self.title is not None:
+            info['title'] = self.title
+        if self.duration is not None:
+            info['duration'] = self.duration
+        info['formats'] = [row.to_dict() for row in self.formats]
+        if self.requested_formats is not None:
+            info['requested_formats'] = [row.to_dict() for row in self.requested_formats]
+        return info
+
+
+def parse(text):
+    """VideoRecord from `yt-dlp -J` JSON text."""
+    return from_info(json.loads(text))
+
+
+def from_info(info):
+    """VideoRecord from a parsed -J dict, which is consumed (its parts move into the record)."""
+    for key in DROPPED_KEYS:
+        info.pop(key, None)
+    shared = {}
+    formats = [FormatRow(fmt, shared) for fmt in info.pop('formats', None) or []]
+
+    requested = info.pop('requested_formats', None)
+    if requested is not None:
+        # Copies of entries of `formats` in the document: point at the same rows
+        by_id = {row.format_id: row for row in formats}
+        requested = [by_id.get(fmt.get('format_id')) or FormatRow(fmt, shared) for fmt in requested]
+
+    if info.get('http_headers'):
+        info['http_headers'] = _share(info['http_headers'], shared)
+    return VideoRecord(info.pop('title', None), info.pop('duration', None), formats, requested, info)
+
+
+def to_info(info):
+    """A fresh plain dict for yt-dlp from a VideoRecord (or a -J dict, deep-copied)."""
+    if isinstance(info, VideoRecord):
+        return info.to_info()
+    return copy.deepcopy(info)
+
+
+def _share(headers, shared):
+    # Every format of a video usually carries the same headers: keep one dict
+    key = tuple(headers.items())
+    return shared.setdefault(key, headers)
@@ -0,0 +1,194 @@
+import os
+
+# Policies understood by rank_formats()/choose_format():
+#   quality  - highest resolution/bitrate first (what "best" means to yt-dlp)
+#   smallest - fewest bytes for the section, among formats at least `height` tall
+#   fastest  - shortest estimated download + cut time, among formats at least `height` tall
+POLICIES = ('quality', 'smallest', 'fastest')
+
+# Throughput assumed for time estimates (Mbit/s) and how many pixels per
+# second the cut re-encode (libx264 veryfast) gets through on one job
+ESTIMATE_BANDWIDTH = int(os.environ.get('ESTIMATE_BANDWIDTH_MBPS', 20)) * 1000 * 1000 // 8
+ENCODE_PIXEL_RATE = int(os.environ.get('ENCODE_PIXEL_RATE', 60 * 1000 * 1000))
+
+# Relative decode cost of the source codec while re-encoding the cut
+DECODE_COST = {'h264': 1.0, 'hevc': 1.3, 'vp9': 1.5, 'av1': 2.0}
+# Codecs the smart cut can stream-copy, and in which file types (see
+# smartcut.SMART_CODECS); other formats get a full re-encode
+COPYABLE_CODECS = {'h264': ('mp4', 'm4v', 'mov'), 'hevc': ('mp4', 'm4v', 'mov'), 'vp9': ('webm', 'mkv')}
+
+# Extra seconds fetched around the section: segmented protocols start at a
+# segment boundary, progressive files can seek closer
+SEEK_PADDING = {'m3u8': 6, 'm3u8_native': 6, 'http_dash_segments': 4}
+DEFAULT_SEEK_PADDING = 2
+
+
+def codec_family(vcodec):
+    """'avc1.64001F' -> 'h264', 'vp09.00.40.08' -> 'vp9', ... None if unknown."""
+    vcodec = (vcodec or '').lower()
+    if vcodec.startswith(('avc', 'h264')):
+        return 'h264'
+    if vcodec.startswith(('hev', 'hvc', 'h265')):
+        return 'hevc'
+    if vcodec.startswith(('vp9', 'vp09')):
+        return 'vp9'
+    if vcodec.startswith(('av01', 'av1')):
+        return 'av1'
+    return None
+
+
+def is_combined(fmt):
+    """Has both video and audio. Missing codec info counts as present (generic 'sd'/'hd' formats)."""
+    return fmt.get('vcodec', 'unknown') != 'none' and fmt.get('acodec', 'unknown') != 'none'
+
+
+def is_video(fmt):
+    return fmt.get('vcodec') != 'none' and fmt.get('resolution') != 'audio only'
+
+
+def resolution(fmt):
+    res = fmt.get('resolution')
+    if not res or res == 'unknown':
+        if fmt.get('width') and fmt.get('height'):
+            return f"{fmt['width']}x{fmt['height']}"
+        return f"{fmt.get('format_id')}"
+    return res
+
+
+def estimate_bytes(fmt, section, duration):
+    """
+    Bytes fetched for `section` seconds of a `duration`-second video.
+    Returns (bytes, exact) where exact means it came from a known filesize;
+    bytes is None when the format gives nothing to go on.
+    """
+    padded = section + SEEK_PADDING.get(fmt.get('protocol'), DEFAULT_SEEK_PADDING)
+    if duration:
+        padded = min(padded, duration)
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size and duration:
+        return int(size * padded / duration), bool(fmt.get('filesize'))
+    # tbr/vbr/abr are in kbit/s
+    tbr = fmt.get('tbr') or (fmt.get('vbr') or 0) + (fmt.get('abr') or 0)
+    if tbr:
+        return int(tbr * 1000 / 8 * padded), False
+    return None, False
+
+
+def estimate_cut_seconds(fmt, section, smart=False):
+    """Re-encode time of the cut. A smart cut only re-encodes about two GOPs of copyable codecs."""
+    family = codec_family(fmt.get('vcodec'))
+    if smart and fmt.get('ext') in COPYABLE_CODECS.get(family, ()):
+        section = min(section, 2 * DEFAULT_SEEK_PADDING)
+    pixels = (fmt.get('width') or 1280) * (fmt.get('height') or 720) * (fmt.get('fps') or 30)
+    return section * pixels * DECODE_COST.get(family, 1.5) / ENCODE_PIXEL_RATE
+
+
+def describe(fmt, estimate=None):
+    """Text shown in the format pickers of both front ends."""
+    if estimate is None:
+        size = "N/A"
+    else:
+        size = f"{'' if estimate['exact'] else '~'}{estimate['bytes'] / 1024 / 1024:.2f} MB"
+    return f"{resolution(fmt)} ({fmt.get('ext', '')}) - {fmt.get('format_note', '')} [{size}]"
+
+
+def rank_formats(info, start_sec=None, end_sec=None, policy='quality', height=None,
+                 combined_only=True, smart=False, bandwidth=ESTIMATE_BANDWIDTH):
+    """
+    Lists the formats of `info` (yt-dlp metadata) with size/time estimates for
+    the [start_sec, end_sec) section (the whole video when not given), ordered
+    by `policy`.
+
+    Each entry is {'id', 'display', 'res', 'height', 'vcodec', 'bytes', 'exact',
+    'seconds'}; 'bytes'/'seconds' are None when nothing is known about the format.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown format policy: {policy}")
+
+    duration = info.get('duration') or 0
+    if start_sec is not None and end_sec is not None and end_sec > start_sec:
+        section = end_sec - start_sec
+    else:
+        section = duration or 3600
+
+    ranked = []
+    for fmt in info.get('formats') or []:
+        if not (is_combined(fmt) if combined_only else is_video(fmt)):
+            continue
+        size, exact = estimate_bytes(fmt, section, duration)
+        estimate = {'bytes': size, 'exact': exact} if size else None
+        seconds = None
+        if size:
+            seconds = size / bandwidth + estimate_cut_seconds(fmt, section, smart)
+        ranked.append({
+            'id': fmt.get('format_id'),
+            'display': describe(fmt, estimate),
+            'res': resolution(fmt),
+            'height': fmt.get('height') or 0,
+            'vcodec': codec_family(fmt.get('vcodec')),
+            'bytes': size,
+            'exact': exact,
+            'seconds': round(seconds, 1) if seconds is not None else None,
+        })
+
+    if policy == 'quality':
+        # yt-dlp lists formats worst to best, so among equal heights the later one wins
+        ranked.reverse()
+        ranked.sort(key=lambda f: f['height'], reverse=True)
+        return ranked
+
+    key = 'bytes' if policy == 'smallest' else 'seconds'
+    eligible = [f for f in ranked if not height or f['height'] >= height]
+    if not eligible and ranked:
+        # Nothing reaches the requested height: settle for the tallest available
+        tallest = max(f['height'] for f in ranked)
+        eligible = [f for f in ranked if f['height'] == tallest]
+    # Unknown estimates go last, taller first among equals
+    eligible.sort(key=lambda f: (f[key] is None, f[key] or 0, -f['height']))
+    others = [f for f in ranked if f not in eligible]
+    return eligible + others
+
+
+def choose_format(info, start_sec=None, end_sec=None, policy='quality', height=None,
+                  combined_only=True, smart=False):
+    """format_id picked by `policy`, or 'best' when the policy is 'quality' or nothing qualifies."""
+    if policy == 'quality':
+        return 'best'
+    ranked = rank_formats(info, start_sec, end_sec, policy, height, combined_only, smart)
+    return ranked[0]['id'] if ranked else 'best'
+
+
+def formats_response(info, ranked, policy='quality'):
+    """The /formats JSON body (shared by the Flask and the asyncio server) for rank_formats() output."""
+    filtered_formats = [{'id': f['id'], 'display': f['display'], 'res': f['res'],
+                         'filesize': f['bytes'] or 0, 'estimated_seconds': f['seconds']}
+                        for f in ranked]
+    recommended = ranked[0]['id'] if ranked and policy != 'quality' else 'best'
+
+    # Add a "Best" option at the top
+    filtered_formats.insert(0, {'id': 'best', 'display': 'Best Quality (Default)'})
+
+    # Extract duration
+    duration_sec = info.get('duration', 0)
+    duration_str = info.get('duration_string')
+
+    # If no duration is provided, treat it as less than an hour (3600 seconds)
+    if not duration_sec:
+        duration_sec = 3600
+
+    # Fallback formatting if duration_string is missing
+    if not duration_str:
+        m, s = divmod(int(duration_sec), 60)
+        h, m = divmod(m, 60)
+        if h > 0:
+            duration_str = f"{h}:{m:02d}:{s:02d}"
+        else:
+            duration_str = f"{m:02d}:{s:02d}"
+
+    return {
+        'title': info.get('title', 'Unknown'),
+        'formats': filtered_formats,
+        'recommended': recommended,
+        'duration': duration_sec,
+        'duration_string': duration_str
+    }
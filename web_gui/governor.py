@@ -0,0 +1,218 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# Rough resident size of one yt-dlp + ffmpeg pair while cutting, used to size
+# the work limit from RAM when GOVERNOR_WORK_LIMIT isn't set
+WORK_PROCESS_MEMORY = 400 * 1024 * 1024
+# Host buckets kept before full (idle) ones are dropped
+MAX_HOSTS = 1024
+# Seconds between two "rejecting" log lines for the same reason
+LOG_INTERVAL = 10
+
+
+class Overloaded(Exception):
+    """Admission refused. `retry_after` (seconds) goes into the 429's Retry-After header."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+def total_memory():
+    """Physical memory in bytes, or None where the platform doesn't say."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_limits():
+    """
+    (metadata, work) limits for this machine. Metadata extraction is mostly
+    waiting on the site, so it gets more slots than download/cut work, which
+    is bounded by both CPU (ffmpeg re-encodes) and memory.
+    """
+    cpus = os.cpu_count() or 1
+    work = cpus
+    memory = total_memory()
+    if memory:
+        work = min(work, memory // WORK_PROCESS_MEMORY)
+    return max(2, cpus * 2), max(1, work)
+
+
+def source_host(url):
+    """'https://www.youtube.com/watch?v=x' -> 'youtube.com' (bucket key)."""
+    host = (urlsplit(url).hostname or '').lower()
+    for prefix in ('www.', 'm.', 'mobile.'):
+        if host.startswith(prefix):
+            return host[len(prefix):]
+    return host
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Takes a token. Returns 0 on success, else seconds until one is available. Caller holds a lock."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class _Limit:
+    """Counting semaphore that knows how many holders and waiters it has (for stats)."""
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=None):
+        with self._cond:
+            self.waiting += 1
+            try:
+                if not self._cond.wait_for(lambda: self.active < self.size, timeout):
+                    self.rejected += 1
+                    return False
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {'limit': self.size, 'active': self.active, 'waiting': self.waiting,
+                    'rejected': self.rejected}
+
+
+class Governor:
+    """
+    Admission control for the child processes the app starts.
+
+    - metadata: concurrent `yt-dlp -J` extractions
+    - work: concurrent downloads, cuts and streams (yt-dlp/ffmpeg)
+    - per source host: token bucket of `host_rate` requests per minute
+      with bursts of `host_burst`, so one site isn't hammered (a rate of 0
+      or less turns the host limit off)
+
+    Request handlers use the non-blocking forms and turn Overloaded into a
+    429 with Retry-After. Queued jobs use work() without a timeout and
+    simply wait for a slot.
+    """
+
+    def __init__(self, metadata_limit=None, work_limit=None, host_rate=30, host_burst=10,
+                 wait=2.0, retry_after=5):
+        default_metadata, default_work = default_limits()
+        self.metadata_limit = _Limit('metadata', metadata_limit or default_metadata)
+        self.work_limit = _Limit('work', work_limit or default_work)
+        self.host_rate = max(0, host_rate) / 60
+        # A bucket smaller than one token would never admit anything
+        self.host_burst = max(1, host_burst)
+        self.wait = wait
+        self.retry_after = retry_after
+
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._host_rejected = {}
+        self._last_log = {}
+
+        host_limit = f"{host_rate}/min per host (burst {self.host_burst})" if self.host_rate else "no host limit"
+        print(f"Governor: {self.metadata_limit.size} metadata, {self.work_limit.size} download/cut slots, "
+              f"{host_limit}")
+
+    def admit(self, url):
+        """Takes a token from the URL's host bucket or raises Overloaded."""
+        if not self.host_rate:
+            return
+        host = source_host(url)
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                if len(self._buckets) >= MAX_HOSTS:
+                    self._prune()
+                bucket = self._buckets[host] = TokenBucket(self.host_rate, self.host_burst)
+            wait = bucket.take()
+            if wait:
+                self._host_rejected[host] = self._host_rejected.get(host, 0) + 1
+        if wait:
+            self._log(f"host:{host}", f"rate limit for {host} reached, retry in {wait:.1f}s")
+            raise Overloaded(f"Too many requests for {host}, try again later.", wait)
+
+    @contextmanager
+    def metadata(self):
+        """Metadata slot, waiting at most `wait` seconds before refusing."""
+        with self._slot(self.metadata_limit, self.wait):
+            yield
+
+    @contextmanager
+    def work(self, timeout=None):
+        """Download/cut slot. Waits forever by default (jobs); request handlers pass a timeout."""
+        with self._slot(self.work_limit, timeout):
+            yield
+
+    def try_work(self):
+        """Non-blocking work slot for streams. Returns a release callable or raises Overloaded."""
+        if not self.work_limit.acquire(timeout=0):
+            self._log('work', f"all {self.work_limit.size} download/cut slots busy")
+            raise Overloaded("The server is busy, try again shortly.", self.retry_after)
+        return self.work_limit.release
+
+    @contextmanager
+    def _slot(self, limit, timeout):
+        if not limit.acquire(timeout):
+            self._log(limit.name, f"all {limit.size} {limit.name} slots busy")
+            raise Overloaded("The server is busy, try again shortly.", self.retry_after)
+        try:
+            yield
+        finally:
+            limit.release()
+
+    def _prune(self):
+        # Caller holds the lock. A bucket that has refilled is the same as a new one.
+        now = time.monotonic()
+        for host, bucket in list(self._buckets.items()):
+            if bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.burst:
+                del self._buckets[host]
+
+    def _log(self, reason, message):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_log.get(reason, 0) < LOG_INTERVAL:
+                return
+            self._last_log[reason] = now
+        print(f"Governor: rejecting, {message}")
+
+    def stats(self):
+        with self._lock:
+            host_rejected = dict(self._host_rejected)
+            hosts = len(self._buckets)
+        return {
+            'metadata': self.metadata_limit.stats(),
+            'work': self.work_limit.stats(),
+            'host_rate_per_min': round(self.host_rate * 60, 2),
+            'host_burst': self.host_burst,
+            'hosts': hosts,
+            'host_rejected': host_rejected,
+        }
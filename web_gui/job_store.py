@@ -0,0 +1,65 @@
+import json
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    runner TEXT,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+"""
+
+
+class JobStore:
+    """
+    Jobs on disk (SQLite), so a restart doesn't lose them.
+
+    JobQueue writes a row on submit, start and finish; progress events are
+    not stored. One connection is shared by all threads behind a lock, the
+    writes are single-row and WAL mode keeps them cheap.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+
+    def save(self, job):
+        """Inserts or updates the job's row."""
+        runner = job.runner.__name__ if job.runner is not None else None
+        result = json.dumps(job.result) if job.result is not None else None
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO jobs (id, runner, params, state, result, error, created_at, '
+                'started_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job.id, runner, json.dumps(job.params), job.state, result, job.error,
+                 job.created_at, job.started_at, job.finished_at))
+
+    def delete_finished(self, before):
+        """Forgets jobs that finished before the `before` timestamp."""
+        with self._lock:
+            self._db.execute('DELETE FROM jobs WHERE finished_at < ?', (before,))
+
+    def load(self):
+        """All stored jobs as dicts, oldest first (params and result decoded)."""
+        with self._lock:
+            rows = self._db.execute('SELECT * FROM jobs ORDER BY created_at').fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job['params'] = json.loads(job['params'])
+            job['result'] = json.loads(job['result']) if job['result'] is not None else None
+            jobs.append(job)
+        return jobs
@@ -0,0 +1,421 @@
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+
+class JobError(Exception):
+    """Expected failure inside a job (bad input, yt-dlp error). The message is shown to the user."""
+    pass
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit() when too many jobs are already waiting."""
+    pass
+
+
+class Job:
+    def __init__(self, params, runner=None, job_id=None):
+        self.id = job_id or str(uuid.uuid4())
+        self.params = params
+        self.runner = runner
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Latest progress event (see progress.py) and a counter bumped on every change,
+        # so listeners can tell whether they have already seen the current state
+        self.progress = None
+        self.version = 0
+
+    @property
+    def done(self):
+        return self.state in (FINISHED, FAILED)
+
+
+class JobQueue:
+    """
+    Bounded pool of worker threads that run jobs in FIFO order.
+
+    `runner(job)` does the actual work and returns a result dict (e.g. the
+    download_url). Raising JobError marks the job failed with that message.
+    Finished jobs are kept for `retention` seconds so clients can pick up
+    the result, then forgotten.
+
+    With a `store` (job_store.JobStore) every state change is written to
+    disk and recover() brings the jobs back after a restart. `runners` lists
+    the runner functions jobs may be submitted with, so a recovered job gets
+    its runner back by name.
+    """
+
+    def __init__(self, runner, workers=2, max_queued=100, retention=3600, store=None, runners=()):
+        self.runner = runner
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.store = store
+        self.runners = {fn.__name__: fn for fn in runners}
+
+        self._cond = threading.Condition()
+        self._updates = threading.Condition()  # separate so progress doesn't wake idle workers
+        self._pending = deque()
+        self._jobs = {}
+        self._running = 0
+
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"download-worker-{i}", daemon=True).start()
+
+    def submit(self, params, runner=None, locality=None):
+        """
+        Queues a job. `runner` overrides the queue's default runner for this job.
+        `locality` is only used by BrokerQueue.
+        """
+        job = Job(params, runner)
+        with self._cond:
+            self._prune()
+            if len(self._pending) >= self.max_queued:
+                raise QueueFull(f"Too many queued downloads ({self.max_queued}), try again later.")
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._save(job)
+            self._cond.notify()
+        return job
+
+    def recover(self):
+        """
+        Reloads the store after a restart: finished jobs stay retrievable, queued
+        and interrupted ones run again (yt-dlp resumes from their .part files).
+        Call once the runners can run, i.e. after the queue is assigned.
+        """
+        if self.store is None:
+            return
+        requeued = kept = 0
+        with self._cond:
+            self.store.delete_finished(time.time() - self.retention)
+            for row in self.store.load():
+                name = row['runner']
+                job = Job(row['params'], self.runners.get(name), job_id=row['id'])
+                job.created_at = row['created_at']
+                if row['state'] in (FINISHED, FAILED):
+                    job.state = row['state']
+                    job.result = row['result']
+                    job.error = row['error']
+                    job.started_at = row['started_at']
+                    job.finished_at = row['finished_at']
+                    kept += 1
+                elif name is not None and job.runner is None:
+                    job.state = FAILED
+                    job.error = f"Unknown job type after restart: {name}"
+                    job.finished_at = time.time()
+                    self._save(job)
+                else:
+                    self._pending.append(job)
+                    requeued += 1
+                self._jobs[job.id] = job
+            self._cond.notify_all()
+        if requeued or kept:
+            print(f"Job store: resumed {requeued} interrupted jobs, kept {kept} finished")
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def position(self, job):
+        """1-based place in the waiting line, 0 once the job has started."""
+        with self._cond:
+            if job.state != QUEUED:
+                return 0
+            try:
+                return self._pending.index(job) + 1
+            except ValueError:
+                return 0
+
+    def to_dict(self, job):
+        data = {
+            'job_id': job.id,
+            'status': job.state,
+            'position': self.position(job),
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at,
+        }
+        if job.progress is not None:
+            data['progress'] = job.progress
+        if job.state == FINISHED and job.result:
+            data.update(job.result)
+        if job.state == FAILED:
+            data['error'] = job.error
+        return data
+
+    def publish(self, job, event):
+        """Records a progress event for the job and wakes up anyone streaming it."""
+        with self._updates:
+            job.progress = event
+            job.version += 1
+            self._updates.notify_all()
+
+    def wait_for_update(self, job, seen_version, timeout=None):
+        """Blocks until the job changes past `seen_version` (or timeout). Returns the current version."""
+        with self._updates:
+            self._updates.wait_for(lambda: job.version != seen_version or job.done, timeout)
+            return job.version
+
+    def _touch(self, job):
+        with self._updates:
+            job.version += 1
+            self._updates.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'running': self._running,
+                'queued': len(self._pending),
+                'tracked': len(self._jobs),
+            }
+
+    def _prune(self):
+        # Caller holds the lock
+        cutoff = time.time() - self.retention
+        expired = [jid for jid, j in self._jobs.items() if j.done and j.finished_at < cutoff]
+        for jid in expired:
+            del self._jobs[jid]
+        if expired and self.store is not None:
+            try:
+                self.store.delete_finished(cutoff)
+            except sqlite3.Error as e:
+                print(f"Job store error: {e}")
+
+    def _save(self, job):
+        # Caller holds the lock, so rows are written in state order. A broken
+        # store costs durability, not the job.
+        if self.store is None:
+            return
+        try:
+            self.store.save(job)
+        except sqlite3.Error as e:
+            print(f"Job store error for job {job.id}: {e}")
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job = self._pending.popleft()
+                job.state = RUNNING
+                job.started_at = time.time()
+                self._running += 1
+                self._save(job)
+            self._touch(job)
+
+            result, error = None, None
+            try:
+                result = (job.runner or self.runner)(job)
+            except JobError as e:
+                error = str(e)
+            except Exception as e:
+                print(f"Job {job.id} crashed: {e}")
+                error = str(e)
+
+            with self._cond:
+                job.finished_at = time.time()
+                if error is None:
+                    job.result = result
+                    job.state = FINISHED
+                else:
+                    job.error = error
+                    job.state = FAILED
+                self._running -= 1
+                self._save(job)
+            self._touch(job)
+
+
+class BrokerQueue:
+    """
+    JobQueue spread over several nodes through a broker (broker.SQLiteBroker).
+
+    Every node's front end submits to and reads jobs from the broker. A node
+    with `workers` > 0 is also an executor: its worker threads claim jobs,
+    preferring those whose clip or source this node has cached (`locality`
+    key given on submit), and run them with the same runners as JobQueue.
+    workers=0 makes a front-end-only node.
+
+    Jobs returned by get() are snapshots; wait_for_update() refreshes them
+    in place by polling the broker.
+    """
+
+    def __init__(self, runner, broker, node, node_url=None, workers=2, max_queued=100, retention=3600,
+                 runners=(), poll_interval=0.5, locality_wait=10, progress_interval=0.5):
+        self.runner = runner
+        self.broker = broker
+        self.node = node
+        self.node_url = node_url
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.runners = {fn.__name__: fn for fn in runners}
+        self.poll_interval = poll_interval
+        # How long a job waits for the node that has its files before anyone may take it
+        self.locality_wait = locality_wait
+        # Progress events are written at most this often per job (phase changes always)
+        self.progress_interval = progress_interval
+
+        self._lock = threading.Lock()
+        self._running = 0
+        self._last_progress = {}  # job id -> (time, phase) of the last written event
+
+    def start(self):
+        """
+        Announces the node and starts the heartbeat and executor threads. Call
+        broker.reset_node() first, before the node's caches report their files.
+        """
+        self.broker.heartbeat(self.node, self.node_url, self.workers)
+        threading.Thread(target=self._heartbeat, name='broker-heartbeat', daemon=True).start()
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"download-worker-{i}", daemon=True).start()
+        print(f"Broker: node {self.node} ({self.node_url or 'no URL'}) with {self.workers} workers "
+              f"on {getattr(self.broker, 'path', self.broker)}")
+
+    def recover(self):
+        # The broker is durable; reset_node() requeues this node's interrupted jobs
+        pass
+
+    def submit(self, params, runner=None, locality=None):
+        """Queues a job; `locality` is the cache key of the file the job will produce or reuse."""
+        job = Job(params, runner)
+        self.broker.prune(time.time() - self.retention)
+        name = runner.__name__ if runner is not None else None
+        if not self.broker.submit(job.id, params, name, locality, self.max_queued):
+            raise QueueFull(f"Too many queued downloads ({self.max_queued}), try again later.")
+        return job
+
+    def get(self, job_id):
+        row = self.broker.get(job_id)
+        if row is None:
+            return None
+        job = Job(row['params'], self.runners.get(row['runner']), job_id=row['id'])
+        self._apply(job, row)
+        return job
+
+    def position(self, job):
+        if job.state != QUEUED:
+            return 0
+        return self.broker.position(job.id)
+
+    def to_dict(self, job):
+        data = {
+            'job_id': job.id,
+            'status': job.state,
+            'position': self.position(job),
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at,
+        }
+        if job.progress is not None:
+            data['progress'] = job.progress
+        if job.state == FINISHED and job.result:
+            data.update(job.result)
+        if job.state == FAILED:
+            data['error'] = job.error
+        return data
+
+    def publish(self, job, event):
+        """Records a progress event; called on the executor running the job."""
+        job.progress = event
+        now = time.monotonic()
+        last = self._last_progress.get(job.id)
+        if last and now - last[0] < self.progress_interval and last[1] == event.get('phase'):
+            return
+        self._last_progress[job.id] = (now, event.get('phase'))
+        try:
+            self.broker.progress(job.id, event)
+        except sqlite3.Error as e:
+            print(f"Broker error for job {job.id}: {e}")
+
+    def wait_for_update(self, job, seen_version, timeout=None):
+        """Polls the broker until the job changes past `seen_version` (or timeout), updating `job`."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            row = self.broker.get(job.id)
+            if row is not None:
+                self._apply(job, row)
+            if job.version != seen_version or job.done or row is None:
+                return job.version
+            if deadline is not None and time.monotonic() >= deadline:
+                return job.version
+            time.sleep(self.poll_interval)
+
+    def stats(self):
+        broker = self.broker.stats()
+        with self._lock:
+            running_here = self._running
+        return {
+            'workers': self.workers,
+            'running': broker['jobs'].get(RUNNING, 0),
+            'queued': broker['jobs'].get(QUEUED, 0),
+            'running_here': running_here,
+            'node': self.node,
+            'nodes': broker['nodes'],
+        }
+
+    @staticmethod
+    def _apply(job, row):
+        job.state = row['state']
+        job.result = row['result']
+        job.error = row['error']
+        job.progress = row['progress']
+        job.version = row['version']
+        job.created_at = row['created_at']
+        job.started_at = row['started_at']
+        job.finished_at = row['finished_at']
+
+    def _heartbeat(self):
+        interval = max(1, getattr(self.broker, 'lease', 30) / 3)
+        while True:
+            time.sleep(interval)
+            try:
+                self.broker.heartbeat(self.node, self.node_url, self.workers)
+            except sqlite3.Error as e:
+                print(f"Broker heartbeat error: {e}")
+
+    def _worker(self):
+        names = list(self.runners)
+        while True:
+            try:
+                row = self.broker.claim(self.node, names, self.locality_wait)
+            except sqlite3.Error as e:
+                print(f"Broker claim error: {e}")
+                row = None
+            if row is None:
+                time.sleep(self.poll_interval)
+                continue
+
+            job = Job(row['params'], self.runners.get(row['runner']), job_id=row['id'])
+            self._apply(job, row)
+            with self._lock:
+                self._running += 1
+
+            result, error = None, None
+            try:
+                result = (job.runner or self.runner)(job)
+            except JobError as e:
+                error = str(e)
+            except Exception as e:
+                print(f"Job {job.id} crashed: {e}")
+                error = str(e)
+
+            with self._lock:
+                self._running -= 1
+            self._last_progress.pop(job.id, None)
+            try:
+                self.broker.finish(job.id, result, error)
+            except sqlite3.Error as e:
+                print(f"Broker error finishing job {job.id}: {e}")
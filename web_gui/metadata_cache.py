@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that never change which video a URL points to.
+# Dropping them lets share links and copy-pasted links hit the same entry.
+TRACKING_PARAMS = {'si', 'feature', 'fbclid', 'gclid', 'igshid', 'mibextid', 'ref', 'ref_src'}
+
+
+def normalize_url(url):
+    """Returns a canonical form of the URL to use as a cache key."""
+    url = (url or '').strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    if not parts.scheme or not parts.netloc:
+        return url
+
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in TRACKING_PARAMS and not k.startswith('utm_')
+    ]
+    query.sort()
+
+    # Fragment is client-side only (e.g. "#t=30"), never part of the video identity
+    return urlunsplit((
+        parts.scheme.lower(),
+        parts.netloc.lower(),
+        parts.path or '/',
+        urlencode(query),
+        ''
+    ))
+
+
+class MetadataError(Exception):
+    """Raised when yt-dlp fails to extract metadata for a URL."""
+    pass
+
+
+class _Flight:
+    """One in-progress extraction that other callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MetadataCache:
+    """
+    TTL + LRU cache for `yt-dlp -J` output, keyed by normalized URL.
+
+    Concurrent lookups for the same URL share one extraction (single-flight):
+    the first caller runs `fetch(url)`, everyone else waits for its result.
+    Failed extractions are not cached, so the next request retries.
+    """
+
+    def __init__(self, fetch, ttl=600, max_entries=256):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, info)
+        self._inflight = {}            # key -> _Flight
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def get(self, url):
+        """Returns metadata for the URL, extracting it at most once per TTL."""
+        key = normalize_url(url)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, info = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return info
+                # Expired, drop it and fall through to a fresh fetch
+                del self._entries[key]
+
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                flight = _Flight()
+                self._inflight[key] = flight
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            info = self.fetch(url)
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self.errors += 1
+                self._inflight.pop(key, None)
+            flight.done.set()
+            raise
+
+        flight.result = info
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, info)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._inflight.pop(key, None)
+        flight.done.set()
+        return info
+
+    def peek(self, url):
+        """Returns cached metadata without fetching, or None."""
+        key = normalize_url(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            return entry[1]
+
+    def invalidate(self, url):
+        with self._lock:
+            self._entries.pop(normalize_url(url), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'inflight': len(self._inflight),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'errors': self.errors,
+                'hit_ratio': round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,232 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histograms: from a cached metadata
+# lookup up to a long full-video download
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in items]
+
+
+class Counter(_Metric):
+    """Monotonic count (requests, bytes, errors)."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down (active processes)."""
+
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track(self, **labels):
+        """+1 while the block runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class CallbackGauge(_Metric):
+    """
+    Value read at scrape time from `fn`, which returns a number, or a dict of
+    label value (tuple for several labels) -> number. `kind` may be 'counter'
+    for totals kept elsewhere (e.g. ClipCache stats).
+    """
+
+    def __init__(self, name, help, fn, labels=(), kind='gauge'):
+        super().__init__(name, help, labels)
+        self.fn = fn
+        self.kind = kind
+
+    def _samples(self):
+        try:
+            value = self.fn()
+        except Exception as e:
+            # A broken collector must not take the whole endpoint down
+            print(f"Metric {self.name} failed: {e}")
+            return []
+        if not isinstance(value, dict):
+            return [f"{self.name} {_number(value)}"]
+        samples = []
+        for key, v in sorted(value.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            samples.append(f"{self.name}{_labels(self.label_names, key)} {_number(v)}")
+        return samples
+
+
+class Histogram(_Metric):
+    """Latency distribution with cumulative buckets, as Prometheus expects."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        samples = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = (('le', _number(float(bound))),)
+                samples.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            samples.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(round(total, 6))}")
+            samples.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return samples
+
+
+class Registry:
+    """The metrics one /metrics endpoint exposes, in registration order."""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def callback(self, name, help, fn, labels=(), kind='gauge'):
+        return self.register(CallbackGauge(name, help, fn, labels, kind))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+# Per-request (or per-job) phase timings for the Server-Timing header. Each
+# thread handles one request or job at a time, so a thread-local list is enough.
+_local = threading.local()
+
+
+def start_timings():
+    """Starts collecting phases on this thread. Returns the (name, seconds, description) list."""
+    _local.timings = []
+    return _local.timings
+
+
+def take_timings():
+    """Phases collected on this thread since start_timings(); stops collecting."""
+    timings = getattr(_local, 'timings', None) or []
+    _local.timings = None
+    return timings
+
+
+def record(name, seconds, description=None):
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings.append((name, seconds, description))
+
+
+@contextmanager
+def timed(histogram, phase, description=None, **labels):
+    """
+    Times the block into `histogram` (may be None) and records it as `phase`
+    for this thread's Server-Timing header. Failures are timed as well.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if histogram is not None:
+            histogram.observe(elapsed, **labels)
+        record(phase, elapsed, description)
+
+
+def server_timing(timings):
+    """[(name, seconds, description)] -> 'name;dur=12.3;desc="..."' entries (durations in ms)."""
+    entries = []
+    for name, seconds, description in timings:
+        entry = f"{name};dur={seconds * 1000:.1f}"
+        if description:
+            entry += f';desc="{_escape(description)}"'
+        entries.append(entry)
+    return ', '.join(entries)
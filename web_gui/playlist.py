@@ -0,0 +1,56 @@
+"""
+Playlist/channel jobs as a bounded pipeline: entries come from a lazy,
+flat listing (engine.iter_playlist) and are processed by a few worker
+threads while the listing is still running.
+"""
+import itertools
+import queue
+import threading
+
+_END = object()
+
+
+def run_pipeline(entries, process, concurrency=3, buffer=None, max_entries=None, on_listed=None):
+    """
+    Reads `entries` on the calling thread and runs process(index, entry) on
+    `concurrency` threads. At most `buffer` listed entries (default: two per
+    thread) wait for a thread; when they are all taken the listing is not
+    read any further, which in turn blocks yt-dlp on its output pipe, so a
+    long playlist never gets listed far ahead of the work.
+
+    on_listed(index, entry) runs as each entry comes off the listing. Stops
+    after `max_entries` (closing the listing) and returns how many entries
+    were listed. An error from the listing is raised once the entries
+    already listed are processed.
+    """
+    pending = queue.Queue(maxsize=buffer or concurrency * 2)
+
+    def worker():
+        while True:
+            item = pending.get()
+            if item is _END:
+                return
+            try:
+                process(*item)
+            except Exception as e:
+                print(f"Playlist entry {item[0]} crashed: {e}")
+
+    threads = [threading.Thread(target=worker, name=f"playlist-{i}", daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+
+    listed = 0
+    try:
+        for index, entry in enumerate(itertools.islice(entries, max_entries)):
+            if on_listed is not None:
+                on_listed(index, entry)
+            pending.put((index, entry))  # blocks while the buffer is full
+            listed += 1
+    finally:
+        if hasattr(entries, 'close'):
+            entries.close()
+        for _ in threads:
+            pending.put(_END)
+        for t in threads:
+            t.join()
+    return listed
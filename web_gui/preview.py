@@ -0,0 +1,312 @@
+"""
+Cheap timeline previews for picking cut points before downloading: tiles
+from the site's storyboard sprite sheets when it has them, else single
+keyframes decoded from the smallest video format. Images are rendered on
+first request and kept on disk per URL.
+"""
+import hashlib
+import math
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urljoin
+
+from engine import get_startupinfo
+from formats import is_video
+from metadata_cache import normalize_url
+from streaming import STREAMABLE_PROTOCOLS
+
+# Width of a keyframe tile; storyboard tiles keep the site's size up to twice this
+TILE_WIDTH = 160
+# Tiles per page and the most a caller may ask for
+PAGE_TILES = 40
+MAX_PAGE_TILES = 200
+# Roughly how many tiles span the whole video when the caller gives no step
+TIMELINE_TILES = 200
+# Keyframe tile spacings (s); a step is rounded up to one of these, so pages and
+# zoom levels land on the same (cached) images
+KEYFRAME_STEPS = (1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600)
+# Finest keyframe zoom: at most this many tiles over the whole video. Keyframe
+# images are named by second, so this also bounds how many of them one URL can
+# make us render
+MAX_KEYFRAME_TILES = 2000
+
+# Image names: sb-<storyboard format>-<sheet number>, kf-<video format>-<second>
+IMAGE_NAME_RE = re.compile(r'^(sb|kf)-([A-Za-z0-9_.=-]+)-(\d+)$')
+
+
+class PreviewError(Exception):
+    """No preview for this video or image name."""
+    pass
+
+
+def url_key(url):
+    """Folder name of a URL's previews."""
+    return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()[:32]
+
+
+def storyboard_format(info):
+    """The site's storyboard (sprite sheets over the timeline) with the largest usable tiles, or None."""
+    boards = [f for f in info.get('formats') or []
+              if f.get('format_note') == 'storyboard' and f.get('fragments') and f.get('rows')
+              and f.get('columns') and f.get('width') and IMAGE_NAME_RE.match(f"sb-{f.get('format_id')}-0")]
+    usable = [f for f in boards if f['width'] <= TILE_WIDTH * 2]
+    if usable:
+        return max(usable, key=lambda f: f['width'])
+    return min(boards, key=lambda f: f['width'], default=None)
+
+
+def keyframe_format(info):
+    """Smallest video format ffmpeg can seek in by URL, or None."""
+    candidates = [f for f in info.get('formats') or []
+                  if is_video(f) and f.get('url') and f.get('protocol') in STREAMABLE_PROTOCOLS
+                  and IMAGE_NAME_RE.match(f"kf-{f.get('format_id')}-0")]
+    return min(candidates, key=lambda f: (f.get('height') or math.inf, f.get('tbr') or 0), default=None)
+
+
+def keyframe_steps(duration):
+    """The KEYFRAME_STEPS a video of `duration` seconds may be previewed at."""
+    return [s for s in KEYFRAME_STEPS if s >= duration / MAX_KEYFRAME_TILES] or [KEYFRAME_STEPS[-1]]
+
+
+def tile_interval(board):
+    """Seconds between two tiles of a storyboard."""
+    if board.get('fps'):
+        return 1 / board['fps']
+    return board['fragments'][0]['duration'] / (board['rows'] * board['columns'])
+
+
+def tiles(info, start=0, count=PAGE_TILES, step=None):
+    """
+    One page of preview tiles: up to `count` of them, `step` seconds apart
+    (by default about TIMELINE_TILES over the whole video), from `start` on.
+
+    Returns {'source', 'step', 'duration', 'tiles', 'next'}. A tile is
+    {'time', 'image', 'x', 'y', 'width', 'height'}: the image name for
+    PreviewCache.image() and where the tile sits in it (a sprite sheet holds
+    many). 'next' is the start of the following page, None at the end.
+    Raises PreviewError.
+    """
+    duration = info.get('duration')
+    if not duration:
+        raise PreviewError("The video's duration is unknown, there is no timeline to preview.")
+    count = max(1, min(count, MAX_PAGE_TILES))
+    wanted = step or duration / TIMELINE_TILES
+
+    board = storyboard_format(info)
+    if board is not None:
+        interval = tile_interval(board)
+        step = interval * max(1, math.ceil(round(wanted / interval, 6)))
+        source, tile = 'storyboard', lambda t: _storyboard_tile(board, interval, t)
+    else:
+        fmt = keyframe_format(info)
+        if fmt is None:
+            raise PreviewError("This video has no storyboard or seekable format to preview.")
+        step = next((s for s in keyframe_steps(duration) if s >= wanted), KEYFRAME_STEPS[-1])
+        source, tile = 'keyframes', lambda t: _keyframe_tile(fmt, t)
+
+    first = math.ceil(round(max(0, start) / step, 6))
+    times = [(first + i) * step for i in range(count)]
+    times = [t for t in times if t < duration]
+    following = (first + count) * step
+    return {
+        'source': source,
+        'step': step,
+        'duration': duration,
+        'tiles': [tile(t) for t in times],
+        'next': following if len(times) == count and following < duration else None,
+    }
+
+
+def _storyboard_tile(board, interval, t):
+    # Sheets are filled row by row; the last one may hold fewer tiles
+    per_sheet = board['rows'] * board['columns']
+    sheet, index = divmod(int(round(t / interval, 6)), per_sheet)
+    sheet = min(sheet, len(board['fragments']) - 1)
+    return {
+        'time': round(t, 3),
+        'image': f"sb-{board['format_id']}-{sheet}",
+        'x': (index % board['columns']) * board['width'],
+        'y': (index // board['columns']) * board['height'],
+        'width': board['width'],
+        'height': board['height'],
+    }
+
+
+def _keyframe_tile(fmt, t):
+    if fmt.get('width') and fmt.get('height'):
+        height = round(TILE_WIDTH * fmt['height'] / fmt['width'] / 2) * 2
+    else:
+        height = TILE_WIDTH * 9 // 16
+    return {
+        'time': round(t, 3),
+        'image': f"kf-{fmt['format_id']}-{int(t)}",
+        'x': 0,
+        'y': 0,
+        'width': TILE_WIDTH,
+        'height': height,
+    }
+
+
+def render_cmd(ffmpeg_cmd, info, name, dest):
+    """ffmpeg command that writes preview image `name` to `dest`. Raises PreviewError."""
+    match = IMAGE_NAME_RE.match(name)
+    if not match:
+        raise PreviewError(f"Unknown preview image: {name}")
+    kind, format_id, number = match.group(1), match.group(2), int(match.group(3))
+    fmt = next((f for f in info.get('formats') or [] if f.get('format_id') == format_id), None)
+    if fmt is None:
+        raise PreviewError(f"Format {format_id} not found for this video.")
+
+    cmd = [ffmpeg_cmd, '-hide_banner', '-nostdin', '-loglevel', 'error', '-y']
+    if fmt.get('http_headers'):
+        cmd.extend(['-headers', ''.join(f"{k}: {v}\r\n" for k, v in fmt['http_headers'].items())])
+    if kind == 'sb':
+        fragments = fmt.get('fragments') or []
+        if number >= len(fragments):
+            raise PreviewError(f"Storyboard {format_id} has no sheet {number}.")
+        fragment = fragments[number]
+        cmd.extend(['-i', fragment.get('url') or urljoin(fmt.get('fragment_base_url') or '', fragment['path'])])
+    else:
+        # Only seconds tiles() hands out: each one is an ffmpeg run and a cached file
+        duration = info.get('duration')
+        if (keyframe_format(info) or {}).get('format_id') != format_id:
+            raise PreviewError(f"Format {format_id} is not used for keyframe previews.")
+        if not duration or number >= duration or not any(number % s == 0 for s in keyframe_steps(duration)):
+            raise PreviewError(f"No keyframe preview at {number}s.")
+        # Only keyframes are decoded; input-side seek fetches just the bytes around `number`
+        cmd.extend(['-skip_frame', 'nokey', '-ss', str(number), '-i', fmt['url'], '-an',
+                    '-vf', f'scale={TILE_WIDTH}:-2'])
+    cmd.extend(['-frames:v', '1', '-q:v', '3', dest])
+    return cmd
+
+
+class PreviewCache:
+    """
+    Preview images on disk, one folder per URL (<folder>/<url_key>/<name>.<ext>).
+
+    An image is rendered by ffmpeg the first time it is asked for, at most
+    `concurrency` at once; identical concurrent requests render it once.
+    Folders are touched on use; a janitor thread removes the ones idle for
+    `max_age` seconds and, least recently used first, those over `max_bytes`.
+    """
+
+    def __init__(self, folder, ffmpeg_cmd='ffmpeg', ext='jpg', concurrency=2, max_bytes=512 * 1024 ** 2,
+                 max_age=24 * 3600, interval=300):
+        self.folder = folder
+        self.ffmpeg_cmd = ffmpeg_cmd
+        self.ext = ext
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.interval = interval
+
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._building_slots = {}  # path -> [lock, users]
+
+        self.hits = 0
+        self.rendered = 0
+        self.errors = 0
+
+        os.makedirs(folder, exist_ok=True)
+        threading.Thread(target=self._janitor, name='preview-cache-janitor', daemon=True).start()
+
+    def image(self, url, name, get_info):
+        """
+        Path of preview image `name` (from tiles()) for `url`. On a miss
+        get_info() supplies the metadata and the image is rendered now.
+        Raises PreviewError, or whatever get_info() raises.
+        """
+        if not IMAGE_NAME_RE.match(name):
+            raise PreviewError(f"Unknown preview image: {name}")
+        folder = os.path.join(self.folder, url_key(url))
+        path = os.path.join(folder, f"{name}.{self.ext}")
+
+        with self._building(path):
+            if os.path.exists(path):
+                with self._lock:
+                    self.hits += 1
+                self._touch(folder)
+                return path
+
+            tmp = f"{path}.tmp.{self.ext}"
+            cmd = render_cmd(self.ffmpeg_cmd, get_info(), name, tmp)
+            os.makedirs(folder, exist_ok=True)
+            try:
+                with self._slots:
+                    process = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8',
+                                             errors='replace', timeout=60, startupinfo=get_startupinfo())
+                if process.returncode != 0 or not os.path.exists(tmp):
+                    raise PreviewError(process.stderr.strip() or f"ffmpeg exited with {process.returncode}")
+                os.replace(tmp, path)
+            except (PreviewError, OSError, subprocess.TimeoutExpired) as e:
+                with self._lock:
+                    self.errors += 1
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                if isinstance(e, PreviewError):
+                    raise
+                raise PreviewError(f"Preview image could not be rendered: {e}")
+            with self._lock:
+                self.rendered += 1
+            return path
+
+    @staticmethod
+    def _touch(folder):
+        try:
+            os.utime(folder)
+        except OSError:
+            pass
+
+    @contextmanager
+    def _building(self, path):
+        # Same as ClipCache.building(), per image
+        with self._lock:
+            slot = self._building_slots.setdefault(path, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._building_slots[path]
+
+    def prune(self):
+        """Removes idle URL folders, then the least recently used ones over the disk budget."""
+        now = time.time()
+        folders = []
+        for entry in os.scandir(self.folder):
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                folders.append((entry.stat().st_mtime, size, entry.path))
+            except FileNotFoundError:
+                continue
+
+        total = sum(size for _, size, _ in folders)
+        for mtime, size, path in sorted(folders):
+            if total <= self.max_bytes and now - mtime < self.max_age:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'rendered': self.rendered, 'errors': self.errors,
+                    'rendering': len(self._building_slots)}
+
+    def _janitor(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.prune()
+            except Exception as e:
+                print(f"Preview cache janitor error: {e}")
+
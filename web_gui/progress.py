@@ -0,0 +1,162 @@
+import re
+
+# Phases a clip goes through, in order
+EXTRACT = 'extract'        # yt-dlp talking to the site ([youtube], [info], ...)
+DOWNLOAD = 'download'      # plain HTTP/fragment download ([download] xx%)
+CUT = 'cut'                # ffmpeg fetching + cutting a --download-sections range
+POSTPROCESS = 'postprocess'  # merging / fixups after the download
+PLAYLIST = 'playlist'      # playlist job: entries listed/clipped so far (event carries 'entries')
+DONE = 'done'
+ERROR = 'error'
+
+SIZE_UNITS = {
+    'B': 1, 'KIB': 1024, 'MIB': 1024 ** 2, 'GIB': 1024 ** 3, 'TIB': 1024 ** 4,
+    'KB': 1000, 'MB': 1000 ** 2, 'GB': 1000 ** 3, 'TB': 1000 ** 4,
+}
+
+# [download]  45.3% of ~ 10.00MiB at  1.20MiB/s ETA 00:05 (frag 3/10)
+DOWNLOAD_RE = re.compile(
+    r'^\[download\]\s+(?P<percent>[\d.]+)%\s+of\s+~?\s*(?P<total>\S+)'
+    r'(?:\s+in\s+(?P<elapsed>\S+))?'
+    r'(?:\s+at\s+(?P<speed>\S+(?:\s+B/s)?))?'
+    r'(?:\s+ETA\s+(?P<eta>\S+))?'
+)
+# [download]  12.00MiB at  1.20MiB/s (00:00:05)   -- total size unknown
+DOWNLOAD_UNKNOWN_RE = re.compile(r'^\[download\]\s+(?P<done>[\d.]+\S*B)\s+at\s+(?P<speed>\S+)')
+# frame=  240 fps= 60 q=28.0 size=    1024kB time=00:00:08.00 bitrate=1048.6kbits/s speed=2.0x
+FFMPEG_RE = re.compile(r'(?:size=\s*(?P<size>\d+)(?P<unit>[kKmM]i?B)\s+)?time=\s*(?P<time>-?[\d:.]+)')
+FFMPEG_SPEED_RE = re.compile(r'speed=\s*(?P<speed>[\d.]+)x')
+SITE_RE = re.compile(r'^\[(?P<tag>[\w:]+)\]\s')
+
+POSTPROCESS_TAGS = {'Merger', 'FixupM3u8', 'FixupM4a', 'FixupDuplicateMoov', 'FixupStretched',
+                    'VideoConvertor', 'VideoRemuxer', 'ExtractAudio', 'ffmpeg', 'Metadata',
+                    'EmbedSubtitle', 'ModifyChapters', 'SplitChapters'}
+
+
+def parse_size(text):
+    """"10.00MiB" -> 10485760. Returns None for "N/A", "Unknown" etc."""
+    if not text:
+        return None
+    m = re.match(r'^~?\s*([\d.]+)\s*([KMGT]?i?B)', text.strip(), re.IGNORECASE)
+    if not m:
+        return None
+    unit = SIZE_UNITS.get(m.group(2).upper())
+    if unit is None:
+        return None
+    return int(float(m.group(1)) * unit)
+
+
+def parse_clock(text):
+    """"01:02:03.50" / "02:03" / "5" -> seconds as float. None if not a clock value."""
+    if not text:
+        return None
+    try:
+        seconds = 0.0
+        for part in text.strip().split(':'):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    except ValueError:
+        return None
+
+
+def make_event(phase, percent=None, downloaded_bytes=None, total_bytes=None,
+               speed=None, eta=None, message=None):
+    """Builds one structured progress event (a plain dict, so it can go straight to JSON)."""
+    return {
+        'phase': phase,
+        'percent': round(percent, 1) if percent is not None else None,
+        'downloaded_bytes': downloaded_bytes,
+        'total_bytes': total_bytes,
+        'speed': speed,          # bytes/s for downloads, realtime factor ("2.0x") for ffmpeg
+        'eta': eta,              # seconds
+        'message': message,
+    }
+
+
+class ProgressParser:
+    """
+    Turns yt-dlp (and pass-through ffmpeg) output lines into progress events.
+
+    Feed every stdout/stderr line; `feed()` returns an event dict or None
+    for lines that carry no progress information. `section_duration` (in
+    seconds) lets ffmpeg's `time=` counter be turned into a percentage when
+    a --download-sections range is cut.
+    """
+
+    def __init__(self, section_duration=None):
+        self.section_duration = section_duration
+        self.phase = EXTRACT
+
+    def feed(self, line):
+        line = line.strip()
+        if not line:
+            return None
+
+        if line.startswith('ERROR:'):
+            self.phase = ERROR
+            return make_event(ERROR, message=line[6:].strip())
+
+        if line.startswith('[download]'):
+            return self._parse_download(line)
+
+        if 'time=' in line and ('frame=' in line or 'size=' in line):
+            return self._parse_ffmpeg(line)
+
+        m = SITE_RE.match(line)
+        if m:
+            tag = m.group('tag')
+            if tag in POSTPROCESS_TAGS:
+                self.phase = POSTPROCESS
+                return make_event(POSTPROCESS, message=line)
+            if self.phase == EXTRACT:
+                return make_event(EXTRACT, message=line)
+        return None
+
+    def _parse_download(self, line):
+        m = DOWNLOAD_RE.match(line)
+        if m:
+            # A finished download also reports "100% of X in 00:08"
+            if self.phase != CUT:
+                self.phase = DOWNLOAD
+            percent = float(m.group('percent'))
+            total = parse_size(m.group('total'))
+            downloaded = int(total * percent / 100) if total else None
+            speed = parse_size(m.group('speed')) if m.group('speed') else None
+            return make_event(DOWNLOAD, percent=percent, downloaded_bytes=downloaded,
+                              total_bytes=total, speed=speed, eta=parse_clock(m.group('eta')))
+
+        m = DOWNLOAD_UNKNOWN_RE.match(line)
+        if m:
+            self.phase = DOWNLOAD
+            return make_event(DOWNLOAD, downloaded_bytes=parse_size(m.group('done')),
+                              speed=parse_size(m.group('speed')))
+
+        if 'Destination:' in line or 'has already been downloaded' in line:
+            return make_event(self.phase if self.phase != EXTRACT else DOWNLOAD, message=line)
+        return None
+
+    def _parse_ffmpeg(self, line):
+        m = FFMPEG_RE.search(line)
+        if not m:
+            return None
+        self.phase = CUT
+
+        position = parse_clock(m.group('time'))
+        percent = None
+        eta = None
+        speed = None
+        sm = FFMPEG_SPEED_RE.search(line)
+        if sm:
+            speed = f"{sm.group('speed')}x"
+
+        if position is not None and position >= 0 and self.section_duration:
+            percent = min(100.0, position / self.section_duration * 100)
+            if sm and float(sm.group('speed')) > 0:
+                eta = max(0.0, (self.section_duration - position) / float(sm.group('speed')))
+
+        size = None
+        if m.group('size'):
+            factor = 1024 if m.group('unit').lower().startswith('k') else 1024 ** 2
+            size = int(m.group('size')) * factor
+
+        return make_event(CUT, percent=percent, downloaded_bytes=size, speed=speed, eta=eta)
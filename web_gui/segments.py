@@ -0,0 +1,175 @@
+"""
+Segment-parallel downloads: a long range is split into sub-ranges that
+yt-dlp downloads (and ffmpeg cuts) at the same time, then joined: the video
+by the ffmpeg concat demuxer without re-encoding, the audio re-encoded in
+one piece so the seams don't drift.
+"""
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import progress
+from batch import format_clock, span_paths
+from engine import get_startupinfo
+from smartcut import AUDIO_ENCODERS, SmartCutError, probe_streams, write_concat_list
+
+# Shortest sub-range worth its own yt-dlp/ffmpeg process, and the most sub-ranges per clip
+MIN_SEGMENT_SECONDS = 120
+MAX_SEGMENTS = 8
+# How far past a split point ffprobe looks for the next source keyframe
+KEYFRAME_WINDOW = 15
+# Joined files that get their index moved to the front (+faststart)
+FASTSTART_EXTS = ('.mp4', '.m4v', '.mov', '.m4a')
+
+
+def segment_count(duration, cpus=None, min_segment=MIN_SEGMENT_SECONDS, max_segments=MAX_SEGMENTS):
+    """
+    How many sub-ranges to split a `duration`-second range into: one per
+    `min_segment` seconds, at most one per core and `max_segments`.
+    1 means the range isn't worth splitting.
+    """
+    cpus = cpus or os.cpu_count() or 1
+    return max(1, min(max_segments, cpus, int(duration // min_segment)))
+
+
+def split_range(start, end, count):
+    """[start, end) as `count` equal, touching (start, end) sub-ranges."""
+    step = (end - start) / count
+    points = [start + step * i for i in range(count)] + [end]
+    return list(zip(points, points[1:]))
+
+
+def probe_keyframes_near(ffprobe_cmd, media_url, points, window=KEYFRAME_WINDOW):
+    """
+    Keyframe timestamps of the video stream in [point, point + window) for
+    each point, reading only those stretches of the (remote) file. Returns a
+    sorted list, empty when probing isn't possible.
+    """
+    intervals = ','.join(f"{p:.3f}%+{window}" for p in points)
+    cmd = [ffprobe_cmd, '-v', 'error', '-select_streams', 'v:0', '-read_intervals', intervals,
+           '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', media_url]
+    try:
+        process = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace',
+                                 timeout=60, startupinfo=get_startupinfo())
+    except (OSError, subprocess.TimeoutExpired):
+        return []
+    keyframes = []
+    for line in process.stdout.splitlines():
+        parts = line.strip().split(',')
+        if len(parts) >= 2 and 'K' in parts[1] and parts[0] not in ('', 'N/A'):
+            keyframes.append(float(parts[0]))
+    return sorted(keyframes)
+
+
+def snap_to_keyframes(ranges, keyframes, window=KEYFRAME_WINDOW):
+    """
+    Moves each inner split point to the first keyframe at or after it (within
+    `window`), so every sub-range starts on a source keyframe. Points without
+    one nearby stay put; yt-dlp's --force-keyframes-at-cuts puts one there.
+    """
+    points = [ranges[0][0]]
+    for start, _ in ranges[1:]:
+        keyframe = next((k for k in keyframes if start <= k < start + window), None)
+        points.append(keyframe if keyframe is not None and keyframe > points[-1] else start)
+    points.append(ranges[-1][1])
+    return [(a, b) for a, b in zip(points, points[1:]) if b > a]
+
+
+def join(ffmpeg_cmd, parts, dest, durations=None, audio_args=None):
+    """
+    Concatenates same-codec parts. The video is stream-copied (concat
+    demuxer). With `audio_args` (encoder arguments) the audio of each part
+    is decoded, cut to its entry of `durations` and re-encoded as one
+    stream: every part's last AAC/Opus frame runs past its end, and copied
+    as is, each seam would shift the audio a little further from the
+    video. Without, everything is copied. Raises RuntimeError.
+    """
+    list_path = f"{dest}.parts.txt"
+    write_concat_list(list_path, parts)
+    # -copyts: the demuxer's timestamps already start at 0, ffmpeg would
+    # shift the video by the first part's audio priming
+    cmd = [ffmpeg_cmd, '-hide_banner', '-nostdin', '-loglevel', 'error', '-y', '-copyts',
+           '-f', 'concat', '-safe', '0', '-i', list_path]
+    if audio_args:
+        filters = []
+        for index, (part, duration) in enumerate(zip(parts, durations)):
+            cmd += ['-i', part]
+            filters.append(f"[{index + 1}:a:0]atrim=end={duration:.6f}[a{index}]")
+        inputs = ''.join(f"[a{index}]" for index in range(len(parts)))
+        graph = ';'.join(filters + [f"{inputs}concat=n={len(parts)}:v=0:a=1[a]"])
+        cmd += ['-filter_complex', graph, '-map', '0:v:0', '-map', '[a]', '-c:v', 'copy', *audio_args]
+    else:
+        cmd += ['-map', '0', '-c', 'copy']
+    if os.path.splitext(dest)[1].lower() in FASTSTART_EXTS:
+        cmd += ['-movflags', '+faststart']
+    try:
+        process = subprocess.run(cmd + [dest], capture_output=True, text=True, encoding='utf-8',
+                                 errors='replace', startupinfo=get_startupinfo())
+    finally:
+        os.remove(list_path)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip() or f'ffmpeg exited with {process.returncode}')
+
+
+def join_audio_args(ffprobe_cmd, part):
+    """Encoder arguments join() re-encodes the audio of parts like `part` with, or None to copy it."""
+    try:
+        streams = probe_streams(ffprobe_cmd, part)
+    except (SmartCutError, OSError, ValueError):
+        return None
+    if 'video' not in streams or 'audio' not in streams:
+        return None
+    return AUDIO_ENCODERS.get(streams['audio'].get('codec_name'))
+
+
+def download_parallel(download, ffmpeg_cmd, folder, file_id, ranges, on_event=None, ffprobe_cmd='ffprobe'):
+    """
+    Downloads every (start, end) of `ranges` at once and joins them into
+    <folder>/<file_id>.<ext>, which is returned.
+
+    download(output_template, start_clock, end_clock, on_event) fetches one
+    sub-range (engine.download with the URL and format bound). `on_event`
+    gets progress for the whole range, weighted by sub-range length. The
+    first failure is raised once all sub-ranges have stopped; the parts are
+    always removed.
+    """
+    total = sum(end - start for start, end in ranges)
+    percents = [0.0] * len(ranges)
+    lock = threading.Lock()
+
+    def fetch(index):
+        start, end = ranges[index]
+        segment_id = f"{file_id}.seg{index:02d}"
+
+        def segment_event(event):
+            if on_event is None or event['percent'] is None:
+                return
+            with lock:
+                percents[index] = event['percent']
+                percent = sum(p * (b - a) for p, (a, b) in zip(percents, ranges)) / total
+            on_event(progress.make_event(event['phase'], percent=percent,
+                                         message=f"{len(ranges)} segments in parallel"))
+
+        download(os.path.join(folder, f"{segment_id}.%(ext)s"), format_clock(start), format_clock(end),
+                 segment_event)
+        paths = span_paths(folder, segment_id)
+        if not paths:
+            raise RuntimeError(f'Segment {index + 1} of {len(ranges)} not found after download.')
+        return paths[0]
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            futures = [pool.submit(fetch, i) for i in range(len(ranges))]
+        parts = [future.result() for future in futures]
+
+        if on_event is not None:
+            on_event(progress.make_event(progress.POSTPROCESS, message=f"Joining {len(parts)} segments"))
+        dest = os.path.join(folder, f"{file_id}{os.path.splitext(parts[0])[1]}")
+        join(ffmpeg_cmd, parts, dest, [end - start for start, end in ranges],
+             join_audio_args(ffprobe_cmd, parts[0]))
+        return dest
+    finally:
+        for index in range(len(ranges)):
+            for path in span_paths(folder, f"{file_id}.seg{index:02d}"):
+                os.remove(path)
@@ -0,0 +1,214 @@
+import json
+import os
+import subprocess
+import tempfile
+import uuid
+
+from engine import get_startupinfo
+
+# Encoders of the full re-encode, per source codec, so the clip keeps a codec
+# its container accepts (VP9/Opus for WebM, ...)
+VIDEO_ENCODERS = {
+    'h264': ['-c:v', 'libx264', '-preset', 'veryfast'],
+    'hevc': ['-c:v', 'libx265', '-preset', 'veryfast', '-x265-params', 'log-level=error'],
+    'vp9': ['-c:v', 'libvpx-vp9', '-deadline', 'realtime', '-cpu-used', '8'],
+    'av1': ['-c:v', 'libsvtav1', '-preset', '10'],
+}
+AUDIO_ENCODERS = {
+    'aac': ['-c:a', 'aac'],
+    'opus': ['-c:a', 'libopus'],
+    'mp3': ['-c:a', 'libmp3lame'],
+}
+
+# Source codec + container pairs the smart cut handles, and how. Anything else
+# gets the full re-encode.
+#   containers    clip extensions the pieces can be joined into
+#   intermediate  muxer of the pieces: MPEG-TS carries H.264/HEVC parameter
+#                 sets in-band at every keyframe (copied pieces included),
+#                 Matroska carries VP9, whose frames need none
+#   tag           MP4 sample entry that lets parameter sets change in-band
+#                 (avc3/hev1). The re-encoded pieces have their own SPS/PPS,
+#                 which the single avcC/hvcC of avc1/hvc1 would misdescribe.
+SMART_CODECS = {
+    'h264': {'containers': ('.mp4', '.m4v', '.mov'), 'intermediate': ('mpegts', '.ts'), 'tag': 'avc3'},
+    'hevc': {'containers': ('.mp4', '.m4v', '.mov'), 'intermediate': ('mpegts', '.ts'), 'tag': 'hev1'},
+    'vp9': {'containers': ('.webm', '.mkv'), 'intermediate': ('matroska', '.mkv'), 'tag': None},
+}
+# libx264 profile matching the source's (as ffprobe names it), so the
+# re-encoded pieces use the same coding tools as the copied ones
+H264_PROFILES = {'Constrained Baseline': 'baseline', 'Baseline': 'baseline', 'Main': 'main', 'High': 'high'}
+
+# Cut points closer than this to a keyframe are treated as on the keyframe
+KEYFRAME_EPSILON = 0.02
+
+
+class SmartCutError(Exception):
+    pass
+
+
+def _run(cmd):
+    process = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8',
+                             errors='replace', startupinfo=get_startupinfo())
+    if process.returncode != 0:
+        raise SmartCutError(process.stderr.strip() or f'{cmd[0]} exited with {process.returncode}')
+    return process.stdout
+
+
+def probe_streams(ffprobe_cmd, path):
+    """Codec details of the first video and audio stream: {'video': {...}, 'audio': {...}}."""
+    out = _run([ffprobe_cmd, '-v', 'error', '-show_entries',
+                'stream=codec_type,codec_name,profile,width,height,pix_fmt,sample_rate,channels',
+                '-of', 'json', path])
+    streams = {}
+    for stream in json.loads(out).get('streams', []):
+        streams.setdefault(stream.get('codec_type'), stream)
+    return streams
+
+
+def probe_packets(ffprobe_cmd, path):
+    """Sorted (pts, is_keyframe) of every packet of the first video stream (no decoding)."""
+    out = _run([ffprobe_cmd, '-v', 'error', '-select_streams', 'v:0',
+                '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', path])
+    packets = []
+    for line in out.splitlines():
+        parts = line.strip().split(',')
+        if len(parts) >= 2 and parts[0] not in ('', 'N/A'):
+            packets.append((float(parts[0]), 'K' in parts[1]))
+    packets.sort()
+    return packets
+
+
+def probe_keyframes(ffprobe_cmd, path):
+    """Sorted keyframe timestamps of the first video stream, read from packet flags (no decoding)."""
+    return [pts for pts, key in probe_packets(ffprobe_cmd, path) if key]
+
+
+def plan_cut(keyframes, start, end):
+    """
+    Splits [start, end) into (kind, from, to) pieces: 'encode' for the partial
+    GOPs at each boundary, 'copy' for the whole GOPs in between.
+    Returns None when there is no whole GOP inside the range.
+    """
+    k_in = next((k for k in keyframes if k >= start - KEYFRAME_EPSILON), None)
+    k_out = next((k for k in reversed(keyframes) if k <= end + KEYFRAME_EPSILON), None)
+    if k_in is None or k_out is None or k_out - k_in <= KEYFRAME_EPSILON:
+        return None
+
+    pieces = []
+    if k_in - start > KEYFRAME_EPSILON:
+        pieces.append(('encode', start, k_in))
+    pieces.append(('copy', max(k_in, start), min(k_out, end)))
+    if end - k_out > KEYFRAME_EPSILON:
+        pieces.append(('encode', k_out, end))
+    return pieces
+
+
+def full_reencode_cmd(ffmpeg_cmd, src, dest, start, end, video_args=None, audio_args=None):
+    """Frame-accurate cut by re-encoding the whole range (what --force-keyframes-at-cuts amounts to)."""
+    return [
+        ffmpeg_cmd, '-hide_banner', '-nostdin', '-loglevel', 'error', '-y',
+        '-ss', f"{start:.3f}", '-i', src, '-t', f"{end - start:.3f}",
+        '-map', '0:v:0?', '-map', '0:a:0?',
+        *(video_args or VIDEO_ENCODERS['h264']), *(audio_args or AUDIO_ENCODERS['aac']),
+        dest
+    ]
+
+
+def smart_codec(video, dest):
+    """SMART_CODECS entry for cutting `video` (probe_streams() info) into `dest`, or None."""
+    codec = SMART_CODECS.get((video or {}).get('codec_name'))
+    if codec is None or os.path.splitext(dest)[1].lower() not in codec['containers']:
+        return None
+    return codec
+
+
+def boundary_encoder(video):
+    """Encoder arguments for the re-encoded pieces, matched to the source stream."""
+    args = VIDEO_ENCODERS[video['codec_name']] + ['-pix_fmt', video.get('pix_fmt') or 'yuv420p']
+    if video['codec_name'] == 'h264' and video.get('profile') in H264_PROFILES:
+        args += ['-profile:v', H264_PROFILES[video['profile']]]
+    return args
+
+
+def write_concat_list(path, files):
+    """Input list for ffmpeg's concat demuxer, quoting each path the way it expects."""
+    with open(path, 'w', encoding='utf-8') as f:
+        for file in files:
+            f.write("file '{}'\n".format(file.replace("'", "'\\''")))
+
+
+def smart_cut(ffmpeg_cmd, ffprobe_cmd, src, dest, start, end):
+    """
+    Cuts [start, end) from a local file, frame-accurately, re-encoding only
+    the partial GOPs of the video at the boundaries and stream-copying
+    everything in between; the audio is copied in one piece, so it has no
+    seams. Falls back to a full re-encode when the range holds no whole GOP,
+    the codec/container pair isn't in SMART_CODECS or the smart path fails.
+
+    Returns {'mode', 'copied_seconds', 'encoded_seconds', 'fallback'}, the
+    last being why the smart path was given up (None if it wasn't tried or
+    went through). Raises SmartCutError when the full re-encode fails too.
+    """
+    streams = probe_streams(ffprobe_cmd, src)
+    video = streams.get('video')
+    audio = streams.get('audio')
+
+    codec = smart_codec(video, dest)
+    packets = probe_packets(ffprobe_cmd, src) if codec else []
+    pieces = plan_cut([pts for pts, key in packets if key], start, end) if codec else None
+    fallback = None
+    if pieces is not None:
+        try:
+            return _smart_cut(ffmpeg_cmd, src, dest, pieces, packets, codec, video, audio)
+        except SmartCutError as e:
+            fallback = str(e)
+
+    video_args = VIDEO_ENCODERS.get((video or {}).get('codec_name'))
+    audio_args = AUDIO_ENCODERS.get((audio or {}).get('codec_name'))
+    _run(full_reencode_cmd(ffmpeg_cmd, src, dest, start, end, video_args, audio_args))
+    return {'mode': 'reencode', 'copied_seconds': 0.0, 'encoded_seconds': end - start, 'fallback': fallback}
+
+
+def _smart_cut(ffmpeg_cmd, src, dest, pieces, packets, codec, video, audio):
+    muxer, ext = codec['intermediate']
+    work_dir = tempfile.mkdtemp(prefix='smartcut-', dir=os.path.dirname(dest) or None)
+    parts = []
+    copied = encoded = 0.0
+    try:
+        for kind, a, b in pieces:
+            # Video only: the audio is copied in one go below
+            part = os.path.join(work_dir, f"{len(parts):02d}-{uuid.uuid4().hex[:8]}{ext}")
+            cmd = [ffmpeg_cmd, '-hide_banner', '-nostdin', '-loglevel', 'error', '-y',
+                   '-ss', f"{a:.3f}", '-i', src, '-map', '0:v:0', '-an']
+            if kind == 'copy':
+                # Counted in packets: with B-frames, -t lets a copy run past `b`
+                # by the frames that are stored before but shown after it
+                frames = sum(1 for pts, _ in packets if a - KEYFRAME_EPSILON <= pts < b - KEYFRAME_EPSILON)
+                cmd += ['-frames:v', str(frames), '-c', 'copy']
+                copied += b - a
+            else:
+                cmd += ['-t', f"{b - a:.3f}", *boundary_encoder(video)]
+                encoded += b - a
+            cmd += ['-f', muxer, part]
+            _run(cmd)
+            parts.append(part)
+
+        list_path = os.path.join(work_dir, 'parts.txt')
+        write_concat_list(list_path, parts)
+
+        start, end = pieces[0][1], pieces[-1][2]
+        cmd = [ffmpeg_cmd, '-hide_banner', '-nostdin', '-loglevel', 'error', '-y',
+               '-f', 'concat', '-safe', '0', '-i', list_path]
+        if audio:
+            cmd += ['-ss', f"{start:.3f}", '-i', src, '-t', f"{end - start:.3f}", '-map', '1:a:0']
+        cmd += ['-map', '0:v:0', '-c', 'copy']
+        if codec['tag']:
+            cmd += ['-tag:v', codec['tag'], '-movflags', '+faststart']
+        _run(cmd + [dest])
+    finally:
+        for name in os.listdir(work_dir):
+            os.remove(os.path.join(work_dir, name))
+        os.rmdir(work_dir)
+
+    return {'mode': 'smart', 'copied_seconds': round(copied, 3), 'encoded_seconds': round(encoded, 3),
+            'fallback': None}
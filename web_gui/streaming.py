@@ -0,0 +1,139 @@
+import os
+import subprocess
+import threading
+from collections import deque
+
+# Streamable containers: the muxer can write them to a pipe without seeking back
+CONTAINERS = {
+    # Fragmented MP4: moov up front, then self-contained fragments
+    'mp4': {
+        'args': ['-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov+default_base_moof'],
+        'mimetype': 'video/mp4',
+        'ext': 'mp4',
+    },
+    'ts': {
+        'args': ['-f', 'mpegts'],
+        'mimetype': 'video/mp2t',
+        'ext': 'ts',
+    },
+}
+
+# Protocols ffmpeg can open directly from the format's url
+STREAMABLE_PROTOCOLS = {None, 'http', 'https', 'm3u8', 'm3u8_native'}
+
+CHUNK_SIZE = 64 * 1024
+
+
+class StreamError(Exception):
+    """The requested format/range can't be streamed; the normal download path still works."""
+    pass
+
+
+def _format_inputs(fmt):
+    if fmt.get('protocol') not in STREAMABLE_PROTOCOLS or not fmt.get('url'):
+        raise StreamError(f"Format {fmt.get('format_id')} ({fmt.get('protocol')}) can't be streamed, "
+                          "use the normal download instead.")
+    return [(fmt['url'], fmt.get('http_headers') or {})]
+
+
+def select_inputs(info, format_id):
+    """
+    Picks the media URL(s) for `format_id` from `yt-dlp -J` output.
+
+    Returns a list of (url, http_headers): one entry for a combined stream,
+    two (video, audio) when yt-dlp's default selection merges formats.
+    """
+    if not format_id or format_id == 'best':
+        requested = info.get('requested_formats')
+        if requested:
+            inputs = []
+            for fmt in requested:
+                inputs.extend(_format_inputs(fmt))
+            return inputs
+        if info.get('url'):
+            return _format_inputs(info)
+
+    for fmt in info.get('formats', []):
+        if fmt.get('format_id') == format_id:
+            return _format_inputs(fmt)
+
+    raise StreamError(f"Format {format_id} not found for this video.")
+
+
+def build_ffmpeg_cmd(ffmpeg_cmd, inputs, start_sec=None, end_sec=None, container='mp4', reencode=True):
+    """ffmpeg command that cuts [start_sec, end_sec) from the inputs and writes `container` to stdout."""
+    if container not in CONTAINERS:
+        raise StreamError(f"Unsupported container: {container}")
+
+    cmd = [ffmpeg_cmd, '-hide_banner', '-nostdin', '-nostats', '-loglevel', 'error']
+    for url, headers in inputs:
+        if headers:
+            cmd.extend(['-headers', ''.join(f"{k}: {v}\r\n" for k, v in headers.items())])
+        if start_sec:
+            # Input-side seek: ffmpeg only fetches from the nearest keyframe on
+            cmd.extend(['-ss', str(start_sec)])
+        cmd.extend(['-i', url])
+
+    if end_sec is not None:
+        cmd.extend(['-t', str(end_sec - (start_sec or 0))])
+
+    if len(inputs) > 1:
+        cmd.extend(['-map', '0:v:0', '-map', '1:a:0'])
+
+    if reencode:
+        # Same accuracy as --force-keyframes-at-cuts: the clip starts exactly at start_sec
+        cmd.extend(['-c:v', 'libx264', '-preset', 'veryfast', '-c:a', 'aac'])
+    else:
+        cmd.extend(['-c', 'copy'])
+
+    cmd.extend(CONTAINERS[container]['args'])
+    cmd.append('pipe:1')
+    return cmd
+
+
+def stream_process(cmd, startupinfo=None, chunk_size=CHUNK_SIZE):
+    """
+    Runs `cmd` and yields its stdout in chunks as soon as they are produced.
+
+    Only one chunk plus the OS pipe buffer is ever held in memory: when the
+    client reads slowly, the write side blocks and ffmpeg pauses. If the
+    consumer stops (client disconnected -> generator closed), the process
+    is killed.
+    """
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
+        bufsize=0,
+        startupinfo=startupinfo
+    )
+
+    # Drain stderr on the side so a chatty ffmpeg never blocks on a full pipe
+    errors = deque(maxlen=20)
+
+    def drain_stderr():
+        for line in process.stderr:
+            errors.append(line.decode('utf-8', 'replace').rstrip())
+
+    threading.Thread(target=drain_stderr, daemon=True).start()
+
+    fd = process.stdout.fileno()
+    try:
+        while True:
+            chunk = os.read(fd, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        process.wait()
+        if process.returncode != 0:
+            print(f"Streaming ffmpeg exited with {process.returncode}: {' | '.join(errors)}")
+    finally:
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        process.stdout.close()
@@ -0,0 +1,61 @@
+import formats
+
+
+def time_to_seconds(time_str):
+    """Converts "ss", "mm:ss" or "hh:mm:ss" to seconds."""
+    if not time_str:
+        return 0
+    parts = time_str.strip().split(':')[::-1]
+    seconds = 0
+    if len(parts) > 0:
+        seconds += int(parts[0])
+    if len(parts) > 1:
+        seconds += int(parts[1]) * 60
+    if len(parts) > 2:
+        seconds += int(parts[2]) * 3600
+    return seconds
+
+
+def request_section(data):
+    """(start_sec, end_sec) from a request's start_time/end_time, (None, None) when not given."""
+    start_time = data.get('start_time')
+    end_time = data.get('end_time')
+    if not start_time or not end_time:
+        return None, None
+    try:
+        return time_to_seconds(start_time), time_to_seconds(end_time)
+    except ValueError:
+        raise ValueError('Invalid time format, use mm:ss or hh:mm:ss.')
+
+
+def request_policy(data):
+    """(policy, height) for formats.rank_formats() from a request."""
+    policy = data.get('policy') or 'quality'
+    if policy not in formats.POLICIES:
+        raise ValueError(f'Unknown policy: {policy}')
+    try:
+        height = int(data.get('height') or 0)
+    except (TypeError, ValueError):
+        raise ValueError('height must be a number of pixels, e.g. 720')
+    return policy, height
+
+
+def check_range(video_info, start_time, end_time):
+    """Validates start/end against the video duration. Returns an error message or None."""
+    duration = video_info.get('duration', 0)
+
+    # If no duration is provided, treat it as less than an hour (3599 seconds)
+    if not duration:
+        duration = 3599
+
+    if start_time:
+        start_sec = time_to_seconds(start_time)
+        if start_sec > duration:
+            return f'Start time exceeds video duration ({duration} seconds).'
+
+    if end_time:
+        end_sec = time_to_seconds(end_time)
+        if end_sec > (duration+1):
+            return f'End time exceeds video duration ({duration} seconds).'
+
+    return None